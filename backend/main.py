@@ -1,9 +1,14 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 import uvicorn
+import functools
+import json
 import os
-import tempfile
+import time
+import uuid
 from pathlib import Path
 import sys
 
@@ -14,7 +19,27 @@ sys.path.append(project_root)
 # Change working directory to project root
 os.chdir(project_root)
 
-app = FastAPI()
+from src.serving.metrics import install_request_id_logging, metrics, observe_request, request_id_var, stage
+from src.serving.registry import get_registry, process_rss_bytes
+from src.serving.cache import get_cache, sha256_stream
+from src.serving.uploads import SpooledUpload, UploadTooLarge, max_upload_bytes, spool_upload
+from src.serving.jobs import JobManager, JobStatus, QueueFullError
+from src.serving.profiles import PROFILES, get_profile
+from src.serving.speculative import speculation_stats
+from src.serving.startup import Startup
+from src.structured import OUTPUT_FORMATS, StreamingItemParser, parse_requirements, structured_result, to_docx, to_json, to_markdown
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the model once so requests share it instead of reloading per call;
+    # in the background, so the server is live while it loads
+    startup.start()
+    yield
+    from src.pdf_extraction import shutdown_pool
+    jobs.shutdown()
+    shutdown_pool()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -25,34 +50,394 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Inference runs on a bounded pool so the event loop stays free for other requests
+job_timeout = os.environ.get("JOB_TIMEOUT_SECONDS")
+jobs = JobManager(
+    max_workers=int(os.environ.get("JOB_WORKERS", "1")),
+    max_queue=int(os.environ.get("JOB_QUEUE_SIZE", "8")),
+    timeout=float(job_timeout) if job_timeout else None,
+    executor=os.environ.get("JOB_EXECUTOR", "thread"),
+)
+
+# Imports, model load and warm-up run in the background; /ready reports them
+startup = Startup()
+
+install_request_id_logging()
+
+def job_samples():
+    stats = jobs.stats()
+    yield {}, stats["pending"]
+
+def job_status_samples():
+    for status, count in jobs.stats()["jobs"].items():
+        yield {"status": status}, count
+
+def cache_samples():
+    cache = get_cache()
+    if cache is None:
+        return
+    for namespace, counts in cache.stats()["namespaces"].items():
+        for result, count in counts.items():
+            yield {"namespace": namespace, "result": result}, count
+
+def model_memory_samples():
+    for name, model in get_registry().stats()["models"].items():
+        yield {"model": name}, model["memory_bytes"]
+
+def speculation_samples():
+    for mode, totals in speculation_stats.stats().items():
+        for kind in ("proposed", "accepted"):
+            yield {"mode": mode, "kind": kind}, totals[f"{kind}_tokens"]
+
+# Read from the components' own counters at scrape time
+metrics.register_collector("jobs_pending", "gauge", "Jobs queued or running", job_samples)
+metrics.register_collector("jobs", "gauge", "Retained jobs by status", job_status_samples)
+metrics.register_collector("cache_lookups", "counter", "Result cache lookups and writes by outcome", cache_samples)
+metrics.register_collector("model_memory_bytes", "gauge", "Parameter and buffer memory of resident models", model_memory_samples)
+metrics.register_collector("process_resident_bytes", "gauge", "Resident set size of the server process", lambda: [({}, process_rss_bytes())])
+metrics.register_collector("ready", "gauge", "1 once startup (imports, model load, warm-up) has finished", lambda: [({}, int(startup.ready))])
+metrics.register_collector("speculative_tokens", "counter", "Draft tokens proposed and accepted by assisted generation", speculation_samples)
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "ready": startup.ready, "jobs": jobs.stats()}
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 once the model is loaded and warmed up, 503 until then (or if startup failed)."""
+    # With several workers (src.serving.workers) this is the answering worker's state
+    status = dict(startup.to_dict(), pid=os.getpid(), worker=os.environ.get("WORKER_INDEX"))
+    return JSONResponse(status, status_code=200 if startup.ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    if not metrics.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/models/stats")
+def model_stats():
+    return dict(get_registry().stats(), speculation=speculation_stats.stats())
+
+@app.get("/profiles")
+def list_profiles():
+    # Through get_profile so environment overrides show up
+    return {name: get_profile(name).to_dict() for name in PROFILES}
+
+def resolve_profile(profile: str = None):
+    """The requested generation profile (default from GENERATION_PROFILE); 400 if unknown."""
+    try:
+        return get_profile(profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/cache/stats")
+def cache_stats():
+    cache = get_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+def cache_bypassed(request: Request) -> bool:
+    """Clients skip cached results with X-Cache-Bypass: 1 or Cache-Control: no-cache."""
+    if request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes"):
+        return True
+    return "no-cache" in request.headers.get("cache-control", "").lower()
+
+# Room for multipart boundaries and headers on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Reject oversized bodies before the multipart parser spools them
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_upload_bytes() + MULTIPART_OVERHEAD:
+        return PlainTextResponse("Error: Upload is too large", status_code=413)
+    return await call_next(request)
+
+# Registered last so it wraps every other middleware
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    # Every log line written while serving the request (and by the jobs it
+    # submits) carries its id; clients may supply their own with X-Request-ID
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        if metrics.enabled:
+            # Route templates keep label cardinality bounded (no job ids)
+            route = request.scope.get("route")
+            observe_request(request.method, getattr(route, "path", "unmatched"), status, time.perf_counter() - started)
+        request_id_var.reset(token)
+
+async def save_upload(file: UploadFile) -> SpooledUpload:
+    """Copy an uploaded PDF to its own temporary file in bounded chunks."""
+    try:
+        with stage("upload"):
+            return await run_in_threadpool(spool_upload, file.file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+def upload_size(file: UploadFile) -> int:
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+# Formats results can be returned in; docx is rendered from the JSON output
+RESPONSE_FORMATS = ("markdown", "json", "docx")
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+def resolve_format(format: str, allowed=RESPONSE_FORMATS) -> str:
+    """The requested output format (default markdown); 400 if unknown."""
+    format = (format or "markdown").lower()
+    if format not in allowed:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(allowed)}")
+    return format
+
+def generation_format(format: str) -> str:
+    """The model output format behind a response format (see ``src.structured``)."""
+    return "markdown" if format == "markdown" else "json"
+
+def render_structured(structured, format: str, headers=None) -> Response:
+    """Render schema-form requirements as a markdown, JSON or DOCX response."""
+    if format == "json":
+        return Response(to_json(structured), media_type="application/json", headers=headers)
+    if format == "docx":
+        try:
+            content = to_docx(structured)
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        headers = dict(headers or {}, **{"Content-Disposition": 'attachment; filename="requirements.docx"'})
+        return Response(content, media_type=DOCX_MEDIA_TYPE, headers=headers)
+    return PlainTextResponse(to_markdown(structured), headers=headers)
+
+def submit_extraction(upload: SpooledUpload, use_cache: bool = True, profile: str = None, output_format: str = "markdown"):
+    """Queue requirements extraction for a spooled PDF; the file is removed when the job ends."""
+    from src.inference import extract_requirements_from_pdf
+
+    try:
+        return jobs.submit(
+            functools.partial(
+                extract_requirements_from_pdf,
+                file_hash=upload.sha256,
+                use_cache=use_cache,
+                profile=profile,
+                output_format=output_format
+            ),
+            upload.path,
+            cooperative=True,
+            on_done=upload.cleanup
+        )
+    except Exception:
+        upload.cleanup()
+        raise
+
+@app.post("/jobs", status_code=202)
+async def create_job(request: Request, file: UploadFile = File(...), profile: str = None, format: str = None):
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Please upload a PDF file")
+    profile = resolve_profile(profile).name
+    output_format = resolve_format(format, OUTPUT_FORMATS)
+    
+    upload = await save_upload(file)
+    try:
+        job = submit_extraction(upload, use_cache=not cache_bypassed(request), profile=profile, output_format=output_format)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/jobs/{job_id}/export")
+def export_job(job_id: str, format: str = "json"):
+    """A finished job's requirements as markdown, JSON or DOCX."""
+    format = resolve_format(format)
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status != JobStatus.SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status.value}")
+    return render_structured(structured_result(job.result), format)
+
+@app.post("/render")
+async def render(request: Request, format: str = "docx"):
+    """Render requirements in the JSON schema (e.g. from a stream's result event) as markdown, JSON or DOCX."""
+    format = resolve_format(format)
+    try:
+        body = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be requirements JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Body must be a JSON object")
+    # Accepts a whole result too; items are normalised like model output
+    structured = parse_requirements(json.dumps(body.get("structured", body)))
+    return render_structured(structured, format)
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    jobs.cancel(job_id)
+    return job.to_dict()
+
 @app.post("/extract-requirements", response_class=PlainTextResponse)
-async def extract_requirements(file: UploadFile = File(...)):
+async def extract_requirements(request: Request, file: UploadFile = File(...), profile: str = None, format: str = None):
     if not file.filename.endswith('.pdf'):
         return "Error: Please upload a PDF file"
+    try:
+        profile = get_profile(profile).name
+        format = resolve_format(format)
+    except ValueError as e:
+        return PlainTextResponse(f"Error: {str(e)}", status_code=400)
+    except HTTPException as e:
+        return PlainTextResponse(f"Error: {e.detail}", status_code=e.status_code)
     
     try:
-        # Create a temporary file to store the uploaded PDF
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await file.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-        
-        # Process the PDF using your existing script
-        from src.inference import extract_text_from_pdf, generate_requirements
+        # Spool the upload to a temporary file owned by the extraction job
+        try:
+            upload = await save_upload(file)
+        except HTTPException as e:
+            return PlainTextResponse(f"Error: {e.detail}", status_code=e.status_code)
         
-        # Extract text from PDF
-        text = extract_text_from_pdf(temp_file_path)
+        # Run extraction and generation on the worker pool and wait for it
+        try:
+            job = submit_extraction(
+                upload,
+                use_cache=not cache_bypassed(request),
+                profile=profile,
+                output_format=generation_format(format)
+            )
+        except QueueFullError as e:
+            return PlainTextResponse(f"Error: {str(e)}", status_code=429)
         
-        # Generate requirements
-        requirements = generate_requirements(text)
+        await jobs.wait(job)
         
-        # Clean up the temporary file
-        os.unlink(temp_file_path)
+        if job.status != JobStatus.SUCCEEDED:
+            return f"Error processing PDF: {job.error}"
         
-        return requirements
+        result = job.result
+        headers = {
+            "X-Input-Coverage": f"{result['coverage']:.4f}",
+            "X-Chunks": str(result["chunks"]),
+            "X-Pages": str(result["pages"]),
+            "X-OCR-Pages": str(result["ocr_pages"]),
+            "X-Cache": result["cache"],
+            "X-Profile": result["profile"],
+            "X-Deadline-Hit": "1" if result["deadline_hit"] else "0",
+        }
+        if format == "markdown":
+            return PlainTextResponse(result["requirements"], headers=headers)
+        try:
+            return render_structured(structured_result(result), format, headers)
+        except HTTPException as e:
+            return PlainTextResponse(f"Error: {e.detail}", status_code=e.status_code)
         
     except Exception as e:
         return f"Error processing PDF: {str(e)}"
 
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_events(stream):
+    """
+    Relay generated text as SSE token events, then the merged result and
+    metrics. Each chunk of the document is announced by a ``chunk`` event
+    before its reply's tokens. With JSON output each completed requirement
+    is also sent as an ``item`` event as soon as it is parsed; items that
+    several chunks repeat are only deduplicated in the final ``result``,
+    which merges the replies like ``/extract-requirements`` does.
+    """
+    try:
+        chunk = parser = None
+        for text in stream:
+            if stream.chunk is not chunk:
+                chunk = stream.chunk
+                yield sse_event("chunk", {
+                    "index": chunk.index,
+                    "chunks": len(stream.chunks),
+                    "first_page": chunk.first_page,
+                    "last_page": chunk.last_page,
+                })
+                if stream.output_format == "json":
+                    parser = StreamingItemParser(default_page=chunk.page)
+            yield sse_event("token", {"text": text})
+            if parser is not None:
+                for section, item in parser.feed(text):
+                    yield sse_event("item", {"section": section, "item": item})
+        requirements, structured = stream.result()
+        if structured is not None:
+            yield sse_event("result", {"structured": structured})
+        else:
+            yield sse_event("result", {"requirements": requirements})
+        if stream.error:
+            yield sse_event("error", {"detail": stream.error})
+        yield sse_event("metrics", stream.metrics())
+        yield sse_event("done", {})
+    finally:
+        # Stops generation early if the client disconnects mid-stream
+        stream.close()
+
+@app.post("/extract-requirements/stream")
+async def extract_requirements_stream(request: Request, file: UploadFile = File(...), profile: str = None, format: str = None):
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Please upload a PDF file")
+    output_format = resolve_format(format, OUTPUT_FORMATS)
+    
+    from src.inference import extract_document_cached, stream_requirements
+    
+    profile = resolve_profile(profile)
+    if not profile.streamable:
+        streamable = [name for name, p in PROFILES.items() if p.streamable]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Profile {profile.name!r} cannot be streamed; use one of: {', '.join(streamable)}"
+        )
+    if not get_registry().is_available():
+        raise HTTPException(status_code=503, detail="Trained model not found")
+    
+    # Text is extracted within this request, so read the multipart spool
+    # directly instead of copying it to a file of our own
+    if upload_size(file) > max_upload_bytes():
+        raise HTTPException(status_code=413, detail="Upload is too large")
+    digest = await run_in_threadpool(sha256_stream, file.file)
+    document = await run_in_threadpool(
+        extract_document_cached,
+        file.file,
+        file_hash=digest,
+        use_cache=not cache_bypassed(request)
+    )
+    
+    # Generation runs on the shared job pool; ending the streamer when the job
+    # finishes also closes the stream if the job was cancelled before it ran.
+    # Process pools cannot feed an in-process streamer, so they fall back to a thread.
+    def start(work, stream):
+        jobs.submit(work, cooperative=True, on_done=stream.streamer.end)
+    
+    try:
+        stream = await run_in_threadpool(
+            stream_requirements,
+            document,
+            profile=profile,
+            start=start if jobs.executor_type == "thread" else None,
+            output_format=output_format
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    
+    return StreamingResponse(stream_events(stream), media_type="text/event-stream")
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000) 
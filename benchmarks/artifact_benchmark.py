@@ -0,0 +1,120 @@
+"""
+Load time, resident memory and decode speed of the exported inference
+artifacts (fp32, fp16, int8) on CPU.
+
+Builds a small random model (wider than the tiny stand-in so the matmuls
+dominate), optionally wraps it in a LoRA adapter, exports it with
+``src.serving.export`` and then loads each artifact in a fresh process so
+load time and RSS are not polluted by the previous one.
+
+    python benchmarks/artifact_benchmark.py --hidden-size 512 --layers 8 --new-tokens 64
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from results import write_results
+from tiny_model import build_tiny_model, project_root
+
+from src.serving.export import ARTIFACT_DTYPES, export_model, load_artifact
+from src.serving.registry import process_rss_bytes
+
+
+def measure(path, dtype, new_tokens, prompt_tokens, vocab_size):
+    """Runs in a child process: load one artifact and time greedy decoding."""
+    import torch
+
+    torch.manual_seed(0)
+    rss_before = process_rss_bytes()
+    start = time.perf_counter()
+    model = load_artifact(path, dtype)
+    load_seconds = time.perf_counter() - start
+    rss_loaded = process_rss_bytes()
+
+    input_ids = torch.randint(3, vocab_size, (1, prompt_tokens))
+    kwargs = dict(
+        attention_mask=torch.ones_like(input_ids),
+        do_sample=False,
+        pad_token_id=0,
+        eos_token_id=None,
+    )
+    with torch.no_grad():
+        model.generate(input_ids, max_new_tokens=2, **kwargs)
+        start = time.perf_counter()
+        output = model.generate(input_ids, max_new_tokens=new_tokens, min_new_tokens=new_tokens, **kwargs)
+        decode_seconds = time.perf_counter() - start
+    generated = output.shape[1] - prompt_tokens
+    return {
+        "dtype": dtype,
+        "load_seconds": round(load_seconds, 3),
+        "rss_mb": round((rss_loaded - rss_before) / 2**20, 1) if rss_before and rss_loaded else None,
+        "tokens_per_second": round(generated / decode_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--vocab-size", type=int, default=8192)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--prompt-tokens", type=int, default=128)
+    parser.add_argument("--dtypes", nargs="+", default=list(ARTIFACT_DTYPES), choices=ARTIFACT_DTYPES)
+    parser.add_argument("--lora", action="store_true", help="merge a random LoRA adapter during export")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--measure", nargs=2, metavar=("PATH", "DTYPE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        result = measure(args.measure[0], args.measure[1], args.new_tokens, args.prompt_tokens, args.vocab_size)
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp) / "base"
+        model = build_tiny_model(args.vocab_size, hidden_size=args.hidden_size, num_layers=args.layers)
+        model.save_pretrained(base, safe_serialization=True)
+        adapter = None
+        if args.lora:
+            from peft import LoraConfig, get_peft_model
+            peft_model = get_peft_model(model, LoraConfig(r=16, target_modules=["q_proj", "v_proj"]))
+            adapter = Path(tmp) / "adapter"
+            peft_model.save_pretrained(adapter)
+        del model
+
+        export_dir = Path(tmp) / "exported"
+        start = time.perf_counter()
+        manifest = export_model(str(base), str(export_dir), adapter_path=str(adapter) if adapter else None, dtypes=args.dtypes)
+        print(f"Exported {', '.join(manifest['artifacts'])} in {time.perf_counter() - start:.1f}s")
+
+        results = []
+        print(f"{'dtype':>5} {'size_mb':>8} {'load_s':>7} {'rss_mb':>7} {'tok/s':>7}")
+        for dtype in args.dtypes:
+            output = subprocess.run(
+                [
+                    sys.executable, __file__,
+                    "--measure", str(export_dir / dtype), dtype,
+                    "--new-tokens", str(args.new_tokens),
+                    "--prompt-tokens", str(args.prompt_tokens),
+                    "--vocab-size", str(args.vocab_size),
+                ],
+                check=True, capture_output=True, text=True, cwd=project_root
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result["size_mb"] = round(manifest["artifacts"][dtype]["bytes"] / 2**20, 1)
+            results.append(result)
+            print(
+                f"{dtype:>5} {result['size_mb']:>8} {result['load_seconds']:>7} "
+                f"{result['rss_mb']!s:>7} {result['tokens_per_second']:>7}"
+            )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
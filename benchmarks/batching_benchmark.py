@@ -0,0 +1,81 @@
+"""
+Throughput of micro-batched generation versus batch window.
+
+Fires ``--docs`` concurrent requests at a ``MicroBatcher`` in front of
+``generate_requirements_batch`` using the tiny stand-in model, for every
+combination of ``--windows`` (max wait, ms) and ``--batch-sizes``, and reports
+documents/minute and the mean batch size that was actually formed.
+
+    python benchmarks/batching_benchmark.py --docs 32 --windows 0 10 50 --batch-sizes 1 4 8
+"""
+import argparse
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import tiny_registry
+
+from src.inference import generate_requirements_batch
+from src.serving.batching import MicroBatcher
+
+
+def run(registry, texts, max_batch_size, max_wait_ms, max_new_tokens):
+    batcher = MicroBatcher(
+        functools.partial(generate_requirements_batch, registry=registry, max_new_tokens=max_new_tokens),
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+    )
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(texts)) as pool:
+            list(pool.map(batcher, texts))
+        elapsed = time.perf_counter() - start
+    finally:
+        batcher.close()
+    stats = batcher.stats()
+    return {
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait_ms,
+        "docs": len(texts),
+        "seconds": round(elapsed, 3),
+        "docs_per_min": round(60 * len(texts) / elapsed, 1),
+        "mean_batch_size": round(stats["mean_batch_size"], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=16)
+    parser.add_argument("--words", type=int, default=200, help="words per synthetic document")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 10, 50, 200])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    registry = tiny_registry()
+    registry.get()
+    texts = [synthetic_text(args.words, seed) for seed in range(args.docs)]
+
+    # Warm up kernels and allocator before timing
+    generate_requirements_batch(texts[:1], registry=registry, max_new_tokens=2)
+
+    results = []
+    print(f"{'batch':>5} {'wait_ms':>8} {'docs/min':>9} {'mean_bs':>8} {'seconds':>8}")
+    for max_batch_size in args.batch_sizes:
+        for max_wait_ms in args.windows:
+            result = run(registry, texts, max_batch_size, max_wait_ms, args.max_new_tokens)
+            results.append(result)
+            print(
+                f"{max_batch_size:>5} {max_wait_ms:>8g} {result['docs_per_min']:>9} "
+                f"{result['mean_batch_size']:>8} {result['seconds']:>8}"
+            )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
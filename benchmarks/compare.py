@@ -0,0 +1,109 @@
+"""
+Compare two benchmark result files, e.g. from the parent commit and HEAD.
+
+Rows are matched by position; numeric fields that are equal in both runs
+(batch sizes, page counts, ...) and text fields label the row, every other
+float is a metric. A metric whose name says whether lower (``seconds``,
+``rss_mb``, ``p95`` ...) or higher (``per_second``, ``speedup`` ...) is
+better is flagged when it moves the wrong way by more than ``--threshold``.
+
+    python benchmarks/pdf_extraction_benchmark.py --json before.json
+    git checkout <change> && python benchmarks/pdf_extraction_benchmark.py --json after.json
+    python benchmarks/compare.py before.json after.json --threshold 0.1
+"""
+import argparse
+import sys
+
+from results import load_results
+
+HIGHER_IS_BETTER = (
+    "per_second", "per_minute", "pages/s", "throughput", "speedup", "efficiency",
+    "acceptance", "tokens_per_step", "rps",
+)
+LOWER_IS_BETTER = ("seconds", "_ms", "rss", "_mb", "bytes", "latency", "p50", "p95", "p99", "errors")
+
+
+def flatten(value, prefix=""):
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}{key}."))
+        return flat
+    return {prefix[:-1]: value}
+
+
+def rows(results):
+    if isinstance(results, list):
+        return [flatten(row) for row in results]
+    return [flatten(results)]
+
+
+def direction(metric):
+    """+1 if higher is better, -1 if lower is better, 0 if unknown."""
+    name = metric.lower()
+    if any(token in name for token in HIGHER_IS_BETTER):
+        return 1
+    if any(token in name for token in LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def compare(before, after, threshold):
+    """Per-metric comparisons of two result lists: ``(label, metric, before, after, change, verdict)``."""
+    compared = []
+    for old, new in zip(rows(before), rows(after)):
+        label = ", ".join(
+            f"{key}={value}" for key, value in old.items()
+            if new.get(key) == value and not isinstance(value, float)
+        )
+        for metric, old_value in old.items():
+            new_value = new.get(metric)
+            if not (is_number(old_value) and is_number(new_value)) or old_value == new_value:
+                continue
+            if not isinstance(old_value, float) and not isinstance(new_value, float) and direction(metric) == 0:
+                # Differing integers without a known direction are configuration, not results
+                continue
+            change = (new_value - old_value) / abs(old_value) if old_value else float("inf")
+            verdict = ""
+            sign = direction(metric)
+            if sign and abs(change) > threshold:
+                verdict = "improved" if change * sign > 0 else "REGRESSED"
+            compared.append((label, metric, old_value, new_value, change, verdict))
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.05, help="relative change to flag (default 5%%)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on any regression")
+    args = parser.parse_args()
+
+    before, after = load_results(args.before), load_results(args.after)
+    if before["benchmark"] and after["benchmark"] and before["benchmark"] != after["benchmark"]:
+        print(f"warning: comparing {before['benchmark']} with {after['benchmark']}", file=sys.stderr)
+    for name, document in (("before", before), ("after", after)):
+        git = document.get("git") or {}
+        commit = git.get("commit", "unknown")[:12]
+        print(f"{name}: {commit}{' (dirty)' if git.get('dirty') else ''}")
+    if before["args"] and after["args"] and before["args"] != after["args"]:
+        print("warning: the runs used different arguments", file=sys.stderr)
+
+    compared = compare(before["results"], after["results"], args.threshold)
+    print(f"{'row':<40} {'metric':<28} {'before':>12} {'after':>12} {'change':>8}")
+    for label, metric, old_value, new_value, change, verdict in compared:
+        print(f"{label[:40]:<40} {metric[:28]:<28} {old_value:>12.4g} {new_value:>12.4g} {change:>+8.1%} {verdict}")
+
+    regressions = sum(1 for row in compared if row[-1] == "REGRESSED")
+    print(f"{len(compared)} metric(s) changed, {regressions} regression(s) beyond {args.threshold:.0%}")
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+MinHash/LSH near-duplicate detection at scale.
+
+Generates ``--lines`` synthetic requirement lines in which ``--dup-rate`` of
+them are copies of an earlier line with one word changed, then times
+``MinHasher.signatures`` and ``find_duplicates`` and reports lines per
+second and the share of planted near-duplicates found. For comparison, the
+exact pairwise Jaccard check is timed on ``--pairwise-sample`` lines and
+extrapolated to the full size (it grows with the square of the line
+count).
+
+    python benchmarks/dedup_benchmark.py --lines 10000 100000 1000000
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from fixtures import WORDS
+from results import write_results
+
+from src.dedup import LINE_THRESHOLD, MinHasher, find_duplicates, jaccard
+
+
+def synthetic_lines(count, words_per_line, dup_rate, seed=0):
+    """Lines and, per line, the index of the line it was copied from (or -1)."""
+    rng = np.random.default_rng(seed)
+    ids = rng.integers(0, len(WORDS), size=(count, words_per_line))
+    source = np.full(count, -1)
+    copies = np.flatnonzero(rng.random(count) < dup_rate)
+    copies = copies[copies > 0]
+    source[copies] = (rng.random(len(copies)) * copies).astype(int)
+    for index in copies:
+        ids[index] = ids[source[index]]
+        ids[index, rng.integers(words_per_line)] = rng.integers(len(WORDS))
+    vocabulary = np.array(WORDS)
+    return [" ".join(row) for row in vocabulary[ids].tolist()], source
+
+
+def pairwise_seconds(hasher, lines, threshold):
+    """Time the exact all-pairs check over ``lines``."""
+    shingles = [hasher.shingles(line) for line in lines]
+    start = time.perf_counter()
+    for i in range(1, len(shingles)):
+        for j in range(i):
+            if jaccard(shingles[i], shingles[j]) >= threshold:
+                break
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--words-per-line", type=int, default=12)
+    parser.add_argument("--dup-rate", type=float, default=0.1)
+    parser.add_argument("--threshold", type=float, default=LINE_THRESHOLD)
+    parser.add_argument("--num-perm", type=int, default=64)
+    parser.add_argument("--pairwise-sample", type=int, default=2000)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    hasher = MinHasher(num_perm=args.num_perm)
+    sample, _ = synthetic_lines(args.pairwise_sample, args.words_per_line, args.dup_rate, seed=1)
+    sample_seconds = pairwise_seconds(hasher, sample, args.threshold)
+
+    results = []
+    print(
+        f"{'lines':>9} {'hash s':>8} {'lsh s':>7} {'lines/s':>10} {'found':>8} "
+        f"{'recall':>7} {'pairwise s (est)':>17}"
+    )
+    for count in args.lines:
+        lines, source = synthetic_lines(count, args.words_per_line, args.dup_rate)
+        start = time.perf_counter()
+        signatures = hasher.signatures(lines)
+        hash_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        duplicate_of = find_duplicates(signatures, args.threshold)
+        lsh_seconds = time.perf_counter() - start
+
+        # Planted copies whose one-word edit kept them above the threshold
+        planted = [
+            index for index in np.flatnonzero(source >= 0)[:5000]
+            if jaccard(hasher.shingles(lines[index]), hasher.shingles(lines[source[index]])) >= args.threshold
+        ]
+        found = sum(1 for index in planted if duplicate_of[index] >= 0)
+        result = {
+            "lines": count,
+            "hash_seconds": round(hash_seconds, 3),
+            "lsh_seconds": round(lsh_seconds, 3),
+            "lines_per_second": round(count / (hash_seconds + lsh_seconds), 1),
+            "duplicates": int((duplicate_of >= 0).sum()),
+            "recall": round(found / len(planted), 4) if planted else None,
+            "pairwise_seconds_estimate": round(sample_seconds * (count / args.pairwise_sample) ** 2, 1),
+        }
+        results.append(result)
+        print(
+            f"{count:>9} {result['hash_seconds']:>8} {result['lsh_seconds']:>7} {result['lines_per_second']:>10} "
+            f"{result['duplicates']:>8} {str(result['recall']):>7} {result['pairwise_seconds_estimate']:>17}"
+        )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
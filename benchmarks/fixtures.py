@@ -0,0 +1,25 @@
+"""
+Synthetic text fixtures shared by the benchmarks.
+"""
+import random
+
+WORDS = (
+    "system user shall must should allow support upload document requirement "
+    "login password secure encrypt data page load seconds report export admin "
+    "role feature performance scalability reliability availability audit log "
+    "access control interface api service database backup restore notify email "
+    "search filter dashboard the a to of and for with within under each every"
+).split()
+
+
+def synthetic_text(num_words=300, seed=0):
+    """Pseudo-requirements prose of roughly ``num_words`` words."""
+    rng = random.Random(seed)
+    sentences = []
+    remaining = num_words
+    while remaining > 0:
+        length = min(remaining, rng.randint(8, 20))
+        words = [rng.choice(WORDS) for _ in range(length)]
+        sentences.append(" ".join(words).capitalize() + ".")
+        remaining -= length
+    return " ".join(sentences)
@@ -0,0 +1,208 @@
+"""
+Concurrent load generator for the backend API.
+
+Sends ``--requests`` PDF uploads from ``--concurrency`` closed-loop clients
+to ``/extract-requirements`` (or the SSE ``/extract-requirements/stream``)
+and reports p50/p95/p99 latency, throughput and rejected (429) or failed
+requests. For the stream endpoint the time to the first byte is reported as
+well. Without ``--url`` the backend is started in-process on the tiny
+stand-in model with a ``bench`` generation profile capped at
+``--max-new-tokens``, and the mean time per stage from its ``/metrics``
+(PDF parsing, tokenization, prefill, decode, ...) is included.
+
+    python benchmarks/load_test.py --requests 64 --concurrency 8 --pages 5
+    python benchmarks/load_test.py --url http://localhost:8000 --profile fast
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from results import percentiles, write_results
+from synthetic_pdf import make_synthetic_pdf
+
+BENCH_PROFILE = "bench"
+
+
+def multipart_body(filename, content):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+def send(url, filename, content, use_cache):
+    """POST one upload; returns ``(status, seconds, first_byte_seconds)``."""
+    body, content_type = multipart_body(filename, content)
+    headers = {"Content-Type": content_type}
+    if not use_cache:
+        headers["X-Cache-Bypass"] = "1"
+    request = urllib.request.Request(url, data=body, headers=headers, method="POST")
+    start = time.perf_counter()
+    first_byte = None
+    try:
+        with urllib.request.urlopen(request, timeout=600) as response:
+            status = response.status
+            if response.read(1):
+                first_byte = time.perf_counter() - start
+            response.read()
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 0
+    return status, time.perf_counter() - start, first_byte
+
+
+def start_local_server(args):
+    """Serve ``backend.main`` on the tiny model from a background thread."""
+    import uvicorn
+    from tiny_model import tiny_registry
+
+    os.environ.setdefault("JOB_WORKERS", str(args.workers))
+    os.environ.setdefault("JOB_QUEUE_SIZE", str(args.requests))
+    if not args.use_cache:
+        os.environ.setdefault("CACHE_ENABLED", "0")
+
+    from src.serving.profiles import PROFILES, GenerationProfile
+    from src.serving.registry import set_registry
+
+    set_registry(tiny_registry())
+    PROFILES[BENCH_PROFILE] = GenerationProfile(
+        name=BENCH_PROFILE,
+        generate_kwargs={"do_sample": False, "num_beams": 1},
+        max_new_tokens=args.max_new_tokens,
+        latency_budget_seconds=600.0,
+        description="Greedy decoding capped for load tests"
+    )
+    from backend.main import app
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=args.port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="load-test-server", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("Backend failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def stage_means(base_url):
+    """Mean seconds per stage from the server's Prometheus metrics."""
+    try:
+        with urllib.request.urlopen(f"{base_url}/metrics", timeout=10) as response:
+            text = response.read().decode()
+    except (urllib.error.URLError, OSError):
+        return {}
+    sums, counts = {}, {}
+    for line in text.splitlines():
+        if not line.startswith("docs_extractor_stage_seconds_"):
+            continue
+        name, value = line.rsplit(" ", 1)
+        stage = name.split('stage="', 1)[1].split('"', 1)[0]
+        if name.startswith("docs_extractor_stage_seconds_sum"):
+            sums[stage] = float(value)
+        elif name.startswith("docs_extractor_stage_seconds_count"):
+            counts[stage] = float(value)
+    return {stage: round(sums[stage] / counts[stage], 4) for stage in sums if counts.get(stage)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running backend (default: start one on the tiny model)")
+    parser.add_argument("--endpoint", choices=["extract", "stream"], default="extract")
+    parser.add_argument("--profile", help=f"generation profile (default: {BENCH_PROFILE} in-process, server default otherwise)")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--lines-per-page", type=int, default=40)
+    parser.add_argument("--distinct-pdfs", type=int, default=8)
+    parser.add_argument("--use-cache", action="store_true", help="let repeated PDFs hit the result cache")
+    parser.add_argument("--max-new-tokens", type=int, default=32, help="in-process only")
+    parser.add_argument("--workers", type=int, default=2, help="in-process job workers")
+    parser.add_argument("--port", type=int, default=8765, help="in-process server port")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url.rstrip("/") if args.url else f"http://127.0.0.1:{args.port}"
+    profile = args.profile
+    if not args.url:
+        server, thread = start_local_server(args)
+        profile = profile or BENCH_PROFILE
+    path = "/extract-requirements" + ("/stream" if args.endpoint == "stream" else "")
+    url = base_url + path + (f"?profile={profile}" if profile else "")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdfs = []
+        for seed in range(args.distinct_pdfs):
+            pdf_path = os.path.join(tmp, f"load_{seed}.pdf")
+            make_synthetic_pdf(pdf_path, args.pages, args.lines_per_page, seed=seed)
+            with open(pdf_path, "rb") as f:
+                pdfs.append((os.path.basename(pdf_path), f.read()))
+
+    # Warm-up so model loading and worker start-up are not in the timings
+    send(url, *pdfs[0], args.use_cache)
+
+    def one(index):
+        return send(url, *pdfs[index % len(pdfs)], args.use_cache)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - start
+
+    ok = [seconds for status, seconds, _ in outcomes if status == 200]
+    first_bytes = [first for status, _, first in outcomes if status == 200 and first is not None]
+    statuses = {}
+    for status, _, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    latency = {key: round(value, 4) if value is not None else None for key, value in percentiles(ok).items()}
+    result = {
+        "endpoint": path,
+        "profile": profile,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "pages": args.pages,
+        "ok": len(ok),
+        "rejected": statuses.get("429", 0),
+        "errors": args.requests - len(ok) - statuses.get("429", 0),
+        "statuses": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ok) / wall, 3),
+        "latency_seconds": dict(latency, max=round(max(ok), 4) if ok else None),
+    }
+    if args.endpoint == "stream":
+        result["first_byte_seconds"] = {
+            key: round(value, 4) if value is not None else None for key, value in percentiles(first_bytes).items()
+        }
+    result["stage_mean_seconds"] = stage_means(base_url)
+
+    print(
+        f"{result['ok']}/{args.requests} ok, {result['rejected']} rejected, {result['errors']} failed "
+        f"in {result['wall_seconds']}s ({result['throughput_rps']} req/s)"
+    )
+    print(f"{'':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    print(f"{'latency':>8} " + " ".join(f"{str(result['latency_seconds'][k]):>8}" for k in ("p50", "p95", "p99", "max")))
+    if "first_byte_seconds" in result:
+        print(f"{'ttfb':>8} " + " ".join(f"{str(result['first_byte_seconds'][k]):>8}" for k in ("p50", "p95", "p99")))
+    for stage, seconds in result["stage_mean_seconds"].items():
+        print(f"  {stage:>12}: {seconds}s mean")
+
+    if server is not None:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+    if args.json:
+        write_results(args.json, result, args)
+
+
+if __name__ == "__main__":
+    main()
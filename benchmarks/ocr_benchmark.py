@@ -0,0 +1,89 @@
+"""
+OCR fallback throughput on a synthetic scanned PDF.
+
+Renders ``--pages`` pages of the synthetic document as JPEG images with no
+text layer (``make_scanned_pdf``) and times ``extract_document`` with each
+``--workers`` OCR pool size, reporting pages per second and the character
+accuracy of the recognised text against the rendered ground truth. Needs
+Pillow, pytesseract and the tesseract binary.
+
+    python benchmarks/ocr_benchmark.py --pages 20 --workers 1 2 4 --dpi 150 300
+"""
+import argparse
+import difflib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from results import write_results
+from synthetic_pdf import make_scanned_pdf
+
+from src.pdf_extraction import extract_document, ocr_available, shutdown_pool
+
+
+def accuracy(document, truth):
+    """Mean per-page similarity of recognised words to the ground truth."""
+    ratios = []
+    for page, lines in zip(document.pages, truth):
+        expected = " ".join(" ".join(lines).split())
+        found = " ".join(block.text for block in page.blocks)
+        found = " ".join(found.replace("\t", " ").split())
+        ratios.append(difflib.SequenceMatcher(None, expected, found, autojunk=False).ratio())
+    return sum(ratios) / len(ratios) if ratios else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--lines-per-page", type=int, default=40)
+    parser.add_argument("--dpi", type=int, nargs="+", default=[150])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if not ocr_available():
+        parser.error("OCR needs Pillow, pytesseract and the tesseract binary")
+
+    results = []
+    print(f"{'dpi':>5} {'workers':>8} {'seconds':>8} {'pages/s':>8} {'speedup':>8} {'accuracy':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for dpi in args.dpi:
+            path = os.path.join(tmp, f"scanned_{dpi}.pdf")
+            truth = make_scanned_pdf(path, args.pages, args.lines_per_page, dpi=dpi)
+            baseline = None
+            for workers in args.workers:
+                # Warm-up: spawns the OCR pool
+                extract_document(path, ocr_workers=workers, ocr_page_budget=min(workers, args.pages))
+                start = time.perf_counter()
+                document = extract_document(path, ocr_workers=workers, ocr_page_budget=args.pages)
+                seconds = time.perf_counter() - start
+                baseline = baseline or seconds
+                result = {
+                    "dpi": dpi,
+                    "pages": args.pages,
+                    "workers": workers,
+                    "ocr_pages": document.ocr_pages,
+                    "seconds": round(seconds, 3),
+                    "pages_per_second": round(args.pages / seconds, 2),
+                    "speedup": round(baseline / seconds, 2),
+                    "accuracy": round(accuracy(document, truth), 4),
+                }
+                results.append(result)
+                print(
+                    f"{dpi:>5} {workers:>8} {result['seconds']:>8} {result['pages_per_second']:>8} "
+                    f"{result['speedup']:>8} {result['accuracy']:>9}"
+                )
+    shutdown_pool()
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Tokens-per-step efficiency of the training sequence layouts.
+
+Tokenises synthetic documents of varying length with
+``RequirementsProcessor`` and reports the fraction of token slots that hold
+real tokens for the original fixed-length padding versus dynamic padding,
+length bucketing and packing.
+
+    python benchmarks/packing_benchmark.py --docs 2000 --batch-size 4
+"""
+import argparse
+import random
+import time
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import build_tiny_tokenizer
+
+from src.data.packing import token_efficiency
+from src.data.processor import RequirementsProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000)
+    parser.add_argument("--min-words", type=int, default=30)
+    parser.add_argument("--max-words", type=int, default=600)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--max-length", type=int, default=2048)
+    parser.add_argument("--max-prompt-length", type=int, default=512)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    documents = [
+        {
+            "text": synthetic_text(rng.randint(args.min_words, args.max_words), seed=i),
+            "metadata": {"type": "requirements", "title": f"Document {i}"},
+        }
+        for i in range(args.docs)
+    ]
+    processor = RequirementsProcessor(
+        build_tiny_tokenizer(),
+        max_length=args.max_length,
+        max_prompt_length=args.max_prompt_length,
+        packing_mode="dynamic"
+    )
+
+    start = time.perf_counter()
+    examples = processor.tokenize_documents(documents)
+    tokenize_seconds = time.perf_counter() - start
+    lengths = [len(example["input_ids"]) for example in examples]
+    efficiency = token_efficiency(lengths, args.batch_size, args.max_length)
+
+    print(f"tokenized {len(documents)} docs in {tokenize_seconds:.2f}s, mean length {sum(lengths) / len(lengths):.0f}")
+    print(f"{'layout':>10} {'efficiency':>11} {'vs padded':>10}")
+    for layout, value in efficiency.items():
+        print(f"{layout:>10} {value:>11.1%} {value / efficiency['padded']:>9.1f}x")
+
+    if args.json:
+        write_results(args.json, {"tokenize_seconds": tokenize_seconds, "efficiency": efficiency}, args)
+
+
+if __name__ == "__main__":
+    main()
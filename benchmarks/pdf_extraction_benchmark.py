@@ -0,0 +1,76 @@
+"""
+Serial versus process-parallel PDF text extraction.
+
+Generates synthetic PDFs of each ``--pages`` size and reports pages/sec for
+``extract_pages_from_pdf`` with every ``--workers`` setting. The worker pool
+is warmed up before timing, so the numbers reflect steady-state serving.
+
+    python benchmarks/pdf_extraction_benchmark.py --pages 200 500 --workers 1 2 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from results import write_results
+from synthetic_pdf import make_synthetic_pdf
+
+from src.pdf_extraction import extract_pages_from_pdf, shutdown_pool
+
+
+def time_extraction(path, workers, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        pages = extract_pages_from_pdf(path, workers=workers)
+        best = min(best, time.perf_counter() - start)
+    return len(pages), best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 500])
+    parser.add_argument("--lines-per-page", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'pages':>6} {'workers':>8} {'seconds':>8} {'pages/s':>8} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_pages in args.pages:
+            path = os.path.join(tmp, f"synthetic_{num_pages}.pdf")
+            make_synthetic_pdf(path, num_pages, args.lines_per_page)
+            baseline = None
+            for workers in args.workers:
+                # Warm-up: spawns the pool and fills OS file caches
+                extract_pages_from_pdf(path, workers=workers)
+                pages, seconds = time_extraction(path, workers, args.repeats)
+                baseline = baseline or seconds
+                result = {
+                    "pages": pages,
+                    "workers": workers,
+                    "seconds": round(seconds, 3),
+                    "pages_per_second": round(pages / seconds, 1),
+                    "speedup": round(baseline / seconds, 2),
+                }
+                results.append(result)
+                print(
+                    f"{pages:>6} {workers:>8} {result['seconds']:>8} "
+                    f"{result['pages_per_second']:>8} {result['speedup']:>8}"
+                )
+    shutdown_pool()
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
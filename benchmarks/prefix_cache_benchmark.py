@@ -0,0 +1,78 @@
+"""
+Prefill latency with and without reuse of the cached instruction prefix.
+
+Times ``generate_requirements_batch`` with a single new token (so the time
+is essentially prefill) on the tiny stand-in model, for each batch size and
+document length, once with PREFIX_CACHE=0 and once with the prefix cache
+warm.
+
+    python benchmarks/prefix_cache_benchmark.py --batch-sizes 1 4 --words 50 200 --repeats 5
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import tiny_registry
+
+from src.inference import PROMPT_INSTRUCTIONS, generate_requirements_batch
+
+
+def prefill_seconds(registry, texts, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        generate_requirements_batch(texts, registry=registry, max_new_tokens=1)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--words", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    registry = tiny_registry()
+    loaded = registry.get()
+    prefix_tokens = len(loaded.processor.tokenizer(PROMPT_INSTRUCTIONS)["input_ids"])
+    print(f"Instruction prefix: {prefix_tokens} tokens")
+
+    results = []
+    print(f"{'batch':>5} {'words':>6} {'full_ms':>8} {'prefix_ms':>10} {'speedup':>8}")
+    for batch_size in args.batch_sizes:
+        for words in args.words:
+            texts = [synthetic_text(words, seed) for seed in range(batch_size)]
+            os.environ["PREFIX_CACHE"] = "0"
+            generate_requirements_batch(texts, registry=registry, max_new_tokens=1)
+            full = prefill_seconds(registry, texts, args.repeats)
+            os.environ["PREFIX_CACHE"] = "1"
+            # Computes the prefix state on first use
+            generate_requirements_batch(texts, registry=registry, max_new_tokens=1)
+            reused = prefill_seconds(registry, texts, args.repeats)
+            result = {
+                "batch_size": batch_size,
+                "words": words,
+                "prefix_tokens": prefix_tokens,
+                "full_prefill_ms": round(full * 1000, 2),
+                "prefix_reuse_ms": round(reused * 1000, 2),
+                "speedup": round(full / reused, 2),
+            }
+            results.append(result)
+            print(
+                f"{batch_size:>5} {words:>6} {result['full_prefill_ms']:>8} "
+                f"{result['prefix_reuse_ms']:>10} {result['speedup']:>8}"
+            )
+
+    print(json.dumps(registry.stats()["models"]["default"]["prefix_cache"], indent=2))
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
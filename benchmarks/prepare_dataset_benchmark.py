@@ -0,0 +1,73 @@
+"""
+Throughput of ``RequirementsProcessor.prepare_dataset``.
+
+Builds ``--docs`` synthetic documents of random length and times
+``prepare_dataset`` for each ``--packing-modes`` layout and ``--num-proc``
+setting, reporting documents and tokens per second. Runs on the tiny
+benchmark tokenizer, so the numbers isolate the processor and
+``Dataset.map`` overhead from tokenizer speed.
+
+    python benchmarks/prepare_dataset_benchmark.py --docs 2000 --num-proc 1 4
+"""
+import argparse
+import random
+import time
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import build_tiny_tokenizer
+
+from src.data.processor import PACKING_MODES, RequirementsProcessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--min-words", type=int, default=30)
+    parser.add_argument("--max-words", type=int, default=600)
+    parser.add_argument("--packing-modes", nargs="+", default=list(PACKING_MODES), choices=PACKING_MODES)
+    parser.add_argument("--num-proc", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--max-length", type=int, default=2048)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    documents = [
+        {
+            "text": synthetic_text(rng.randint(args.min_words, args.max_words), seed=i),
+            "metadata": {"type": "requirements", "title": f"Document {i}"},
+        }
+        for i in range(args.docs)
+    ]
+    tokenizer = build_tiny_tokenizer()
+
+    results = []
+    print(f"{'mode':>10} {'num_proc':>8} {'seconds':>8} {'docs/s':>8} {'tokens/s':>10} {'rows':>6}")
+    for mode in args.packing_modes:
+        processor = RequirementsProcessor(tokenizer, max_length=args.max_length, packing_mode=mode)
+        for num_proc in args.num_proc:
+            start = time.perf_counter()
+            dataset = processor.prepare_dataset(documents, num_proc=num_proc if num_proc > 1 else None)
+            seconds = time.perf_counter() - start
+            tokens = sum(sum(mask) for mask in dataset["attention_mask"])
+            result = {
+                "packing_mode": mode,
+                "num_proc": num_proc,
+                "docs": args.docs,
+                "rows": len(dataset),
+                "seconds": round(seconds, 3),
+                "docs_per_second": round(args.docs / seconds, 1),
+                "tokens_per_second": round(tokens / seconds, 1),
+            }
+            results.append(result)
+            print(
+                f"{mode:>10} {num_proc:>8} {result['seconds']:>8} {result['docs_per_second']:>8} "
+                f"{result['tokens_per_second']:>10} {result['rows']:>6}"
+            )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
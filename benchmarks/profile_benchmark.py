@@ -0,0 +1,73 @@
+"""
+Latency and output length per generation profile.
+
+Runs ``generate_requirements_batch`` one document at a time with each
+profile on the tiny stand-in model and reports median/max latency, mean
+generated tokens, and how often the profile's latency budget cut decoding
+short. ``--max-new-tokens`` caps every profile so the tiny model's random
+output does not dominate the run time.
+
+    python benchmarks/profile_benchmark.py --docs 8 --max-new-tokens 64
+"""
+import argparse
+import statistics
+import time
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import tiny_registry
+
+from src.inference import generate_requirements_batch
+from src.serving.profiles import PROFILES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    registry = tiny_registry()
+    tokenizer = registry.get().processor.tokenizer
+    texts = [synthetic_text(args.words, seed) for seed in range(args.docs)]
+    generate_requirements_batch(texts[:1], registry=registry, max_new_tokens=2)
+
+    results = []
+    print(f"{'profile':>9} {'p50_s':>7} {'max_s':>7} {'tokens':>7} {'chars':>7} {'budget_hits':>11}")
+    for name in args.profiles:
+        profile = PROFILES[name]
+        latencies, tokens, chars, budget_hits = [], [], [], 0
+        for text in texts:
+            start = time.perf_counter()
+            output = generate_requirements_batch(
+                [text], registry=registry, profile=profile, max_new_tokens=args.max_new_tokens
+            )[0]
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+            tokens.append(len(tokenizer(output, add_special_tokens=False)["input_ids"]))
+            chars.append(len(output))
+            budget_hits += elapsed >= profile.latency_budget_seconds
+        result = {
+            "profile": name,
+            "p50_seconds": round(statistics.median(latencies), 3),
+            "max_seconds": round(max(latencies), 3),
+            "mean_tokens": round(statistics.mean(tokens), 1),
+            "mean_chars": round(statistics.mean(chars), 1),
+            "budget_hits": budget_hits,
+            "latency_budget_seconds": profile.latency_budget_seconds,
+        }
+        results.append(result)
+        print(
+            f"{name:>9} {result['p50_seconds']:>7} {result['max_seconds']:>7} "
+            f"{result['mean_tokens']:>7} {result['mean_chars']:>7} {budget_hits:>11}"
+        )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
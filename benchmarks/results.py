@@ -0,0 +1,80 @@
+"""
+Shared JSON result format for the benchmarks.
+
+Every ``--json`` file holds the benchmark's results together with what is
+needed to compare two runs: the benchmark name, its arguments, the git
+commit it ran on (and whether the tree was dirty) and the environment.
+``compare.py`` diffs two such files.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+
+
+def git_revision():
+    """``{"commit", "dirty"}`` of the working tree, or None outside git."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=project_root, check=True, capture_output=True, text=True
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=project_root, check=True, capture_output=True, text=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"commit": commit, "dirty": bool(status.strip())}
+
+
+def environment():
+    env = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        env["torch"] = torch.__version__
+        env["cuda"] = torch.cuda.is_available()
+    return env
+
+
+def write_results(path, results, args=None, name=None):
+    """Write ``results`` with run metadata to ``path``."""
+    document = {
+        "benchmark": name or Path(sys.argv[0]).stem,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git": git_revision(),
+        "environment": environment(),
+        "args": {k: v for k, v in vars(args).items() if k != "json"} if args is not None else None,
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2)
+
+
+def load_results(path):
+    """A results document; bare result lists from older runs get empty metadata."""
+    with open(path) as f:
+        document = json.load(f)
+    if isinstance(document, dict) and "results" in document and "benchmark" in document:
+        return document
+    return {"benchmark": None, "git": None, "args": None, "results": document}
+
+
+def percentiles(values, points=(50, 95, 99)):
+    """Nearest-rank percentiles of ``values`` as ``{"p50": ..., ...}``."""
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{point}": None for point in points}
+    result = {}
+    for point in points:
+        rank = max(1, -(-point * len(ordered) // 100))
+        result[f"p{point}"] = ordered[rank - 1]
+    return result
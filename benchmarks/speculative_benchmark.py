@@ -0,0 +1,113 @@
+"""
+End-to-end latency of assisted (speculative) decoding against plain decoding.
+
+Runs ``generate_requirements_batch`` one document at a time with the greedy
+``fast`` profile on the tiny stand-in model, once without speculation, once
+with prompt-lookup drafting and once with a smaller draft model, and
+reports median latency, the draft acceptance rate, generated tokens per
+target forward pass and the speedup over plain decoding. The tiny models
+are random, so acceptance here says nothing about the real pair; run with
+``--model-path``/``--draft-path`` to measure real checkpoints.
+
+    python benchmarks/speculative_benchmark.py --docs 8 --max-new-tokens 64
+"""
+import argparse
+import statistics
+import time
+from dataclasses import replace
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import TinyProcessor, build_tiny_model, build_tiny_tokenizer
+
+from src.inference import generate_requirements_batch
+from src.serving.profiles import PROFILES
+from src.serving.registry import DEFAULT_MODEL_KEY, ModelRegistry, ModelSpec
+from src.serving.speculative import DRAFT_MODEL_KEY, speculation_stats
+
+MODES = ("none", "prompt_lookup", "draft")
+
+
+def build_registry(args):
+    if args.model_path:
+        registry = ModelRegistry()
+        registry.register(ModelSpec(name=DEFAULT_MODEL_KEY, path=args.model_path))
+        if args.draft_path:
+            registry.register(ModelSpec(name=DRAFT_MODEL_KEY, path=args.draft_path, text_only=args.draft_text_only))
+        return registry
+
+    tokenizer = build_tiny_tokenizer()
+
+    def loader(spec):
+        if spec.name == DRAFT_MODEL_KEY:
+            model = build_tiny_model(len(tokenizer), hidden_size=32, num_layers=1, seed=1)
+        else:
+            model = build_tiny_model(len(tokenizer), num_layers=args.layers)
+        return model, TinyProcessor(tokenizer)
+
+    registry = ModelRegistry(loader=loader)
+    registry.register(ModelSpec(name=DEFAULT_MODEL_KEY, path="tiny"))
+    registry.register(ModelSpec(name=DRAFT_MODEL_KEY, path="tiny-draft"))
+    return registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=8)
+    parser.add_argument("--words", type=int, default=200)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--speculative-tokens", type=int, default=10)
+    parser.add_argument("--layers", type=int, default=4, help="layers of the tiny target model")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--model-path", help="real target checkpoint instead of the tiny model")
+    parser.add_argument("--draft-path", help="real draft checkpoint (with --model-path)")
+    parser.add_argument("--draft-text-only", action="store_true", help="load the draft as a plain causal LM")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    registry = build_registry(args)
+    if "draft" in args.modes and registry.is_available(DRAFT_MODEL_KEY):
+        registry.preload(DRAFT_MODEL_KEY)
+    texts = [synthetic_text(args.words, seed) for seed in range(args.docs)]
+    generate_requirements_batch(texts[:1], registry=registry, profile=PROFILES["fast"], max_new_tokens=2)
+
+    results = []
+    baseline = None
+    print(f"{'mode':>13} {'p50_s':>7} {'tokens':>7} {'accept':>7} {'tok/step':>8} {'speedup':>8}")
+    for mode in args.modes:
+        profile = replace(
+            PROFILES["fast"],
+            speculation=None if mode == "none" else mode,
+            speculative_tokens=args.speculative_tokens
+        )
+        speculation_stats.reset()
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            generate_requirements_batch([text], registry=registry, profile=profile, max_new_tokens=args.max_new_tokens)
+            latencies.append(time.perf_counter() - start)
+        p50 = statistics.median(latencies)
+        if mode == "none":
+            baseline = p50
+        stats = speculation_stats.stats().get(mode, {})
+        result = {
+            "mode": mode,
+            "p50_seconds": round(p50, 4),
+            "mean_seconds": round(statistics.mean(latencies), 4),
+            "generated_tokens": stats.get("generated_tokens"),
+            "acceptance_rate": stats.get("acceptance_rate"),
+            "tokens_per_step": stats.get("tokens_per_step"),
+            "speedup": round(baseline / p50, 2) if baseline else None,
+        }
+        results.append(result)
+        print(
+            f"{mode:>13} {result['p50_seconds']:>7} {str(result['generated_tokens']):>7} "
+            f"{str(result['acceptance_rate']):>7} {str(result['tokens_per_step']):>8} {str(result['speedup']):>8}"
+        )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
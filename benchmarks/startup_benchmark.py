@@ -0,0 +1,198 @@
+"""
+Cold-start budget: import times, time to live and time to ready.
+
+First profiles the imports of ``--modules`` in fresh interpreters (total
+and per top-level package, see ``src.serving.startup``) and checks that
+``backend.main`` stays free of torch, transformers and PyPDF2. Then, for each
+``--warmup`` setting, starts the backend in a fresh process on the tiny
+stand-in model and reports the time until ``/health`` answers (live), until
+``/ready`` turns green (model loaded and warmed up) with the duration of
+each startup phase, and the latency of the first extraction request.
+
+Exits with status 1 when a budget is exceeded, so it can gate changes:
+
+    python benchmarks/startup_benchmark.py --import-budget-ms 1500 --ready-budget-seconds 60
+    python benchmarks/startup_benchmark.py --warmup 1 0 --json startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from load_test import BENCH_PROFILE, multipart_body
+from results import write_results
+from synthetic_pdf import make_synthetic_pdf
+
+from src.serving.startup import import_totals, profile_imports
+
+# Must not be imported just to serve /health
+HEAVY_PACKAGES = ("torch", "transformers", "PyPDF2")
+
+
+def serve(args):
+    """Child process: the backend on a lazily built tiny model."""
+    os.environ.setdefault("CACHE_ENABLED", "0")
+    os.environ["STARTUP_WARMUP"] = args.serve_warmup
+
+    from src.serving.profiles import PROFILES, GenerationProfile
+    from src.serving.registry import ModelRegistry, ModelSpec, set_registry
+
+    def lazy_tiny_loader(spec):
+        # Imported here so torch is paid for in the startup phases, as in production
+        from tiny_model import tiny_loader
+        return tiny_loader(spec)
+
+    registry = ModelRegistry(loader=lazy_tiny_loader)
+    registry.register(ModelSpec(name="default", path=str(project_root)))
+    set_registry(registry)
+    PROFILES[BENCH_PROFILE] = GenerationProfile(
+        name=BENCH_PROFILE,
+        generate_kwargs={"do_sample": False, "num_beams": 1},
+        max_new_tokens=args.max_new_tokens,
+        latency_budget_seconds=600.0,
+        description="Greedy decoding capped for startup benchmarks"
+    )
+
+    import uvicorn
+    from backend.main import app
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def get(url):
+    """``(status, body)`` of a GET, ``(0, None)`` while the server is not up."""
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+    except (urllib.error.URLError, OSError):
+        return 0, None
+
+
+def cold_start(args, warmup, pdf):
+    """Start a fresh backend and time it to live, to ready and through its first request."""
+    base_url = f"http://127.0.0.1:{args.port}"
+    command = [
+        sys.executable, __file__, "--serve", "--port", str(args.port),
+        "--serve-warmup", warmup, "--max-new-tokens", str(args.max_new_tokens),
+    ]
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=project_root)
+    try:
+        live = ready = None
+        status = {}
+        while time.perf_counter() - started < args.timeout:
+            if process.poll() is not None:
+                raise RuntimeError(f"Backend exited with status {process.returncode}")
+            if live is None and get(f"{base_url}/health")[0] == 200:
+                live = time.perf_counter() - started
+            if live is not None:
+                code, body = get(f"{base_url}/ready")
+                status = json.loads(body) if body else {}
+                if code == 200:
+                    ready = time.perf_counter() - started
+                    break
+                if status.get("status") == "failed":
+                    raise RuntimeError(f"Startup failed: {status.get('error')}")
+            time.sleep(0.02)
+        if ready is None:
+            raise RuntimeError(f"Backend not ready within {args.timeout}s")
+
+        body, content_type = multipart_body("startup.pdf", pdf)
+        request = urllib.request.Request(
+            f"{base_url}/extract-requirements?profile={BENCH_PROFILE}",
+            data=body,
+            headers={"Content-Type": content_type},
+            method="POST"
+        )
+        request_started = time.perf_counter()
+        with urllib.request.urlopen(request, timeout=args.timeout) as response:
+            response.read()
+        first_request = time.perf_counter() - request_started
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {
+        "kind": "cold_start",
+        "warmup": warmup == "1",
+        "live_seconds": round(live, 3),
+        "ready_seconds": round(ready, 3),
+        "phase_seconds": status.get("phases", {}),
+        "first_request_seconds": round(first_request, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["backend.main", "src.inference"])
+    parser.add_argument("--warmup", nargs="*", choices=["1", "0"], default=["1"], help="cold starts to run (STARTUP_WARMUP)")
+    parser.add_argument("--import-budget-ms", type=float, default=1500.0, help="for importing backend.main")
+    parser.add_argument("--ready-budget-seconds", type=float, default=60.0)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--serve-warmup", default="1", help=argparse.SUPPRESS)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    over_budget = []
+    results = []
+    print(f"{'module':<24} {'import ms':>10}  slowest packages")
+    for module in args.modules:
+        totals = import_totals(profile_imports(module), module)
+        heavy = [package for package in HEAVY_PACKAGES if package in totals["packages_ms"]]
+        results.append({"kind": "import", "module": module, "import_ms": totals["total_ms"], "packages_ms": totals["packages_ms"]})
+        slowest = ", ".join(f"{package} {ms}" for package, ms in list(totals["packages_ms"].items())[:4])
+        print(f"{module:<24} {totals['total_ms']:>10}  {slowest}")
+        if module == "backend.main":
+            if totals["total_ms"] > args.import_budget_ms:
+                over_budget.append(f"importing backend.main took {totals['total_ms']} ms (budget {args.import_budget_ms})")
+            if heavy:
+                over_budget.append(f"backend.main imports {', '.join(heavy)} at import time")
+
+    if args.warmup:
+        with tempfile.TemporaryDirectory() as tmp:
+            pdf_path = os.path.join(tmp, "startup.pdf")
+            make_synthetic_pdf(pdf_path, args.pages, 40)
+            with open(pdf_path, "rb") as f:
+                pdf = f.read()
+        print()
+        print(f"{'warm-up':>8} {'live s':>8} {'ready s':>8} {'first req s':>12}  phases")
+        for warmup in args.warmup:
+            result = cold_start(args, warmup, pdf)
+            results.append(result)
+            phases = ", ".join(f"{phase} {seconds}" for phase, seconds in result["phase_seconds"].items())
+            print(
+                f"{warmup:>8} {result['live_seconds']:>8} {result['ready_seconds']:>8} "
+                f"{result['first_request_seconds']:>12}  {phases}"
+            )
+            if result["ready_seconds"] > args.ready_budget_seconds:
+                over_budget.append(
+                    f"ready after {result['ready_seconds']}s with warm-up={warmup} (budget {args.ready_budget_seconds})"
+                )
+
+    if args.json:
+        write_results(args.json, results, args)
+    for message in over_budget:
+        print(f"OVER BUDGET: {message}")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
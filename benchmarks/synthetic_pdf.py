@@ -0,0 +1,158 @@
+"""
+Synthetic PDF generator for benchmarks.
+
+Writes plain single-font text PDFs by hand (no reportlab needed) with a
+configurable number of pages and lines of text per page. Pages contain a
+numbered heading followed by pseudo-requirements prose so chunking and
+extraction see realistic structure. ``make_scanned_pdf`` writes the same
+pages as JPEG images with no text layer, like a scanner would (needs
+Pillow).
+"""
+import argparse
+import io
+import random
+
+from fixtures import synthetic_text
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text, width):
+    lines, line = [], ""
+    for word in text.split():
+        if line and len(line) + 1 + len(word) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def page_lines(page_no, lines_per_page, seed=0, width=90):
+    """The text lines of one synthetic page."""
+    rng = random.Random(seed * 100003 + page_no)
+    lines = [f"{page_no}. SECTION {page_no}"]
+    while len(lines) < lines_per_page:
+        paragraph = synthetic_text(rng.randint(20, 80), seed=rng.randrange(1 << 30))
+        lines.extend(_wrap(paragraph, width))
+        lines.append("")
+    return lines[:lines_per_page]
+
+
+def build_pdf(pages):
+    """Serialise a list of pages (each a list of text lines) into PDF bytes."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    page_refs = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 800 Td"]
+        for line in lines:
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+    return _serialise(objects, page_refs)
+
+
+def _serialise(objects, page_refs):
+    kids = b" ".join(b"%d 0 R" % ref for ref in page_refs)
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_refs))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
+
+
+def make_synthetic_pdf(path, num_pages=100, lines_per_page=50, seed=0):
+    """Write a synthetic PDF to ``path`` and return the path."""
+    pages = [page_lines(page_no, lines_per_page, seed) for page_no in range(1, num_pages + 1)]
+    with open(path, "wb") as f:
+        f.write(build_pdf(pages))
+    return path
+
+
+def render_page(lines, dpi=150):
+    """One page of text lines as a greyscale A4-sized PIL image at ``dpi``."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    scale = dpi / 72
+    image = Image.new("L", (round(612 * scale), round(842 * scale)), 255)
+    try:
+        font = ImageFont.truetype("DejaVuSans.ttf", round(10 * scale))
+    except OSError:
+        font = ImageFont.load_default()
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((50 * scale, (42 + 12 * i) * scale), line, fill=0, font=font)
+    return image
+
+
+def build_scanned_pdf(images, quality=75):
+    """Serialise page images into a PDF with one full-page JPEG per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None]
+    page_refs = []
+    for image in images:
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=quality)
+        data = buffer.getvalue()
+        objects.append(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+            b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n%s\nendstream"
+            % (image.width, image.height, len(data), data)
+        )
+        image_ref = len(objects)
+        stream = b"q 612 0 0 842 0 0 cm /Im1 Do Q"
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /XObject << /Im1 %d 0 R >> >> /Contents %d 0 R >>" % (image_ref, content_ref)
+        )
+        page_refs.append(len(objects))
+    return _serialise(objects, page_refs)
+
+
+def make_scanned_pdf(path, num_pages=10, lines_per_page=50, seed=0, dpi=150):
+    """
+    Write an image-only version of ``make_synthetic_pdf``'s document to
+    ``path``; returns the ground-truth text lines of each page.
+    """
+    pages = [page_lines(page_no, lines_per_page, seed) for page_no in range(1, num_pages + 1)]
+    with open(path, "wb") as f:
+        f.write(build_scanned_pdf(render_page(lines, dpi) for lines in pages))
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic text PDF")
+    parser.add_argument("path")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--lines-per-page", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scanned", action="store_true", help="write page images instead of text")
+    args = parser.parse_args()
+    if args.scanned:
+        make_scanned_pdf(args.path, args.pages, args.lines_per_page, args.seed)
+    else:
+        make_synthetic_pdf(args.path, args.pages, args.lines_per_page, args.seed)
@@ -0,0 +1,94 @@
+"""
+Tokenization microbenchmarks for the serving and training paths.
+
+Times, for each ``--words`` document size: encoding ``build_prompt(text)``
+one document per call versus one batched call (``count_tokens``),
+``chunk_document`` over the pages of a document, and
+``RequirementsProcessor.tokenize_documents``. Uses the tiny benchmark
+tokenizer unless ``--tokenizer`` names a real one (e.g. the Qwen2-VL
+processor's, if it is in the local Hugging Face cache).
+
+    python benchmarks/tokenization_benchmark.py --docs 256 --words 200 2000
+"""
+import argparse
+import time
+
+from fixtures import synthetic_text
+from results import write_results
+from tiny_model import build_tiny_tokenizer
+
+from src.chunking import chunk_document, count_tokens
+from src.data.processor import RequirementsProcessor
+from src.inference import PROMPT_MAX_LENGTH, build_prompt
+
+
+def best_of(repeats, fn):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_tokenizer(name):
+    if not name:
+        return build_tiny_tokenizer()
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(name, trust_remote_code=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=256)
+    parser.add_argument("--words", type=int, nargs="+", default=[200, 2000])
+    parser.add_argument("--pages-per-doc", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tokenizer", help="Hugging Face tokenizer name or path (default: tiny tokenizer)")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    tokenizer = load_tokenizer(args.tokenizer)
+    processor = RequirementsProcessor(tokenizer, packing_mode="dynamic")
+
+    results = []
+    print(f"{'words':>6} {'case':>18} {'seconds':>8} {'docs/s':>9} {'tokens/s':>10}")
+    for words in args.words:
+        texts = [synthetic_text(words, seed) for seed in range(args.docs)]
+        prompts = [build_prompt(text) for text in texts]
+        tokens = sum(count_tokens(tokenizer, prompts))
+        page_words = max(1, words // args.pages_per_doc)
+        documents = [
+            [synthetic_text(page_words, seed * 1000 + page) for page in range(args.pages_per_doc)]
+            for seed in range(args.docs)
+        ]
+        records = [{"text": text, "metadata": {"type": "requirements"}} for text in texts]
+
+        cases = {
+            "prompt_per_doc": lambda: [tokenizer(prompt, add_special_tokens=False) for prompt in prompts],
+            "prompt_batched": lambda: count_tokens(tokenizer, prompts),
+            "chunk_document": lambda: [chunk_document(pages, tokenizer, PROMPT_MAX_LENGTH) for pages in documents],
+            "tokenize_documents": lambda: processor.tokenize_documents(records),
+        }
+        for case, fn in cases.items():
+            seconds = best_of(args.repeats, fn)
+            result = {
+                "words": words,
+                "case": case,
+                "docs": args.docs,
+                "seconds": round(seconds, 4),
+                "docs_per_second": round(args.docs / seconds, 1),
+                "prompt_tokens_per_second": round(tokens / seconds, 1),
+            }
+            results.append(result)
+            print(
+                f"{words:>6} {case:>18} {result['seconds']:>8} {result['docs_per_second']:>9} "
+                f"{result['prompt_tokens_per_second']:>10}"
+            )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Peak memory of concurrent upload handling: buffered versus spooled.
+
+``buffered`` reproduces the original handler (read the whole upload into
+memory, then write it to a temporary file); ``spooled`` is
+``src.serving.uploads.spool_upload``. Each mode runs in a fresh subprocess
+so its peak RSS is measured in isolation; uploads arrive as the
+disk-backed spooled files the multipart parser hands to FastAPI.
+
+    python benchmarks/upload_load_test.py --size-mb 50 --concurrency 8
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from results import write_results
+
+from src.serving.uploads import spool_upload
+
+CHUNK = 1 << 20
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def multipart_spool(path):
+    """What Starlette hands the endpoint: a SpooledTemporaryFile rolled to disk."""
+    spool = tempfile.SpooledTemporaryFile(max_size=CHUNK)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            spool.write(block)
+    spool.seek(0)
+    return spool
+
+
+def handle_buffered(path, max_bytes):
+    source = multipart_spool(path)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        content = source.read()
+        temp_file.write(content)
+    os.unlink(temp_file.name)
+    return len(content)
+
+
+def handle_spooled(path, max_bytes):
+    source = multipart_spool(path)
+    with spool_upload(source, max_bytes=max_bytes) as upload:
+        return upload.size
+
+
+def run_mode(mode, path, requests, concurrency, max_bytes):
+    handler = handle_buffered if mode == "buffered" else handle_spooled
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: handler(path, max_bytes), range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_rss_per_request_mb": round((peak_rss_mb() - baseline) / concurrency, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--mode", choices=["buffered", "spooled"], help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    max_bytes = int((args.size_mb + 1) * 2**20)
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.path, args.requests, args.concurrency, max_bytes)))
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload.pdf")
+        with open(path, "wb") as f:
+            for _ in range(int(args.size_mb)):
+                f.write(os.urandom(CHUNK))
+        for mode in ("buffered", "spooled"):
+            output = subprocess.run(
+                [
+                    sys.executable, __file__, "--mode", mode, "--path", path,
+                    "--size-mb", str(args.size_mb), "--requests", str(args.requests),
+                    "--concurrency", str(args.concurrency),
+                ],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'mode':>9} {'seconds':>8} {'peak_rss_mb':>12} {'per_request_mb':>15}")
+    for result in results:
+        print(
+            f"{result['mode']:>9} {result['seconds']:>8} {result['peak_rss_mb']:>12} "
+            f"{result['peak_rss_per_request_mb']:>15}"
+        )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
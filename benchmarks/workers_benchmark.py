@@ -0,0 +1,226 @@
+"""
+Memory and throughput of multi-worker serving (``src.serving.workers``).
+
+Exports a small stand-in model (``--hidden-size``/``--layers``, randomly
+initialised) as an fp32 safetensors artifact, then for each ``--mmap``
+setting and each ``--workers`` count starts the launcher on CPU, waits
+until every worker is ready, sends ``--requests`` extraction requests from
+``--concurrency`` clients and finally reads the workers' memory from
+``/proc/<pid>/smaps_rollup``. RSS counts shared pages once per process, so
+the total RSS overstates what N workers really use; PSS splits shared pages
+between the processes mapping them and adds up to the true total, and
+private is what each worker holds alone. With ``--mmap 1`` the weights
+should appear once in the PSS total regardless of the worker count.
+
+    python benchmarks/workers_benchmark.py --workers 1 2 4 --mmap 1 0 --hidden-size 512 --layers 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from load_test import BENCH_PROFILE, send
+from results import percentiles, write_results
+from startup_benchmark import get
+from synthetic_pdf import make_synthetic_pdf
+
+from src.serving.workers import partition_cpus
+
+ARTIFACT_VARIABLE = "WORKERS_BENCH_ARTIFACT"
+MAX_NEW_TOKENS_VARIABLE = "WORKERS_BENCH_MAX_NEW_TOKENS"
+
+
+def export_stand_in(output_dir, hidden_size, layers):
+    """Write the tiny model and its tokenizer as an fp32 artifact with an export manifest."""
+    from tiny_model import build_tiny_model, build_tiny_tokenizer
+
+    from src.serving.export import MANIFEST_NAME
+
+    tokenizer = build_tiny_tokenizer()
+    model = build_tiny_model(len(tokenizer), hidden_size=hidden_size, num_layers=layers)
+    path = Path(output_dir) / "fp32"
+    model.save_pretrained(path, safe_serialization=True)
+    tokenizer.save_pretrained(path)
+    size = sum(f.stat().st_size for f in path.glob("*.safetensors"))
+    with open(Path(output_dir) / MANIFEST_NAME, "w") as f:
+        json.dump({"artifacts": {"fp32": {"path": "fp32", "bytes": size}}}, f)
+    return path, size
+
+
+def configure_worker():
+    """``--init`` hook run in each worker: serve the stand-in artifact with a capped profile."""
+    from src.serving.profiles import PROFILES, GenerationProfile
+    from src.serving.registry import ModelRegistry, ModelSpec, set_registry
+
+    def load_stand_in(spec):
+        from transformers import PreTrainedTokenizerFast
+        from tiny_model import TinyProcessor
+
+        from src.serving.export import load_artifact
+        return load_artifact(spec.path, spec.dtype), TinyProcessor(PreTrainedTokenizerFast.from_pretrained(spec.path))
+
+    registry = ModelRegistry(loader=load_stand_in)
+    registry.register(ModelSpec(name="default", path=os.environ[ARTIFACT_VARIABLE], dtype="fp32"))
+    set_registry(registry)
+    PROFILES[BENCH_PROFILE] = GenerationProfile(
+        name=BENCH_PROFILE,
+        generate_kwargs={"do_sample": False, "num_beams": 1},
+        max_new_tokens=int(os.environ[MAX_NEW_TOKENS_VARIABLE]),
+        latency_budget_seconds=600.0,
+        description="Greedy decoding capped for worker benchmarks"
+    )
+
+
+def worker_pids(launcher_pid):
+    """The launcher's worker processes (not its multiprocessing resource tracker)."""
+    try:
+        with open(f"/proc/{launcher_pid}/task/{launcher_pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    pids = []
+    for pid in children:
+        try:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if b"spawn_main" in f.read():
+                    pids.append(pid)
+        except OSError:
+            pass
+    return pids
+
+
+def memory_kb(pid):
+    """``{"rss", "pss", "private"}`` of a process in KiB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "private": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def wait_until_ready(base_url, workers, timeout):
+    """Poll /ready until ``workers`` distinct worker processes have answered 200."""
+    ready = set()
+    deadline = time.perf_counter() + timeout
+    while len(ready) < workers:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"Only {len(ready)} of {workers} workers ready within {timeout}s")
+        code, body = get(f"{base_url}/ready")
+        if body:
+            status = json.loads(body)
+            if status.get("status") == "failed":
+                raise RuntimeError(f"Worker startup failed: {status.get('error')}")
+            if code == 200:
+                ready.add(status["pid"])
+        time.sleep(0.05)
+
+
+def run(args, artifact, mmap, workers, pdf):
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        MODEL_MMAP=mmap,
+        CACHE_ENABLED="0",
+        JOB_QUEUE_SIZE=str(args.requests),
+        PYTHONPATH=os.pathsep.join([str(Path(__file__).parent), str(project_root)]),
+        **{ARTIFACT_VARIABLE: str(artifact), MAX_NEW_TOKENS_VARIABLE: str(args.max_new_tokens)}
+    )
+    launcher = subprocess.Popen(
+        [
+            sys.executable, "-m", "src.serving.workers",
+            "--workers", str(workers), "--host", "127.0.0.1", "--port", str(args.port),
+            "--init", "workers_benchmark:configure_worker", "--log-level", "warning",
+        ],
+        cwd=project_root,
+        env=env
+    )
+    try:
+        wait_until_ready(base_url, workers, args.timeout)
+        url = f"{base_url}/extract-requirements?profile={BENCH_PROFILE}"
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(lambda _: send(url, "workers.pdf", pdf, False), range(args.requests)))
+        wall = time.perf_counter() - start
+        # After the load, so every weight page has been touched
+        memory = [memory_kb(pid) for pid in worker_pids(launcher.pid)]
+    finally:
+        launcher.terminate()
+        launcher.wait(timeout=60)
+
+    ok = [seconds for status, seconds, _ in outcomes if status == 200]
+    latency = percentiles(ok)
+    return {
+        "mmap": mmap == "1",
+        "workers": workers,
+        "threads_per_worker": min(len(cpus) for cpus in partition_cpus(workers)),
+        "ok": len(ok),
+        "errors": args.requests - len(ok),
+        "throughput_rps": round(len(ok) / wall, 3),
+        "latency_seconds": {key: round(value, 4) if value is not None else None for key, value in latency.items()},
+        "total_rss_mb": round(sum(m["rss"] for m in memory) / 1024, 1),
+        "total_pss_mb": round(sum(m["pss"] for m in memory) / 1024, 1),
+        "total_private_mb": round(sum(m["private"] for m in memory) / 1024, 1),
+        "rss_mb_per_worker": round(sum(m["rss"] for m in memory) / 1024 / max(1, len(memory)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--mmap", nargs="+", choices=["1", "0"], default=["1", "0"], help="MODEL_MMAP settings to compare")
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        artifact, size = export_stand_in(tmp, args.hidden_size, args.layers)
+        pdf_path = os.path.join(tmp, "workers.pdf")
+        make_synthetic_pdf(pdf_path, args.pages, 40)
+        with open(pdf_path, "rb") as f:
+            pdf = f.read()
+        print(f"stand-in weights: {size / 2**20:.1f} MiB")
+        print(
+            f"{'mmap':>5} {'workers':>8} {'rss MiB':>9} {'pss MiB':>9} {'private':>9} "
+            f"{'req/s':>7} {'p50 s':>7} {'p95 s':>7} {'errors':>7}"
+        )
+        for mmap in args.mmap:
+            for workers in args.workers:
+                result = run(args, artifact, mmap, workers, pdf)
+                result["weights_mb"] = round(size / 2**20, 1)
+                results.append(result)
+                print(
+                    f"{mmap:>5} {workers:>8} {result['total_rss_mb']:>9} {result['total_pss_mb']:>9} "
+                    f"{result['total_private_mb']:>9} {result['throughput_rps']:>7} "
+                    f"{str(result['latency_seconds']['p50']):>7} {str(result['latency_seconds']['p95']):>7} "
+                    f"{result['errors']:>7}"
+                )
+
+    if args.json:
+        write_results(args.json, results, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,34 @@ import { useState } from "react";
 import Breadcrumb from "@/components/Breadcrumbs/Breadcrumb";
 import ReactMarkdown from "react-markdown";
 import DefaultLayout from "@/components/Layouts/DefaultLayout";
-import { Document, Packer, Paragraph, TextRun, HeadingLevel } from "docx";
 import { saveAs } from "file-saver";
 
+type RequirementItem = { text: string; page: number | null };
+type Requirements = Record<string, RequirementItem[]>;
+
+// JSON sections and their headings, in document order
+const SECTIONS: [string, string][] = [
+  ["functional", "Functional Requirements"],
+  ["non_functional", "Non-Functional Requirements"],
+  ["user_stories", "User Stories"],
+  ["acceptance_criteria", "Acceptance Criteria"],
+];
+
+const toMarkdown = (structured: Requirements) =>
+  [
+    "# Requirements Document",
+    ...SECTIONS.flatMap(([key, title]) => [
+      "",
+      `## ${title}`,
+      ...(structured[key] ?? []).map(
+        (item) => `- ${item.text}${item.page != null ? ` (p. ${item.page})` : ""}`,
+      ),
+    ]),
+  ].join("\n");
+
 export default function ExtractorPage() {
   const [file, setFile] = useState<File | null>(null);
-  const [requirements, setRequirements] = useState<string>("");
+  const [structured, setStructured] = useState<Requirements | null>(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string>("");
   const [isDragging, setIsDragging] = useState(false);
@@ -61,17 +83,43 @@ export default function ExtractorPage() {
     formData.append("file", file);
 
     try {
-      const response = await fetch("http://localhost:8000/extract-requirements", {
+      const response = await fetch("http://localhost:8000/extract-requirements/stream?format=json", {
         method: "POST",
         body: formData,
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error("Failed to process PDF");
       }
 
-      const data = await response.text();
-      setRequirements(data);
+      // Render requirements as the server parses them out of the stream
+      setStructured({});
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop() ?? "";
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = raw.match(/^data: (.*)$/m)?.[1];
+          if (!event || !data) continue;
+          const payload = JSON.parse(data);
+          if (event === "item") {
+            setStructured((prev) => ({
+              ...prev,
+              [payload.section]: [...(prev?.[payload.section] ?? []), payload.item],
+            }));
+          } else if (event === "result") {
+            setStructured(payload.structured);
+          } else if (event === "error") {
+            throw new Error(payload.detail);
+          }
+        }
+      }
     } catch (err) {
       setError(err instanceof Error ? err.message : "An error occurred");
     } finally {
@@ -80,63 +128,19 @@ export default function ExtractorPage() {
   };
 
   const downloadWordFile = async () => {
-    if (!requirements) return;
+    if (!structured) return;
 
-    const doc = new Document({
-      sections: [{
-        properties: {},
-        children: [
-          new Paragraph({
-            text: "Extracted Requirements",
-            heading: HeadingLevel.HEADING_1,
-          }),
-          ...requirements.split('\n').map(line => {
-            if (line.startsWith('# ')) {
-              return new Paragraph({
-                text: line.replace('# ', ''),
-                heading: HeadingLevel.HEADING_1,
-              });
-            } else if (line.startsWith('## ')) {
-              return new Paragraph({
-                text: line.replace('## ', ''),
-                heading: HeadingLevel.HEADING_2,
-              });
-            } else if (line.startsWith('### ')) {
-              return new Paragraph({
-                text: line.replace('### ', ''),
-                heading: HeadingLevel.HEADING_3,
-              });
-            } else if (line.startsWith('- ')) {
-              return new Paragraph({
-                text: line.replace('- ', ''),
-                bullet: {
-                  level: 0,
-                },
-              });
-            } else if (line.startsWith('* ')) {
-              return new Paragraph({
-                text: line.replace('* ', ''),
-                bullet: {
-                  level: 0,
-                },
-              });
-            } else if (line.trim()) {
-              return new Paragraph({
-                children: [
-                  new TextRun({
-                    text: line,
-                  }),
-                ],
-              });
-            }
-            return new Paragraph({});
-          }),
-        ],
-      }],
+    // The server renders the document from the structured result
+    const response = await fetch("http://localhost:8000/render?format=docx", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(structured),
     });
-
-    const blob = await Packer.toBlob(doc);
-    saveAs(blob, "requirements.docx");
+    if (!response.ok) {
+      setError("Failed to create the Word file");
+      return;
+    }
+    saveAs(await response.blob(), "requirements.docx");
   };
 
   return (
@@ -207,7 +211,7 @@ export default function ExtractorPage() {
                 >
                   {loading ? "Processing..." : "Extract Requirements"}
                 </button>
-                {requirements && (
+                {structured && (
                   <button
                     type="button"
                     onClick={downloadWordFile}
@@ -219,7 +223,7 @@ export default function ExtractorPage() {
               </div>
             </form>
 
-            {requirements && (
+            {structured && (
               <div className="mt-8">
                 <h3 className="text-lg font-medium text-gray-900 dark:text-white mb-4">
                   Extracted Requirements
@@ -280,7 +284,7 @@ export default function ExtractorPage() {
                           ),
                         }}
                       >
-                        {requirements}
+                        {toMarkdown(structured)}
                       </ReactMarkdown>
                     </div>
                   </div>
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.chunking import merge_requirements
+from src.inference import (
+    PROMPT_MAX_LENGTH,
+    build_prompt,
+    generate_requirements_batch,
+    plan_chunks,
+    requirements_cache_key,
+    resolve_profile,
+)
+from src.document import Document
+from src.pdf_extraction import extract_document
+from src.serving.cache import REQUIREMENTS, ResultCache, get_cache, sha256_file
+from src.serving.registry import DEFAULT_MODEL_KEY, ModelRegistry, get_registry
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+
+def discover_pdfs(input_dir) -> List[Path]:
+    """Every PDF under ``input_dir``, smallest first so batches hold similar lengths."""
+    paths = [
+        path for path in Path(input_dir).rglob("*")
+        if path.suffix.lower() == ".pdf" and path.is_file()
+    ]
+    return sorted(paths, key=lambda path: (path.stat().st_size, path.as_posix()))
+
+
+def _parse(path: str) -> Document:
+    # Whole documents are spread over the pool, so each parses (and OCRs) serially
+    return extract_document(path, workers=1, ocr_workers=1)
+
+
+@dataclass
+class BatchReport:
+    """Outcome of one ``BatchRunner.run``."""
+    discovered: int = 0
+    skipped: int = 0
+    processed: int = 0
+    cached: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+    failures: List[Dict[str, str]] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class BatchRunner:
+    """
+    Generates a requirements document for every PDF under ``input_dir``.
+
+    PDFs are parsed in a pool of ``workers`` processes while the model
+    works on earlier documents. Parsed documents are collected in windows;
+    the chunks of a whole window are sorted by token count and generated in
+    batches of ``batch_size``, so each generate call pads as little as
+    possible, and the outputs are merged back per document. Each document
+    gets ``<name>.md`` and ``<name>.json`` under ``out_dir`` (mirroring the
+    input tree), and ``manifest.json`` records finished documents by file
+    hash after every window, so an interrupted run resumes where it
+    stopped. Changing the model revision or generation settings redoes
+    everything.
+    """
+
+    def __init__(
+        self,
+        input_dir,
+        out_dir,
+        workers: Optional[int] = None,
+        batch_size: int = 8,
+        window: Optional[int] = None,
+        profile=None,
+        model_name: str = DEFAULT_MODEL_KEY,
+        registry: ModelRegistry = None,
+        cache: ResultCache = None,
+        use_cache: bool = True,
+        overlap_tokens: int = 64
+    ):
+        self.input_dir = Path(input_dir)
+        self.out_dir = Path(out_dir)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.window = window or batch_size * 4
+        self.profile = resolve_profile(profile)
+        self.model_name = model_name
+        self.registry = registry or get_registry()
+        self.cache = cache or get_cache()
+        self.use_cache = use_cache
+        self.overlap_tokens = overlap_tokens
+
+    def signature(self, loaded) -> str:
+        """Everything besides the PDF itself that shapes a result."""
+        payload = json.dumps(
+            [loaded.revision, build_prompt(""), self.profile.cache_key(), PROMPT_MAX_LENGTH, self.overlap_tokens],
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def run(self, rerun: bool = False) -> BatchReport:
+        started = time.perf_counter()
+        if not self.registry.is_available(self.model_name):
+            raise RuntimeError("Trained model not found. Please run train.py first.")
+        loaded = self.registry.get(self.model_name)
+        signature = self.signature(loaded)
+        manifest = self._read_manifest()
+        if rerun or manifest.get("signature") != signature:
+            if manifest.get("documents"):
+                logger.info("Generation settings changed (or --rerun); processing every PDF again")
+            manifest = {"signature": signature, "documents": {}}
+        documents = manifest["documents"]
+
+        report = BatchReport()
+        todo = deque()
+        for path in discover_pdfs(self.input_dir):
+            report.discovered += 1
+            relative = path.relative_to(self.input_dir).as_posix()
+            digest = sha256_file(path)
+            entry = documents.get(relative)
+            if (
+                entry is not None and entry["status"] == "done" and entry["sha256"] == digest
+                and (self.out_dir / entry["output"]).exists()
+            ):
+                report.skipped += 1
+                continue
+            todo.append((relative, path, digest))
+        logger.info(f"Found {report.discovered} PDF(s), {report.skipped} already done, {len(todo)} to process")
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            in_flight = {}
+            parsed: List[Tuple[str, str, Document]] = []
+            try:
+                while todo or in_flight or parsed:
+                    # Keep the pool a window ahead of generation
+                    while todo and len(in_flight) + len(parsed) < 2 * self.window:
+                        relative, path, digest = todo.popleft()
+                        in_flight[pool.submit(_parse, str(path))] = (relative, digest)
+                    if in_flight and len(parsed) < self.window:
+                        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                        for future in done:
+                            relative, digest = in_flight.pop(future)
+                            try:
+                                parsed.append((relative, digest, future.result()))
+                            except Exception as e:
+                                self._fail(documents, report, relative, digest, f"PDF parsing failed: {e}")
+                        if todo or (in_flight and len(parsed) < self.window):
+                            continue
+                    window, parsed = parsed[:self.window], parsed[self.window:]
+                    self._generate_window(loaded, window, documents, report)
+                    self._write_manifest(manifest)
+            finally:
+                for future in in_flight:
+                    future.cancel()
+                self._write_manifest(manifest)
+
+        report.seconds = round(time.perf_counter() - started, 3)
+        logger.info(
+            f"Batch finished in {report.seconds}s: {report.processed} processed "
+            f"({report.cached} from cache), {report.skipped} skipped, {report.failed} failed"
+        )
+        return report
+
+    def _generate_window(self, loaded, window, documents, report: BatchReport) -> None:
+        tokenizer = loaded.processor.tokenizer
+        plans = []
+        for relative, digest, document in window:
+            started = time.perf_counter()
+            key = requirements_cache_key(loaded, document, self.profile, None, self.overlap_tokens, None)
+            cached = self.cache.get(REQUIREMENTS, key) if self.cache is not None and self.use_cache else None
+            if cached is not None:
+                cached["cache"] = "hit"
+                self._finish(documents, report, relative, digest, document, cached)
+                report.cached += 1
+                continue
+            chunks, input_tokens = plan_chunks(tokenizer, document, self.overlap_tokens)
+            plans.append({
+                "relative": relative,
+                "digest": digest,
+                "document": document,
+                "key": key,
+                "chunks": chunks,
+                "input_tokens": input_tokens,
+                "outputs": [None] * len(chunks),
+                "chunking_seconds": time.perf_counter() - started,
+            })
+
+        # Longest chunks first, so the batches that need the most memory run early
+        work = sorted(
+            ((plan, index) for plan in plans for index in range(len(plan["chunks"]))),
+            key=lambda item: -item[0]["chunks"][item[1]].tokens
+        )
+        started = time.perf_counter()
+        for i in range(0, len(work), self.batch_size):
+            batch = work[i:i + self.batch_size]
+            try:
+                outputs = generate_requirements_batch(
+                    [plan["chunks"][index].text for plan, index in batch],
+                    model_name=self.model_name,
+                    registry=self.registry,
+                    profile=self.profile
+                )
+            except Exception as e:
+                logger.error(f"Generation failed for a batch of {len(batch)} chunk(s): {e}")
+                outputs = [e] * len(batch)
+            for (plan, index), output in zip(batch, outputs):
+                plan["outputs"][index] = output
+        generation_seconds = time.perf_counter() - started
+
+        total_chunks = max(1, len(work))
+        for plan in plans:
+            errors = [output for output in plan["outputs"] if isinstance(output, Exception)]
+            if errors:
+                self._fail(documents, report, plan["relative"], plan["digest"], f"Generation failed: {errors[0]}")
+                continue
+            outputs = plan["outputs"]
+            result = {
+                "requirements": outputs[0] if len(outputs) == 1 else merge_requirements(outputs),
+                "coverage": 1.0,
+                "input_tokens": plan["input_tokens"],
+                "chunks": len(outputs),
+                "chunks_processed": len(outputs),
+                "profile": self.profile.name,
+                "deadline_hit": False,
+                "timings": {
+                    "chunking": round(plan["chunking_seconds"], 3),
+                    # The window's generation time, shared out by chunk count
+                    "generation": round(generation_seconds * len(outputs) / total_chunks, 3),
+                },
+            }
+            if self.cache is not None:
+                self.cache.put(REQUIREMENTS, plan["key"], result)
+            result["cache"] = "miss" if self.use_cache else "bypass"
+            self._finish(documents, report, plan["relative"], plan["digest"], plan["document"], result)
+
+    def _finish(self, documents, report: BatchReport, relative: str, digest: str, document: Document, result) -> None:
+        output = Path(relative).with_suffix(".md").as_posix()
+        target = self.out_dir / output
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(result["requirements"], encoding="utf-8")
+        with open(target.with_suffix(".json"), "w", encoding="utf-8") as f:
+            json.dump(
+                dict(result, source=relative, sha256=digest, pages=len(document.pages), ocr_pages=document.ocr_pages),
+                f,
+                indent=2
+            )
+        documents[relative] = {"status": "done", "sha256": digest, "output": output}
+        report.processed += 1
+
+    def _fail(self, documents, report: BatchReport, relative: str, digest: str, error: str) -> None:
+        logger.error(f"{relative}: {error}")
+        # Failed documents are retried on the next run
+        documents[relative] = {"status": "failed", "sha256": digest, "error": error}
+        report.failed += 1
+        report.failures.append({"source": relative, "error": error})
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        path = self.out_dir / MANIFEST_NAME
+        if not path.exists():
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        path = self.out_dir / MANIFEST_NAME
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
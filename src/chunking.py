@@ -0,0 +1,290 @@
+import re
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.dedup import LINE_GUARD_WORDS, LINE_THRESHOLD, dedupe
+
+logger = logging.getLogger(__name__)
+
+# Markdown headings, numbered headings ("3.2 Security") and short all-caps lines
+HEADING_PATTERN = re.compile(
+    r"^\s*(#{1,6}\s+\S.*|(\d+(\.\d+)*)\.?\s+[A-Z][^.!?]{0,80}|[A-Z][A-Z0-9 &/,\-]{3,80})\s*$"
+)
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+")
+
+# Marks where each page starts in prompts whose output cites pages
+PAGE_MARKER = "[page {}]"
+
+SECTION_TITLES = [
+    "Functional Requirements",
+    "Non-Functional Requirements",
+    "User Stories",
+    "Acceptance Criteria",
+    "Document Summary",
+]
+
+
+@dataclass
+class TextUnit:
+    """
+    The smallest piece of text the chunker moves around: a heading, a
+    paragraph, or a slice of an oversized paragraph.
+    """
+    text: str
+    page: int
+    tokens: int
+    starts_section: bool = False
+    heading: bool = False
+
+
+@dataclass
+class Chunk:
+    """
+    A token-budgeted slice of a document.
+
+    ``tokens`` counts everything sent to the model; ``new_tokens`` excludes
+    the overlap repeated from the previous chunk, so summing ``new_tokens``
+    over all chunks gives the number of distinct input tokens covered.
+    """
+    index: int
+    text: str
+    first_page: int
+    last_page: int
+    tokens: int
+    new_tokens: int
+
+    @property
+    def page(self) -> Optional[int]:
+        """The page the chunk lies on, or None if it spans several."""
+        return self.first_page if self.first_page == self.last_page else None
+
+
+def is_heading(line: str) -> bool:
+    return bool(HEADING_PATTERN.match(line)) and len(line.split()) <= 12
+
+
+def count_tokens(tokenizer, texts: Sequence[str]) -> List[int]:
+    """Token counts for many texts with a single (batched) tokenizer call."""
+    if not texts:
+        return []
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    return [len(ids) for ids in encoded]
+
+
+def _split_page(text: str) -> List[Tuple[str, bool]]:
+    """Split a page into (block, starts_section) pieces at headings and blank lines."""
+    blocks = []
+    current: List[str] = []
+
+    def flush():
+        if current:
+            blocks.append(("\n".join(current).strip(), False))
+            current.clear()
+
+    for line in text.splitlines():
+        if not line.strip():
+            flush()
+        elif is_heading(line):
+            flush()
+            blocks.append((line.strip(), True))
+        else:
+            current.append(line)
+    flush()
+    return [(block, heading) for block, heading in blocks if block]
+
+
+def _hard_split(tokenizer, text: str, max_tokens: int) -> List[str]:
+    ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+    return [
+        tokenizer.decode(ids[i:i + max_tokens])
+        for i in range(0, len(ids), max_tokens)
+    ]
+
+
+def _pieces(pages, page_markers: bool = False) -> List[Tuple[str, int, bool, bool]]:
+    """``(text, page_no, starts_section, heading)`` per block of a document."""
+    if hasattr(pages, "pages"):
+        # A parsed src.document.Document: its blocks are the units already
+        from src.document import HEADING
+
+        blocks = [
+            (page.number, [(block.render(), block.type == HEADING) for block in page.blocks])
+            for page in pages.pages
+        ]
+    else:
+        blocks = [(page_no, _split_page(page_text)) for page_no, page_text in enumerate(pages, start=1)]
+    pieces: List[Tuple[str, int, bool, bool]] = []
+    for page_no, page_blocks in blocks:
+        if page_markers and page_blocks:
+            # Marked as a heading so a chunk never ends on it
+            pieces.append((PAGE_MARKER.format(page_no), page_no, True, True))
+        for i, (block, heading) in enumerate(page_blocks):
+            pieces.append((block, page_no, heading or (i == 0 and not page_markers), heading))
+    return pieces
+
+
+def document_units(pages, tokenizer, max_tokens: int, page_markers: bool = False) -> List[TextUnit]:
+    """
+    Break pages into units no larger than ``max_tokens``.
+
+    ``pages`` is a list of page texts or a ``Document``, whose blocks are
+    used as they are. Headings and page starts are marked so the packer can
+    prefer to cut there; ``page_markers`` adds a ``[page N]`` unit at each
+    page start. Oversized paragraphs are split by sentence and, failing
+    that, by raw token windows.
+    """
+    pieces = _pieces(pages, page_markers)
+
+    counts = count_tokens(tokenizer, [piece[0] for piece in pieces])
+    units: List[TextUnit] = []
+    for (text, page_no, starts_section, heading), tokens in zip(pieces, counts):
+        if tokens <= max_tokens:
+            units.append(TextUnit(text, page_no, tokens, starts_section, heading))
+            continue
+        sentences = SENTENCE_PATTERN.split(text)
+        sentence_counts = count_tokens(tokenizer, sentences)
+        buffer: List[str] = []
+        buffer_tokens = 0
+        first = starts_section
+        for sentence, sentence_tokens in zip(sentences, sentence_counts):
+            if sentence_tokens > max_tokens:
+                parts = _hard_split(tokenizer, sentence, max_tokens)
+            else:
+                parts = [sentence]
+            for part, part_tokens in zip(parts, count_tokens(tokenizer, parts)):
+                if buffer and buffer_tokens + part_tokens > max_tokens:
+                    units.append(TextUnit(" ".join(buffer), page_no, buffer_tokens, first))
+                    buffer, buffer_tokens, first = [], 0, False
+                buffer.append(part)
+                buffer_tokens += part_tokens
+        if buffer:
+            units.append(TextUnit(" ".join(buffer), page_no, buffer_tokens, first))
+    return units
+
+
+def chunk_document(
+    pages,
+    tokenizer,
+    max_tokens: int,
+    overlap_tokens: int = 64,
+    min_fill: float = 0.6,
+    page_markers: bool = False
+) -> List[Chunk]:
+    """
+    Pack a document into chunks of at most ``max_tokens`` tokens.
+
+    Units are packed greedily, but once a chunk is ``min_fill`` full it is
+    closed at the next heading or page break rather than cutting a section in
+    two. Each new chunk starts with up to ``overlap_tokens`` tokens of
+    trailing units from the previous chunk so requirements that straddle a
+    boundary are seen whole at least once.
+    """
+    if max_tokens <= overlap_tokens:
+        raise ValueError("max_tokens must be larger than overlap_tokens")
+    units = document_units(pages, tokenizer, max_tokens - overlap_tokens, page_markers)
+    chunks: List[Chunk] = []
+    current: List[TextUnit] = []
+    overlap: List[TextUnit] = []
+
+    def close():
+        body = overlap + current
+        chunks.append(Chunk(
+            index=len(chunks),
+            # Units are joined with blank lines, which the counts above exclude
+            text="\n\n".join(unit.text for unit in body),
+            first_page=body[0].page,
+            last_page=body[-1].page,
+            tokens=sum(unit.tokens for unit in body),
+            new_tokens=sum(unit.tokens for unit in current),
+        ))
+
+    for unit in units:
+        used = sum(u.tokens for u in overlap) + sum(u.tokens for u in current)
+        full = used + unit.tokens > max_tokens
+        natural_break = unit.starts_section and used >= min_fill * max_tokens
+        if current and (full or natural_break):
+            # Never end a chunk on a bare heading; carry it into the next one
+            carried: List[TextUnit] = []
+            while len(current) > 1 and current[-1].heading:
+                carried.insert(0, current.pop())
+            close()
+            overlap = []
+            budget = overlap_tokens - sum(u.tokens for u in carried)
+            for previous in reversed(current):
+                if previous.tokens > budget:
+                    break
+                overlap.insert(0, previous)
+                budget -= previous.tokens
+            current = carried
+        current.append(unit)
+    if current:
+        close()
+    return chunks
+
+
+def normalize_item(item: str) -> str:
+    """Canonical form of a requirement line used for duplicate detection."""
+    item = re.sub(r"^\s*([-*+]|\d+[.)]|[A-Z]{1,4}-?\d+[:.)]?)\s*", "", item)
+    item = re.sub(r"[^\w\s]", " ", item.lower())
+    return " ".join(item.split())
+
+
+def parse_sections(markdown: str) -> Dict[str, List[str]]:
+    """
+    Split a generated requirements document into its standard sections.
+
+    Each section maps to its non-empty lines (bullets keep their marker so
+    nesting survives the merge). Text before the first known heading is
+    ignored, as are unknown headings' contents.
+    """
+    sections: Dict[str, List[str]] = {title: [] for title in SECTION_TITLES}
+    current: Optional[str] = None
+    for line in markdown.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            title = stripped.lstrip("#").strip().rstrip(":")
+            current = next(
+                (known for known in SECTION_TITLES if known.lower() == title.lower()),
+                None
+            )
+            continue
+        if current is not None and stripped:
+            sections[current].append(line.rstrip())
+    return sections
+
+
+def merge_requirements(documents: Sequence[str], similarity: Optional[float] = LINE_THRESHOLD) -> str:
+    """
+    Merge per-chunk requirements documents into one, dropping duplicates.
+
+    Items are kept in first-seen order. Two items of a section are
+    duplicates when their normalised text matches or, unless ``similarity``
+    is None, when the Jaccard similarity of their word pairs reaches it
+    (MinHash/LSH candidates, confirmed exactly; see ``src.dedup``), which
+    catches chunks rewording the same requirement. Items differing in a
+    negation or modal ("shall" / "shall not") are always kept apart.
+    """
+    merged: Dict[str, List[str]] = {title: [] for title in SECTION_TITLES}
+    keys: Dict[str, List[str]] = {title: [] for title in SECTION_TITLES}
+    seen: Dict[str, set] = {title: set() for title in SECTION_TITLES}
+    for document in documents:
+        for title, lines in parse_sections(document).items():
+            for line in lines:
+                key = normalize_item(line)
+                if not key or key in seen[title]:
+                    continue
+                seen[title].add(key)
+                keys[title].append(key)
+                merged[title].append(line)
+    if similarity is not None:
+        for title in SECTION_TITLES:
+            keep = dedupe(keys[title], similarity, exact=True, guard=LINE_GUARD_WORDS)
+            merged[title] = [merged[title][i] for i in keep]
+
+    output = ["# Requirements Document"]
+    for title in SECTION_TITLES:
+        output.append("")
+        output.append(f"## {title}")
+        output.extend(merged[title])
+    return "\n".join(output).strip() + "\n"
@@ -0,0 +1,354 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from datasets import Dataset, concatenate_datasets
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from src.data.processor import RequirementsProcessor
+from src.dedup import DOCUMENT_SHINGLE_SIZE, DOCUMENT_THRESHOLD, MinHasher, SignatureStore, find_duplicates, text_key
+
+logger = logging.getLogger(__name__)
+
+SPLITS = ("train", "validation", "test")
+MANIFEST_NAME = "manifest.json"
+SIGNATURES_NAME = "signatures.npz"
+DOCUMENT_SUFFIXES = (".json", ".jsonl", ".txt")
+
+
+def content_hash(document: Dict[str, Any]) -> str:
+    """Hash of a source document's text and metadata."""
+    payload = json.dumps(
+        [document.get("text") or "", document.get("metadata") or {}],
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_source_documents(input_dir) -> List[Dict[str, Any]]:
+    """
+    Read raw documents from ``input_dir``.
+
+    ``.json`` files hold one document object (``text``/``metadata``) or a
+    list of them, ``.jsonl`` files one object per line, and ``.txt`` files
+    are a single document each. Every document gets a ``source`` label
+    (``file#index``) for error reports.
+    """
+    documents = []
+    for path in sorted(Path(input_dir).rglob("*")):
+        if path.suffix not in DOCUMENT_SUFFIXES or not path.is_file():
+            continue
+        relative = path.relative_to(input_dir).as_posix()
+        if path.suffix == ".txt":
+            items = [{"text": path.read_text(encoding="utf-8"), "metadata": {"title": path.stem}}]
+        elif path.suffix == ".jsonl":
+            with open(path, encoding="utf-8") as f:
+                items = [json.loads(line) for line in f if line.strip()]
+        else:
+            with open(path, encoding="utf-8") as f:
+                loaded = json.load(f)
+            items = loaded if isinstance(loaded, list) else [loaded]
+        for index, item in enumerate(items):
+            documents.append({
+                "text": item.get("text") or "",
+                "metadata": item.get("metadata") or {},
+                "source": f"{relative}#{index}",
+            })
+    return documents
+
+
+def assign_split(digest: str, ratios: Dict[str, float]) -> str:
+    """
+    Deterministic split for a document hash: the same content always lands
+    in the same split, so rebuilding never leaks documents between splits.
+    """
+    total = sum(ratios.values())
+    point = int(digest[:8], 16) / 2**32 * total
+    for split in SPLITS:
+        point -= ratios.get(split, 0.0)
+        if point < 0:
+            return split
+    return SPLITS[0]
+
+
+@dataclass
+class BuildReport:
+    documents: int = 0
+    processed: int = 0
+    reused: int = 0
+    near_duplicates: int = 0
+    removed: int = 0
+    failed: int = 0
+    rows: Dict[str, int] = field(default_factory=dict)
+    failures: List[Dict[str, str]] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class DatasetBuilder:
+    """
+    Incremental builder for the training/validation/test datasets.
+
+    Source documents are fingerprinted by content and by the processor
+    settings that shape their rows. On each build only documents whose
+    fingerprint is not already on disk are tokenised (with
+    ``Dataset.map(batched=True, num_proc=...)``) and written as a new run of
+    sharded Arrow files under ``output_dir/<split>/run-<n>``; a manifest maps
+    every current fingerprint to its split and run. Changing the tokenizer,
+    lengths or prompt template changes every fingerprint and so rebuilds
+    everything; deleted documents are dropped from the manifest and runs
+    left without live rows are removed.
+
+    Documents whose text nearly duplicates an earlier document's (word
+    5-gram Jaccard similarity of at least ``near_duplicate_threshold``,
+    estimated with MinHash/LSH) are left out; their signatures are kept in
+    ``signatures.npz`` so later builds only hash new documents. Set the
+    threshold to None to keep every document.
+    """
+
+    def __init__(
+        self,
+        processor: RequirementsProcessor,
+        output_dir,
+        ratios: Optional[Dict[str, float]] = None,
+        num_proc: Optional[int] = None,
+        rows_per_shard: int = 10000,
+        near_duplicate_threshold: Optional[float] = DOCUMENT_THRESHOLD
+    ):
+        self.processor = processor
+        self.output_dir = Path(output_dir)
+        self.ratios = ratios or {"train": 0.8, "validation": 0.1, "test": 0.1}
+        self.num_proc = num_proc or os.cpu_count() or 1
+        self.rows_per_shard = rows_per_shard
+        self.near_duplicate_threshold = near_duplicate_threshold
+
+    @classmethod
+    def from_config(cls, processor: RequirementsProcessor, config: Dict[str, Any]) -> "DatasetBuilder":
+        data = config["data"]
+        return cls(
+            processor,
+            data["output_dir"],
+            ratios={
+                "train": data.get("train_ratio", 0.8),
+                "validation": data.get("val_ratio", 0.1),
+                "test": data.get("test_ratio", 0.1),
+            },
+            num_proc=data.get("num_proc"),
+            rows_per_shard=data.get("rows_per_shard", 10000),
+            near_duplicate_threshold=data.get("near_duplicate_threshold", DOCUMENT_THRESHOLD)
+        )
+
+    def processor_signature(self) -> str:
+        """Hash of every processor setting that affects the stored rows."""
+        processor = self.processor
+        tokenizer = processor.tokenizer
+        settings = {
+            "tokenizer": getattr(tokenizer, "name_or_path", type(tokenizer).__name__),
+            "vocab_size": len(tokenizer),
+            "eos_token_id": tokenizer.eos_token_id,
+            "max_length": processor.max_length,
+            "max_prompt_length": processor.max_prompt_length,
+            # Dynamic and packed modes store the same unpadded rows; packing
+            # happens when a split is loaded
+            "layout": "padded" if processor.packing_mode == "max_length" else "unpadded",
+            "template": processor._create_prompt("{text}", {}) + processor._create_target("{text}", {}),
+        }
+        return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def build(self, input_dir, rebuild: bool = False) -> BuildReport:
+        started = time.perf_counter()
+        report = BuildReport()
+        signature = self.processor_signature()
+        manifest = self._read_manifest()
+        if rebuild or manifest.get("signature") != signature:
+            if manifest.get("documents"):
+                logger.info("Processor settings changed; rebuilding all documents")
+            manifest = {"signature": signature, "documents": {}, "next_run": manifest.get("next_run", 0)}
+
+        documents = load_source_documents(input_dir)
+        report.documents = len(documents)
+        if self.near_duplicate_threshold is not None:
+            documents = self._drop_near_duplicates(documents, report)
+
+        known = manifest["documents"]
+        current: Dict[str, Dict[str, Any]] = {}
+        pending: Dict[str, List[Dict[str, Any]]] = {split: [] for split in SPLITS}
+        for document in documents:
+            digest = content_hash(document)
+            fingerprint = hashlib.sha256((signature + digest).encode("utf-8")).hexdigest()
+            if fingerprint in current:
+                continue  # exact duplicate of a document already seen this build
+            if fingerprint in known:
+                current[fingerprint] = known[fingerprint]
+                report.reused += 1
+                continue
+            split = assign_split(digest, self.ratios)
+            current[fingerprint] = {"split": split, "source": document["source"]}
+            pending[split].append(dict(document, fingerprint=fingerprint))
+        report.removed = sum(1 for fingerprint in known if fingerprint not in current)
+
+        for split, split_documents in pending.items():
+            if not split_documents:
+                continue
+            run = f"run-{manifest['next_run']:05d}"
+            manifest["next_run"] += 1
+            dataset = Dataset.from_dict({
+                "text": [doc["text"] for doc in split_documents],
+                "metadata": [json.dumps(doc["metadata"], sort_keys=True) for doc in split_documents],
+                "fingerprint": [doc["fingerprint"] for doc in split_documents],
+                "source": [doc["source"] for doc in split_documents],
+            })
+            processed, failures = self.processor.map_documents(dataset, num_proc=self.num_proc)
+            for failure in failures:
+                # Failed documents are retried on the next build
+                current.pop(failure["fingerprint"], None)
+                report.failures.append({"source": failure["source"], "error": failure["error"]})
+            report.failed += len(failures)
+            report.processed += len(processed)
+            if len(processed):
+                num_shards = max(1, min(len(processed), -(-len(processed) // self.rows_per_shard)))
+                processed.remove_columns("source").save_to_disk(
+                    str(self.output_dir / split / run),
+                    num_shards=num_shards,
+                    num_proc=min(self.num_proc, num_shards) if num_shards > 1 else None
+                )
+                for fingerprint in processed["fingerprint"]:
+                    current[fingerprint]["run"] = run
+
+        manifest["documents"] = current
+        manifest["failures"] = report.failures
+        self._collect_garbage(current)
+        self._write_manifest(manifest)
+
+        for split in SPLITS:
+            report.rows[split] = sum(1 for entry in current.values() if entry["split"] == split)
+        report.seconds = time.perf_counter() - started
+        logger.info(
+            f"Dataset build: {report.documents} documents, {report.processed} processed, "
+            f"{report.reused} reused, {report.near_duplicates} near-duplicates skipped, "
+            f"{report.removed} removed, {report.failed} failed "
+            f"in {report.seconds:.1f}s; rows {report.rows}"
+        )
+        for failure in report.failures:
+            logger.warning(f"Failed to process {failure['source']}: {failure['error']}")
+        return report
+
+    def load_split(self, split: str = "train") -> Dataset:
+        """
+        Load the current rows of a split, packed when the processor is in
+        ``packed`` mode.
+        """
+        manifest = self._read_manifest()
+        if manifest.get("signature") != self.processor_signature():
+            raise FileNotFoundError(
+                f"No dataset built with the current processor settings in {self.output_dir}"
+            )
+        live = {
+            fingerprint for fingerprint, entry in manifest["documents"].items()
+            if entry["split"] == split
+        }
+        runs = sorted({manifest["documents"][fingerprint]["run"] for fingerprint in live})
+        if not runs:
+            raise FileNotFoundError(f"Split {split!r} is empty in {self.output_dir}")
+        dataset = concatenate_datasets([
+            Dataset.load_from_disk(str(self.output_dir / split / run)) for run in runs
+        ])
+        dataset = dataset.filter(lambda fingerprint: fingerprint in live, input_columns="fingerprint")
+        dataset = dataset.remove_columns("fingerprint")
+        if self.processor.packing_mode == "packed":
+            return self.processor.pack_dataset(dataset)
+        return dataset
+
+    def _drop_near_duplicates(self, documents: List[Dict[str, Any]], report: BuildReport) -> List[Dict[str, Any]]:
+        store = SignatureStore(self.output_dir / SIGNATURES_NAME, MinHasher(shingle_size=DOCUMENT_SHINGLE_SIZE))
+        texts = [document["text"] for document in documents]
+        keys = [text_key(text) for text in texts]
+        duplicate_of = find_duplicates(store.signatures(texts, keys), self.near_duplicate_threshold)
+        store.save(keep=keys)
+        kept = []
+        for document, earlier in zip(documents, duplicate_of):
+            if earlier < 0:
+                kept.append(document)
+            else:
+                logger.debug(f"{document['source']} nearly duplicates {documents[earlier]['source']}")
+        report.near_duplicates = len(documents) - len(kept)
+        logger.info(f"MinHash: {store.hashed} new document(s) hashed, {report.near_duplicates} near-duplicate(s)")
+        return kept
+
+    def _collect_garbage(self, current: Dict[str, Dict[str, Any]]) -> None:
+        live_runs = {(entry["split"], entry.get("run")) for entry in current.values()}
+        for split in SPLITS:
+            split_dir = self.output_dir / split
+            if not split_dir.exists():
+                continue
+            for run_dir in split_dir.iterdir():
+                if run_dir.is_dir() and (split, run_dir.name) not in live_runs:
+                    shutil.rmtree(run_dir)
+                    logger.info(f"Removed stale dataset run {run_dir}")
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        path = self.output_dir / MANIFEST_NAME
+        if not path.exists():
+            return {}
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / MANIFEST_NAME
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Build the tokenised train/validation/test datasets")
+    parser.add_argument("--config", default="configs/training_config.json")
+    parser.add_argument("--num-proc", type=int, default=None)
+    parser.add_argument("--packing-mode", default=None, help="Overrides data.packing_mode")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore previously built shards")
+    parser.add_argument("--keep-near-duplicates", action="store_true", help="Skip MinHash near-duplicate removal")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = json.load(f)
+
+    from transformers import AutoTokenizer
+
+    cache_dir = Path(config["paths"].get("model_cache_dir", "models/cache"))
+    if not cache_dir.exists():
+        logger.error("Model cache not found. Please run download_model.py first.")
+        return
+    tokenizer = AutoTokenizer.from_pretrained(cache_dir)
+    processor = RequirementsProcessor(
+        tokenizer,
+        max_length=config["model"]["max_length"],
+        max_prompt_length=config["model"]["max_prompt_length"],
+        packing_mode=args.packing_mode or config["data"].get("packing_mode", "max_length")
+    )
+    builder = DatasetBuilder.from_config(processor, config)
+    if args.num_proc:
+        builder.num_proc = args.num_proc
+    if args.keep_near_duplicates:
+        builder.near_duplicate_threshold = None
+    report = builder.build(config["data"]["input_dir"], rebuild=args.rebuild)
+    print(json.dumps(report.to_dict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import random
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import torch
+from torch.utils.data import Sampler
+
+logger = logging.getLogger(__name__)
+
+IGNORE_INDEX = -100
+
+
+def build_example(
+    prompt_ids: Sequence[int],
+    target_ids: Sequence[int],
+    eos_token_id: int,
+    max_length: int
+) -> Dict[str, List[int]]:
+    """
+    Join a tokenised prompt and target into one causal-LM example.
+
+    Only target tokens (and the closing EOS) are supervised; prompt positions
+    are labelled ``IGNORE_INDEX``.
+    """
+    target = list(target_ids) + [eos_token_id]
+    input_ids = (list(prompt_ids) + target)[:max_length]
+    labels = ([IGNORE_INDEX] * len(prompt_ids) + target)[:max_length]
+    return {"input_ids": input_ids, "labels": labels}
+
+
+def pack_examples(
+    examples: Sequence[Dict[str, List[int]]],
+    max_length: int,
+    pad_token_id: int
+) -> List[Dict[str, List[int]]]:
+    """
+    Pack variable-length examples into fixed ``max_length`` sequences.
+
+    Uses first-fit decreasing bin packing. Every packed row carries
+    ``position_ids`` that restart at 0 for each example and ``segment_ids``
+    (1, 2, ... per example, 0 for padding) so attention can be restricted to
+    each example's own tokens (see ``PackedCollator``). The first label of
+    every example is masked so no example learns to predict across a
+    boundary.
+    """
+    order = sorted(range(len(examples)), key=lambda i: len(examples[i]["input_ids"]), reverse=True)
+    bins: List[List[int]] = []
+    free: List[int] = []
+    for index in order:
+        length = len(examples[index]["input_ids"])
+        for b, space in enumerate(free):
+            if length <= space:
+                bins[b].append(index)
+                free[b] -= length
+                break
+        else:
+            bins.append([index])
+            free.append(max_length - length)
+
+    packed = []
+    for members in bins:
+        input_ids: List[int] = []
+        labels: List[int] = []
+        position_ids: List[int] = []
+        segment_ids: List[int] = []
+        for segment, index in enumerate(members, start=1):
+            example = examples[index]
+            length = len(example["input_ids"])
+            input_ids.extend(example["input_ids"])
+            labels.append(IGNORE_INDEX)
+            labels.extend(example["labels"][1:])
+            position_ids.extend(range(length))
+            segment_ids.extend([segment] * length)
+        padding = max_length - len(input_ids)
+        packed.append({
+            "input_ids": input_ids + [pad_token_id] * padding,
+            "labels": labels + [IGNORE_INDEX] * padding,
+            "attention_mask": [1] * len(input_ids) + [0] * padding,
+            "position_ids": position_ids + [0] * padding,
+            "segment_ids": segment_ids + [0] * padding,
+        })
+    return packed
+
+
+def block_causal_mask(segment_ids: torch.Tensor, dtype: torch.dtype = torch.float32) -> torch.Tensor:
+    """
+    Additive 4D attention mask (batch, 1, seq, seq) that is causal within
+    each packed segment and blocks attention across segments and padding.
+    """
+    seq_len = segment_ids.shape[-1]
+    same_segment = segment_ids[:, :, None] == segment_ids[:, None, :]
+    causal = torch.ones(seq_len, seq_len, dtype=torch.bool, device=segment_ids.device).tril()
+    allowed = same_segment & causal & (segment_ids[:, :, None] > 0)
+    # Padding rows attend to themselves so softmax never sees an all-masked row
+    allowed |= torch.eye(seq_len, dtype=torch.bool, device=segment_ids.device)
+    mask = torch.zeros(allowed.shape, dtype=dtype, device=segment_ids.device)
+    mask.masked_fill_(~allowed, torch.finfo(dtype).min)
+    return mask[:, None, :, :]
+
+
+class PackedCollator:
+    """
+    Stacks packed rows into tensors.
+
+    By default the 1D ``attention_mask`` is replaced by a 4D block-causal
+    mask (in ``mask_dtype``, the model's compute dtype) so packed examples
+    cannot attend to each other. With ``block_diagonal=False`` the mask is
+    left out and the reset ``position_ids`` alone mark the boundaries, which
+    only isolates examples under padding-free flash-attention kernels
+    (``attn_implementation="flash_attention_2"``); any other attention
+    would let examples attend across boundaries.
+    """
+
+    def __init__(self, block_diagonal: bool = True, mask_dtype: torch.dtype = torch.float32):
+        self.block_diagonal = block_diagonal
+        self.mask_dtype = mask_dtype
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        batch = {
+            key: torch.tensor([feature[key] for feature in features], dtype=torch.long)
+            for key in ("input_ids", "labels", "position_ids")
+        }
+        if self.block_diagonal:
+            segment_ids = torch.tensor([feature["segment_ids"] for feature in features], dtype=torch.long)
+            batch["attention_mask"] = block_causal_mask(segment_ids, self.mask_dtype)
+        return batch
+
+
+class DynamicPaddingCollator:
+    """
+    Right-pads unpacked examples to the longest sequence in the batch.
+    Pair it with ``LengthBucketBatchSampler`` to keep that padding small.
+    """
+
+    def __init__(self, pad_token_id: int, pad_to_multiple_of: Optional[int] = 8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        longest = max(len(feature["input_ids"]) for feature in features)
+        if self.pad_to_multiple_of:
+            longest = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        input_ids, labels, attention_mask = [], [], []
+        for feature in features:
+            padding = longest - len(feature["input_ids"])
+            input_ids.append(list(feature["input_ids"]) + [self.pad_token_id] * padding)
+            labels.append(list(feature["labels"]) + [IGNORE_INDEX] * padding)
+            attention_mask.append([1] * len(feature["input_ids"]) + [0] * padding)
+        return {
+            "input_ids": torch.tensor(input_ids, dtype=torch.long),
+            "labels": torch.tensor(labels, dtype=torch.long),
+            "attention_mask": torch.tensor(attention_mask, dtype=torch.long),
+        }
+
+
+def bucketed_batches(
+    lengths: Sequence[int],
+    batch_size: int,
+    bucket_multiplier: int = 50,
+    seed: int = 0,
+    drop_last: bool = False
+) -> List[List[int]]:
+    """
+    Group indices into batches of similar length.
+
+    Indices are shuffled, cut into buckets of ``batch_size * bucket_multiplier``,
+    sorted by length within each bucket and split into batches; the batch
+    order is then shuffled so training still sees lengths in random order.
+    """
+    rng = random.Random(seed)
+    indices = list(range(len(lengths)))
+    rng.shuffle(indices)
+    bucket_size = batch_size * bucket_multiplier
+    batches = []
+    for start in range(0, len(indices), bucket_size):
+        bucket = sorted(indices[start:start + bucket_size], key=lambda i: lengths[i])
+        for i in range(0, len(bucket), batch_size):
+            batch = bucket[i:i + batch_size]
+            if len(batch) == batch_size or not drop_last:
+                batches.append(batch)
+    rng.shuffle(batches)
+    return batches
+
+
+class LengthBucketBatchSampler(Sampler):
+    """
+    Batch sampler yielding length-bucketed batches (see ``bucketed_batches``),
+    reshuffled every epoch.
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        bucket_multiplier: int = 50,
+        seed: int = 0,
+        drop_last: bool = False
+    ):
+        self.lengths = list(lengths)
+        self.batch_size = batch_size
+        self.bucket_multiplier = bucket_multiplier
+        self.seed = seed
+        self.drop_last = drop_last
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int) -> None:
+        self.epoch = epoch
+
+    def __iter__(self) -> Iterator[List[int]]:
+        batches = bucketed_batches(
+            self.lengths,
+            self.batch_size,
+            self.bucket_multiplier,
+            seed=self.seed + self.epoch,
+            drop_last=self.drop_last
+        )
+        self.epoch += 1
+        return iter(batches)
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return -(-len(self.lengths) // self.batch_size)
+
+
+def token_efficiency(
+    lengths: Sequence[int],
+    batch_size: int,
+    max_length: int,
+    padded_slots: Optional[int] = None,
+    seed: int = 0
+) -> Dict[str, float]:
+    """
+    Fraction of token slots per step that hold real tokens, per strategy.
+
+    ``padded`` pads every example to ``padded_slots`` (default
+    ``max_length``); ``dynamic`` pads random batches to their longest member;
+    ``bucketed`` does the same over length-bucketed batches; ``packed`` packs
+    examples into ``max_length`` rows.
+    """
+    lengths = [min(length, max_length) for length in lengths]
+    real = sum(lengths)
+    if not real:
+        return {}
+    padded_slots = padded_slots or max_length
+
+    def batch_slots(batches):
+        return sum(len(batch) * max(lengths[i] for i in batch) for batch in batches)
+
+    rng = random.Random(seed)
+    shuffled = list(range(len(lengths)))
+    rng.shuffle(shuffled)
+    random_batches = [shuffled[i:i + batch_size] for i in range(0, len(shuffled), batch_size)]
+    packed_rows = len(pack_examples(
+        [{"input_ids": [0] * length, "labels": [0] * length} for length in lengths],
+        max_length,
+        pad_token_id=0
+    ))
+    return {
+        "padded": real / (len(lengths) * padded_slots),
+        "dynamic": real / batch_slots(random_batches),
+        "bucketed": real / batch_slots(bucketed_batches(lengths, batch_size, seed=seed)),
+        "packed": real / (packed_rows * max_length),
+    }
@@ -1,27 +1,56 @@
 import os
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from datasets import Dataset
 from transformers import PreTrainedTokenizer
 import logging
 from pathlib import Path
 
+from src.data.packing import build_example, pack_examples, token_efficiency
+from src.dedup import DOCUMENT_SHINGLE_SIZE, MinHasher, dedupe
+
 logger = logging.getLogger(__name__)
 
+PACKING_MODES = ("max_length", "dynamic", "packed")
+
+
+def documents_to_dataset(documents: List[Dict[str, Any]]) -> Dataset:
+    """
+    Columnar dataset of raw documents for ``RequirementsProcessor.map_documents``.
+    Metadata is stored as JSON so documents with different keys share a schema.
+    """
+    return Dataset.from_dict({
+        "text": [doc.get("text") or "" for doc in documents],
+        "metadata": [json.dumps(doc.get("metadata") or {}, sort_keys=True) for doc in documents],
+    })
+
 class RequirementsProcessor:
     """
     Processor for handling requirements documents and preparing them for training.
+    
+    ``packing_mode`` selects how ``prepare_dataset`` lays out sequences:
+    
+    - ``"max_length"``: the original layout, prompt and target each padded
+      to a fixed length.
+    - ``"dynamic"``: one unpadded prompt+target example per row, for
+      ``DynamicPaddingCollator`` with ``LengthBucketBatchSampler``.
+    - ``"packed"``: several examples packed into each ``max_length`` row, for
+      ``PackedCollator``.
     """
     
     def __init__(
         self,
         tokenizer: PreTrainedTokenizer,
         max_length: int = 2048,
-        max_prompt_length: int = 512
+        max_prompt_length: int = 512,
+        packing_mode: str = "max_length"
     ):
+        if packing_mode not in PACKING_MODES:
+            raise ValueError(f"packing_mode must be one of {PACKING_MODES}")
         self.tokenizer = tokenizer
         self.max_length = max_length
         self.max_prompt_length = max_prompt_length
+        self.packing_mode = packing_mode
         
     def process_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -107,25 +136,178 @@ Format the output in markdown."""
         
         return target
     
+    def tokenize_documents(self, documents: List[Dict[str, Any]]) -> List[Dict[str, List[int]]]:
+        """
+        Tokenise many documents into unpadded prompt+target examples using
+        one batched (fast tokenizer) call for prompts and one for targets.
+        """
+        prompts = []
+        targets = []
+        for doc in documents:
+            text = doc.get("text", "")
+            metadata = doc.get("metadata", {})
+            prompts.append(self._create_prompt(text, metadata))
+            targets.append(self._create_target(text, metadata))
+        
+        prompt_ids = self.tokenizer(
+            prompts,
+            max_length=self.max_prompt_length,
+            truncation=True,
+            add_special_tokens=False
+        )["input_ids"]
+        target_ids = self.tokenizer(
+            targets,
+            # Leave room for the EOS appended by build_example
+            max_length=self.max_length - self.max_prompt_length - 1,
+            truncation=True,
+            add_special_tokens=False
+        )["input_ids"]
+        
+        return [
+            build_example(prompt, target, self.tokenizer.eos_token_id, self.max_length)
+            for prompt, target in zip(prompt_ids, target_ids)
+        ]
+    
     def prepare_dataset(
         self,
         documents: List[Dict[str, Any]],
-        split: str = "train"
+        split: str = "train",
+        num_proc: Optional[int] = None,
+        near_duplicate_threshold: Optional[float] = None
     ) -> Dataset:
         """
         Prepare a dataset from a list of documents.
+        
+        Documents are tokenised with ``Dataset.map`` (see ``map_documents``);
+        failures are counted and logged rather than aborting the split. With
+        ``near_duplicate_threshold`` set, documents nearly duplicating an
+        earlier one are dropped first (``src.dedup``). For an incremental,
+        on-disk build use ``src.data.builder.DatasetBuilder``.
+        """
+        if near_duplicate_threshold is not None:
+            keep = dedupe(
+                [doc.get("text") or "" for doc in documents],
+                near_duplicate_threshold,
+                MinHasher(shingle_size=DOCUMENT_SHINGLE_SIZE)
+            )
+            logger.info(f"Dropped {len(documents) - len(keep)} near-duplicate {split} documents")
+            documents = [documents[i] for i in keep]
+        dataset = documents_to_dataset(documents)
+        processed, failures = self.map_documents(dataset, num_proc=num_proc)
+        logger.info(
+            f"Prepared {split} split: {len(processed)} documents processed, {len(failures)} failed"
+        )
+        
+        if self.packing_mode != "max_length":
+            self.log_token_efficiency([len(ids) for ids in processed["input_ids"]])
+            if self.packing_mode == "packed":
+                return self.pack_dataset(processed)
+        return processed
+    
+    def pack_dataset(self, dataset: Dataset) -> Dataset:
+        """Pack unpadded prompt+target rows into ``max_length`` sequences."""
+        examples = pack_examples(
+            [{"input_ids": row["input_ids"], "labels": row["labels"]} for row in dataset],
+            self.max_length,
+            self.tokenizer.pad_token_id
+        )
+        logger.info(f"Packed {len(dataset)} documents into {len(examples)} sequences")
+        return Dataset.from_list(examples)
+    
+    def process_batch(self, batch: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
         """
-        processed_data = []
+        ``Dataset.map(batched=True)`` function turning a batch of documents
+        (``text`` and JSON-encoded ``metadata`` columns) into training rows.
         
-        for doc in documents:
-            try:
-                processed = self.process_document(doc)
-                processed_data.append(processed)
-            except Exception as e:
-                logger.error(f"Error processing document: {e}")
-                continue
-        
-        return Dataset.from_list(processed_data)
+        Documents that fail are not dropped silently: they come back as rows
+        with an ``error`` message so callers can count and report them. Any
+        other input columns (e.g. a source fingerprint) are passed through.
+        """
+        documents = [
+            {
+                "text": text or "",
+                "metadata": json.loads(metadata) if isinstance(metadata, str) else (metadata or {})
+            }
+            for text, metadata in zip(batch["text"], batch["metadata"])
+        ]
+        passthrough = [key for key in batch if key not in ("text", "metadata")]
+        
+        if self.packing_mode == "max_length":
+            columns = ("input_ids", "attention_mask", "labels")
+        else:
+            columns = ("input_ids", "labels")
+        
+        def process_one(document):
+            if self.packing_mode == "max_length":
+                processed = self.process_document(document)
+                return {key: processed[key].tolist() for key in columns}
+            return self.tokenize_documents([document])[0]
+        
+        try:
+            # One batched tokenizer call for the whole batch when possible
+            if self.packing_mode == "max_length":
+                results = [process_one(document) for document in documents]
+            else:
+                results = self.tokenize_documents(documents)
+            errors = [""] * len(documents)
+        except Exception:
+            # Isolate the failing documents
+            results, errors = [], []
+            for document in documents:
+                try:
+                    results.append(process_one(document))
+                    errors.append("")
+                except Exception as e:
+                    results.append({key: [] for key in columns})
+                    errors.append(f"{type(e).__name__}: {e}")
+        
+        output = {key: [result[key] for result in results] for key in columns}
+        output["error"] = errors
+        for key in passthrough:
+            output[key] = batch[key]
+        return output
+    
+    def map_documents(
+        self,
+        dataset: Dataset,
+        num_proc: Optional[int] = None,
+        batch_size: int = 256
+    ) -> Tuple[Dataset, List[Dict[str, Any]]]:
+        """
+        Tokenise a dataset of documents with ``Dataset.map`` across
+        ``num_proc`` processes. Returns the successfully processed rows and a
+        list of failures (error message plus passthrough columns).
+        """
+        if num_proc is not None:
+            num_proc = max(1, min(num_proc, len(dataset))) if len(dataset) else None
+        processed = dataset.map(
+            self.process_batch,
+            batched=True,
+            batch_size=batch_size,
+            num_proc=num_proc if num_proc and num_proc > 1 else None,
+            remove_columns=["text", "metadata"],
+            desc="Tokenizing documents"
+        )
+        failed = processed.filter(lambda error: bool(error), input_columns="error")
+        failures = [
+            {key: value for key, value in row.items() if key not in ("input_ids", "attention_mask", "labels")}
+            for row in failed
+        ]
+        processed = processed.filter(lambda error: not error, input_columns="error").remove_columns("error")
+        if failures:
+            logger.warning(f"{len(failures)} of {len(dataset)} documents failed to process")
+        return processed, failures
+    
+    def log_token_efficiency(self, lengths: List[int], batch_size: int = 4) -> Dict[str, float]:
+        """
+        Log the share of real (non-pad) tokens per training step under each
+        layout, compared with the fixed-length padding of ``process_document``.
+        """
+        efficiency = token_efficiency(lengths, batch_size, self.max_length, padded_slots=self.max_length)
+        if efficiency:
+            summary = ", ".join(f"{mode} {value:.1%}" for mode, value in efficiency.items())
+            logger.info(f"Token efficiency per step: {summary}")
+        return efficiency
     
     def save_dataset(
         self,
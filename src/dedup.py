@@ -0,0 +1,329 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NUM_PERM = 64
+# Requirement lines are short, so they are shingled by word pairs; documents
+# use longer shingles so shared boilerplate matters less.
+LINE_SHINGLE_SIZE = 2
+LINE_THRESHOLD = 0.7
+# Negations and modals change what a requirement demands while barely
+# moving its similarity ("shall not encrypt ..." vs "shall encrypt ..."
+# scores 0.77), so lines are only duplicates when they use the same ones.
+LINE_GUARD_WORDS = frozenset({"not", "no", "never", "cannot", "shall", "should", "may", "must"})
+DOCUMENT_SHINGLE_SIZE = 5
+DOCUMENT_THRESHOLD = 0.85
+CANDIDATE_MARGIN = 0.15
+
+_BYTE_BASE = 0x100000001B3  # FNV-1a 64-bit prime: odd, so invertible mod 2**64
+_BATCH_TEXTS = 100_000
+# Words are runs of ASCII letters, digits and underscores plus any non-ASCII
+# character; every other ASCII character separates them. Defined on bytes so
+# the batch hasher can split UTF-8 with one table lookup.
+_SEPARATOR_CODES = [code for code in range(128) if not (chr(code).isalnum() or code == ord("_"))]
+_SEPARATORS = {code: " " for code in _SEPARATOR_CODES}
+_SEPARATOR_BYTES = np.zeros(256, dtype=bool)
+_SEPARATOR_BYTES[_SEPARATOR_CODES] = True
+
+
+def normalize_text(text: str) -> str:
+    """Lower-cased words separated by single spaces; punctuation is dropped."""
+    return " ".join(word for word in text.lower().translate(_SEPARATORS).split(" ") if word)
+
+
+_power_tables: Dict[int, np.ndarray] = {}
+
+
+def _powers(base: int, count: int) -> np.ndarray:
+    """``base**i mod 2**64`` for ``i`` in ``range(count)``, kept between batches."""
+    table = _power_tables.get(base)
+    if table is None or len(table) < count:
+        powers = np.full(max(count, 1 << 20), base, dtype=np.uint64)
+        powers[0] = 1
+        with np.errstate(over="ignore"):
+            table = _power_tables[base] = np.cumprod(powers, dtype=np.uint64)
+    return table[:count]
+
+
+class MinHasher:
+    """
+    MinHash signatures of word shingles, computed with NumPy.
+
+    A batch of texts is joined into one byte buffer; every word is hashed at
+    once from prefix sums of a polynomial hash (no Python loop over words),
+    consecutive words are combined into ``shingle_size``-word shingles, and
+    each of ``num_perm`` multiply-shift hash functions is minimised per text
+    with ``np.minimum.reduceat``. Texts with fewer words than
+    ``shingle_size`` are one shingle. Hash values depend only on the
+    parameters, so signatures can be stored and compared across runs.
+    """
+
+    def __init__(self, num_perm: int = DEFAULT_NUM_PERM, shingle_size: int = LINE_SHINGLE_SIZE, seed: int = 1):
+        if num_perm < 1 or shingle_size < 1:
+            raise ValueError("num_perm and shingle_size must be positive")
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+        self._word_weights = rng.integers(1, 1 << 63, size=shingle_size, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+
+    @property
+    def params(self) -> Tuple[int, int, int]:
+        return (self.num_perm, self.shingle_size, self.seed)
+
+    def shingles(self, text: str) -> set:
+        """A text's shingles as Python tuples, for exact Jaccard checks."""
+        words = normalize_text(text).split()
+        k = self.shingle_size
+        if len(words) <= k:
+            return {tuple(words)} if words else set()
+        return {tuple(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+    def signatures(self, texts: Sequence[str]) -> np.ndarray:
+        """``(len(texts), num_perm)`` uint32 signatures; empty texts get all-ones rows."""
+        signatures = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        for start in range(0, len(texts), _BATCH_TEXTS):
+            batch = texts[start:start + _BATCH_TEXTS]
+            signatures[start:start + len(batch)] = self._batch_signatures(batch)
+        return signatures
+
+    def _shingle_hashes(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """64-bit hashes of every shingle and the index of the text it came from."""
+        # Newlines mark where texts end, so the texts' own become spaces
+        data = "\n".join(text.replace("\n", " ") for text in texts).lower().encode("utf-8")
+        if not data:
+            return np.empty(0, np.uint64), np.empty(0, np.int64)
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        separator = _SEPARATOR_BYTES[buffer]
+        previous = np.concatenate(([True], separator[:-1]))
+        following = np.concatenate((separator[1:], [True]))
+        starts = np.flatnonzero(~separator & previous)
+        ends = np.flatnonzero(~separator & following) + 1
+        text_of_word = np.searchsorted(np.flatnonzero(buffer == 10), starts)
+
+        with np.errstate(over="ignore"):
+            prefix = np.concatenate((
+                np.zeros(1, np.uint64),
+                np.cumsum((buffer.astype(np.uint64) + np.uint64(1)) * _powers(_BYTE_BASE, len(buffer)), dtype=np.uint64),
+            ))
+            inverse = _powers(pow(_BYTE_BASE, -1, 1 << 64), len(buffer))
+            words = (prefix[ends] - prefix[starts]) * inverse[starts]
+            # Length in the hash keeps "ab" and "a" "b" apart
+            words ^= (ends - starts).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+
+            counts = np.bincount(text_of_word, minlength=len(texts))
+            first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+            position = np.arange(len(words)) - first[text_of_word]
+            in_text = counts[text_of_word]
+            k = self.shingle_size
+            valid = (position + k <= in_text) | ((position == 0) & (in_text < k))
+            index = np.flatnonzero(valid)
+            length = np.minimum(k, in_text[index])
+            hashes = np.zeros(len(index), np.uint64)
+            for offset in range(k):
+                take = offset < length
+                hashes[take] += words[index[take] + offset] * self._word_weights[offset]
+        return hashes, text_of_word[index]
+
+    def _batch_signatures(self, texts: Sequence[str]) -> np.ndarray:
+        signatures = np.full((len(texts), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        hashes, text_of_shingle = self._shingle_hashes(texts)
+        if not len(hashes):
+            return signatures
+        # Shingles are grouped by text already, in text order
+        segment_starts = np.flatnonzero(np.diff(text_of_shingle, prepend=-1))
+        owners = text_of_shingle[segment_starts]
+        # Filled one permutation per row, which keeps the writes contiguous
+        minima = np.empty((self.num_perm, len(owners)), dtype=np.uint32)
+        values = np.empty(len(hashes), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for perm in range(self.num_perm):
+                np.multiply(hashes, self._a[perm], out=values)
+                values += self._b[perm]
+                values >>= np.uint64(32)
+                minima[perm] = np.minimum.reduceat(values, segment_starts)
+        signatures[owners] = minima.T
+        return signatures
+
+
+def lsh_params(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    ``(bands, rows)`` with ``bands * rows <= num_perm`` whose S-curve
+    midpoint ``(1 / bands) ** (1 / rows)`` is closest to ``threshold``.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        distance = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or distance < best[0]:
+            best = (distance, bands, rows)
+    return best[1], best[2]
+
+
+def find_duplicates(
+    signatures: np.ndarray,
+    threshold: float,
+    verify: Optional[Callable[[int, int], bool]] = None
+) -> np.ndarray:
+    """
+    For each row, the index of an earlier near-duplicate row, or -1.
+
+    Rows are bucketed by locality-sensitive hashing: the signature is cut
+    into bands and rows sharing a band land in the same bucket. Each row is
+    then compared only with the first row of its buckets (signature
+    agreement at least ``threshold``, or ``verify(row, earlier)`` when
+    given), so the work grows with the number of rows rather than the number
+    of pairs. Later copies point at the earliest row they match, so keeping
+    every row with -1 keeps one representative of each group.
+    """
+    count, num_perm = signatures.shape
+    duplicate_of = np.full(count, count, dtype=np.int64)
+    empty = (signatures == np.iinfo(np.uint32).max).all(axis=1)
+    # Buckets are tuned below the threshold so pairs just above it, whose
+    # signatures may agree a little less than their true similarity, are
+    # still compared
+    bands, rows = lsh_params(num_perm, max(0.05, threshold - CANDIDATE_MARGIN))
+    weights = np.random.default_rng(0).integers(1, 1 << 63, size=rows, dtype=np.uint64) | np.uint64(1)
+    for band in range(bands):
+        columns = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        with np.errstate(over="ignore"):
+            keys = (columns * weights).sum(axis=1, dtype=np.uint64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        new_group = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        group = np.cumsum(new_group) - 1
+        representative = order[np.flatnonzero(new_group)][group]
+        candidates = np.flatnonzero((representative != order) & ~empty[order])
+        items, earlier = order[candidates], representative[candidates]
+        # Skip pairs already settled on an earlier (or equal) row
+        open_ = earlier < duplicate_of[items]
+        items, earlier = items[open_], earlier[open_]
+        if not len(items):
+            continue
+        agreement = (signatures[items] == signatures[earlier]).mean(axis=1)
+        # With an exact check to follow, only clear misses are dropped here
+        similar = agreement >= (threshold if verify is None else threshold - CANDIDATE_MARGIN)
+        items, earlier = items[similar], earlier[similar]
+        if verify is not None:
+            keep = np.fromiter((verify(int(i), int(j)) for i, j in zip(items, earlier)), bool, len(items))
+            items, earlier = items[keep], earlier[keep]
+        np.minimum.at(duplicate_of, items, earlier)
+    duplicate_of[duplicate_of == count] = -1
+    return duplicate_of
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def guard_words(text: str, words: frozenset = LINE_GUARD_WORDS) -> frozenset:
+    """Which of ``words`` a text uses."""
+    return frozenset(normalize_text(text).split()) & words
+
+
+def dedupe(
+    texts: Sequence[str],
+    threshold: float = LINE_THRESHOLD,
+    hasher: MinHasher = None,
+    exact: bool = False,
+    guard: Optional[frozenset] = None
+) -> List[int]:
+    """
+    Indices of ``texts`` to keep, in order, dropping near-duplicates of
+    earlier texts. ``exact`` confirms each candidate pair by the true
+    Jaccard similarity of its shingles, which is cheap for small inputs and
+    removes MinHash's estimation error. With ``guard`` (e.g.
+    ``LINE_GUARD_WORDS``) pairs are also confirmed exactly and only merged
+    when both texts use the same guard words.
+    """
+    hasher = hasher or MinHasher()
+    if len(texts) < 2:
+        return list(range(len(texts)))
+    verify = None
+    if exact or guard:
+        shingles: Dict[int, set] = {}
+
+        def shingle_set(index: int) -> set:
+            if index not in shingles:
+                shingles[index] = hasher.shingles(texts[index])
+            return shingles[index]
+
+        def verify(i: int, j: int) -> bool:
+            if guard and guard_words(texts[i], guard) != guard_words(texts[j], guard):
+                return False
+            return jaccard(shingle_set(i), shingle_set(j)) >= threshold
+
+    duplicate_of = find_duplicates(hasher.signatures(texts), threshold, verify)
+    return np.flatnonzero(duplicate_of < 0).tolist()
+
+
+def text_key(text: str) -> str:
+    """Key of a text's normalised content in a ``SignatureStore``."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+
+class SignatureStore:
+    """
+    MinHash signatures persisted by content key in one ``.npz`` file.
+
+    Kept next to a dataset so a rebuild only hashes items it has not seen;
+    the file is discarded if it was written with different hasher
+    parameters.
+    """
+
+    def __init__(self, path, hasher: MinHasher):
+        self.path = Path(path)
+        self.hasher = hasher
+        self._rows: Dict[str, np.ndarray] = {}
+        self.hashed = 0
+        if self.path.exists():
+            with np.load(self.path) as stored:
+                if tuple(stored["params"].tolist()) == hasher.params:
+                    self._rows = dict(zip(stored["keys"].tolist(), stored["signatures"]))
+                else:
+                    logger.info(f"MinHash parameters changed; ignoring {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def signatures(self, texts: Sequence[str], keys: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Signatures of ``texts``, hashing only those whose key is not stored."""
+        keys = list(keys) if keys is not None else [text_key(text) for text in texts]
+        missing = [i for i, key in enumerate(keys) if key not in self._rows]
+        if missing:
+            fresh = self.hasher.signatures([texts[i] for i in missing])
+            for i, row in zip(missing, fresh):
+                self._rows[keys[i]] = row
+            self.hashed += len(missing)
+        if not keys:
+            return np.empty((0, self.hasher.num_perm), np.uint32)
+        return np.stack([self._rows[key] for key in keys])
+
+    def save(self, keep: Optional[Sequence[str]] = None) -> None:
+        """Write the store atomically, pruned to the ``keep`` keys when given."""
+        if keep is not None:
+            keep = set(keep)
+            self._rows = {key: row for key, row in self._rows.items() if key in keep}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                params=np.array(self.hasher.params),
+                keys=np.array(list(self._rows), dtype="U32"),
+                signatures=(
+                    np.stack(list(self._rows.values())) if self._rows
+                    else np.empty((0, self.hasher.num_perm), np.uint32)
+                ),
+            )
+        os.replace(tmp, self.path)
@@ -0,0 +1,230 @@
+import re
+import statistics
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.chunking import is_heading
+
+HEADING = "heading"
+PARAGRAPH = "paragraph"
+LIST = "list"
+TABLE = "table"
+BLOCK_TYPES = (HEADING, PARAGRAPH, LIST, TABLE)
+
+# Where a page's blocks came from
+TEXT_LAYER = "text"
+OCR = "ocr"
+NO_TEXT = "none"
+
+LIST_PATTERN = re.compile(r"^\s*([-*•▪●–]|\(?\d{1,3}[.)]|\(?[a-z][.)])\s+\S")
+# Table cells are separated by tabs, pipes or runs of spaces
+CELL_SEPARATOR = re.compile(r"\t+|\s*\|\s*|\s{3,}")
+
+# (x0, y0, x1, y1) in PDF points, origin at the bottom left of the page
+BBox = Tuple[float, float, float, float]
+
+
+class Block:
+    """
+    One run of page content: a heading, paragraph, list or table.
+
+    ``bbox`` is approximate (derived from text positions or OCR word boxes)
+    and None when the PDF does not expose usable positions. Table rows are
+    stored one per line with tab-separated cells.
+    """
+    __slots__ = ("type", "text", "bbox")
+
+    def __init__(self, type: str, text: str, bbox: Optional[BBox] = None):
+        self.type = type
+        self.text = text
+        self.bbox = bbox
+
+    def render(self) -> str:
+        """The block as prompt text: markdown headings and tables."""
+        if self.type == HEADING:
+            return self.text if self.text.startswith("#") else f"## {self.text}"
+        if self.type == TABLE:
+            rows = [row.split("\t") for row in self.text.splitlines()]
+            lines = ["| " + " | ".join(cell.strip() for cell in row) + " |" for row in rows]
+            if len(lines) > 1:
+                lines.insert(1, "|" + "---|" * len(rows[0]))
+            return "\n".join(lines)
+        return self.text
+
+    def to_list(self) -> list:
+        return [self.type, self.text, list(self.bbox) if self.bbox else None]
+
+    @classmethod
+    def from_list(cls, data: list) -> "Block":
+        return cls(data[0], data[1], tuple(data[2]) if data[2] else None)
+
+    def __repr__(self) -> str:
+        return f"Block({self.type!r}, {self.text[:40]!r})"
+
+
+class Page:
+    """A page's blocks in reading order, and whether they came from OCR."""
+    __slots__ = ("number", "blocks", "source", "width", "height")
+
+    def __init__(
+        self,
+        number: int,
+        blocks: List[Block],
+        source: str = TEXT_LAYER,
+        width: Optional[float] = None,
+        height: Optional[float] = None
+    ):
+        self.number = number
+        self.blocks = blocks
+        self.source = source
+        self.width = width
+        self.height = height
+
+    def text(self) -> str:
+        return "\n\n".join(block.render() for block in self.blocks)
+
+    def to_list(self) -> list:
+        return [self.number, self.source, self.width, self.height, [block.to_list() for block in self.blocks]]
+
+    @classmethod
+    def from_list(cls, data: list) -> "Page":
+        return cls(data[0], [Block.from_list(block) for block in data[4]], data[1], data[2], data[3])
+
+
+class Document:
+    """
+    The parsed structure of an uploaded PDF.
+
+    Built once per upload (``src.pdf_extraction.extract_document``) and
+    cached by file hash in its compact list form (``to_dict``); chunking and
+    the prompts work from its blocks rather than re-parsing flat text.
+    """
+    __slots__ = ("pages",)
+
+    def __init__(self, pages: List[Page]):
+        self.pages = pages
+
+    def page_texts(self) -> List[str]:
+        return [page.text() for page in self.pages]
+
+    def text(self, page_markers: bool = False) -> str:
+        """All pages' text; ``page_markers`` prefixes each page with ``[page N]``."""
+        if page_markers:
+            from src.chunking import PAGE_MARKER
+
+            texts = [
+                f"{PAGE_MARKER.format(page.number)}\n\n{text}"
+                for page, text in zip(self.pages, self.page_texts()) if text
+            ]
+        else:
+            texts = [text for text in self.page_texts() if text]
+        return "\n\n".join(texts).strip()
+
+    @property
+    def ocr_pages(self) -> int:
+        return sum(1 for page in self.pages if page.source == OCR)
+
+    @property
+    def empty_pages(self) -> int:
+        return sum(1 for page in self.pages if not page.blocks)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": 1, "pages": [page.to_list() for page in self.pages]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Document":
+        return cls([Page.from_list(page) for page in data["pages"]])
+
+    @classmethod
+    def from_page_texts(cls, texts: Sequence[str]) -> "Document":
+        """A document from flat per-page text, split into blocks heuristically."""
+        return cls([
+            Page(number, blocks_from_lines([(line, None, None) for line in text.splitlines()]))
+            for number, text in enumerate(texts, start=1)
+        ])
+
+
+def split_cells(line: str) -> List[str]:
+    return [cell for cell in CELL_SEPARATOR.split(line.strip()) if cell]
+
+
+def _merge_bbox(a: Optional[BBox], b: Optional[BBox]) -> Optional[BBox]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def blocks_from_lines(lines: Sequence[Tuple[str, Optional[float], Optional[BBox]]]) -> List[Block]:
+    """
+    Group text lines, each ``(text, font_size, bbox)``, into typed blocks.
+
+    Headings are lines set noticeably larger than the page's body text (or
+    that look like headings when sizes are unknown); consecutive lines with
+    two or more cells form a table; bullet and numbered lines form lists;
+    blank lines and large vertical gaps end paragraphs.
+    """
+    sizes = [size for text, size, _ in lines if size and text.strip()]
+    body_size = statistics.median(sizes) if sizes else None
+    gaps = [
+        previous[2][1] - current[2][1]
+        for previous, current in zip(lines, lines[1:])
+        if previous[2] and current[2] and previous[2][1] > current[2][1]
+    ]
+    line_gap = statistics.median(gaps) if gaps else None
+    if line_gap and body_size:
+        # With few lines the median may itself be a paragraph gap
+        line_gap = min(line_gap, body_size * 1.3)
+
+    def classify(index: int) -> str:
+        text, size, _ = lines[index]
+        stripped = text.strip()
+        if body_size and size and size >= body_size * 1.15 and len(stripped.split()) <= 12:
+            return HEADING
+        if is_heading(stripped):
+            return HEADING
+        if len(split_cells(text)) >= 2:
+            neighbours = [lines[j][0] for j in (index - 1, index + 1) if 0 <= j < len(lines)]
+            if any(len(split_cells(other)) >= 2 for other in neighbours):
+                return TABLE
+        if LIST_PATTERN.match(text):
+            return LIST
+        return PARAGRAPH
+
+    blocks: List[Block] = []
+    current_type, current_lines, current_bbox = None, [], None
+    previous_bbox = None
+
+    def flush():
+        nonlocal current_type, current_lines, current_bbox
+        if current_lines:
+            if current_type == TABLE:
+                text = "\n".join("\t".join(split_cells(line)) for line in current_lines)
+            else:
+                text = "\n".join(line.strip() for line in current_lines)
+            blocks.append(Block(current_type, text, current_bbox))
+        current_type, current_lines, current_bbox = None, [], None
+
+    for index, (text, _, bbox) in enumerate(lines):
+        if not text.strip():
+            flush()
+            previous_bbox = None
+            continue
+        kind = classify(index)
+        gap_break = (
+            line_gap is not None and bbox is not None and previous_bbox is not None
+            and previous_bbox[1] - bbox[1] > line_gap * 1.6
+        )
+        # List items continue over wrapped lines until the next marker
+        continues_list = current_type == LIST and kind == PARAGRAPH and not gap_break
+        if kind == HEADING or gap_break or (kind != current_type and not continues_list):
+            flush()
+        if kind == HEADING:
+            blocks.append(Block(HEADING, text.strip(), bbox))
+        else:
+            current_type = current_type if continues_list else kind
+            current_lines.append(text)
+            current_bbox = _merge_bbox(current_bbox, bbox)
+        previous_bbox = bbox
+    flush()
+    return blocks
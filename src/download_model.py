@@ -1,4 +1,6 @@
 import os
+import argparse
+import json
 import torch
 from transformers import Qwen2VLForConditionalGeneration, AutoTokenizer, AutoProcessor
 import logging
@@ -8,10 +10,10 @@ import shutil
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def download_model():
-    # Model configuration
-    model_name = "Qwen/Qwen2-VL-2B-Instruct"
-    cache_dir = Path("models/cache")
+DEFAULT_CONFIG = "configs/training_config.json"
+
+def download_model(model_name, cache_dir):
+    cache_dir = Path(cache_dir)
     cache_dir.mkdir(parents=True, exist_ok=True)
     
     logger.info(f"Starting download of {model_name}")
@@ -57,7 +59,6 @@ def download_model():
         }
         
         with open(cache_dir / "model_info.json", "w") as f:
-            import json
             json.dump(model_info, f, indent=2)
         
         logger.info(f"Model info saved to {cache_dir}/model_info.json")
@@ -82,5 +83,18 @@ def download_model():
         logger.error(f"Error downloading model: {e}")
         raise
 
+def main():
+    parser = argparse.ArgumentParser(description="Download the base model into the training model cache")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument("--model", default=None, help="Overrides model.name from the config")
+    args = parser.parse_args()
+    
+    with open(args.config) as f:
+        config = json.load(f)
+    download_model(
+        args.model or config["model"]["name"],
+        config["paths"].get("model_cache_dir", "models/cache")
+    )
+
 if __name__ == "__main__":
-    download_model() 
\ No newline at end of file
+    main()
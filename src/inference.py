@@ -1,69 +1,81 @@
 import torch
-from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+import json
 import logging
 from pathlib import Path
-import PyPDF2
 import os
+import sys
+import threading
+import functools
+import time
+
+# Allow running as a script (python src/inference.py) as well as a module
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+from src.document import Document
+from src.pdf_extraction import extract_document, extract_text_from_pdf, iter_pdf_pages
+from src.chunking import Chunk, chunk_document, count_tokens, merge_requirements
+from src.serving.batching import MicroBatcher
+from src.serving.prefix_cache import cache_for_batch, disable_prefix_cache, get_prefix_state, prefixed_batch
+from src.serving.metrics import count_tokens as record_tokens, metrics, observe_stage, stage
+from src.serving.cache import DOCUMENTS, REQUIREMENTS, ResultCache, get_cache, pages_hash, params_key, sha256_file, sha256_stream
+from src.serving.profiles import GenerationProfile, get_profile
+from src.serving.registry import DEFAULT_MODEL_KEY, ModelRegistry, get_registry
+from src.serving.speculative import Speculation, assisted_generate, resolve_speculation
+from src.structured import (
+    JSON_INSTRUCTIONS,
+    JSON_PREFIX,
+    JSON_REPLY_START,
+    OUTPUT_FORMATS,
+    merge_structured,
+    parse_requirements,
+    to_markdown,
+)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(pdf_path):
-    """Extract text from a PDF file."""
-    try:
-        with open(pdf_path, 'rb') as file:
-            # Create PDF reader object
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            # Get the number of pages
-            num_pages = len(pdf_reader.pages)
-            logger.info(f"Processing PDF with {num_pages} pages")
-            
-            # Extract text from all pages
-            text = ""
-            for page_num in range(num_pages):
-                # Get the page object
-                page = pdf_reader.pages[page_num]
-                # Extract text from the page
-                text += page.extract_text()
-                logger.info(f"Processed page {page_num + 1}/{num_pages}")
-            
-            return text.strip()
-    except Exception as e:
-        logger.error(f"Error extracting text from PDF: {str(e)}")
-        raise
+# Prompts (instructions plus document text) are truncated to this many tokens
+PROMPT_MAX_LENGTH = 1024
 
-def generate_requirements(text):
-    # Model configuration
-    model_name = "Qwen/Qwen2-VL-2B-Instruct"
-    project_root = Path(__file__).parent.parent
-    model_path = project_root / "final_model"
+class StopWhen(StoppingCriteria):
+    """Stop generation as soon as a callback (e.g. job cancellation) fires."""
     
-    if not model_path.exists():
-        logger.error("Trained model not found. Please run train.py first.")
-        return
+    def __init__(self, should_stop):
+        self.should_stop = should_stop
     
-    logger.info("Loading trained model and processor")
+    def __call__(self, input_ids, scores, **kwargs):
+        return bool(self.should_stop())
+
+class DecodeTimer(StoppingCriteria):
+    """
+    Splits a generate call into prefill (until the first new token, which
+    is when stopping criteria first run) and decode for the stage metrics.
+    """
     
-    try:
-        # Load processor from original model
-        processor = AutoProcessor.from_pretrained(
-            model_name,
-            trust_remote_code=True
-        )
-        
-        # Load fine-tuned model
-        model = Qwen2VLForConditionalGeneration.from_pretrained(
-            model_path,
-            torch_dtype=torch.float16,
-            device_map="auto",
-            trust_remote_code=True
-        )
-        
-        # Create the prompt
-        prompt = f"""Analyze the following text and extract key functional and non-functional requirements. Organize the extracted information into a structured requirements document.
+    def __init__(self):
+        self.start()
+    
+    def start(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+    
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return False
+    
+    def observe(self, attention_mask, outputs, prompt_length, pad_token_id):
+        if self.first_token_at is not None:
+            observe_stage("prefill", self.first_token_at - self.started)
+            observe_stage("decode", time.perf_counter() - self.first_token_at)
+        record_tokens("in", int(attention_mask.sum()))
+        record_tokens("out", int((outputs[:, prompt_length:] != pad_token_id).sum()))
 
-{text}
+# Static instructions come first so every prompt starts with the same tokens,
+# whose keys/values are computed once per loaded model (see prefix_cache)
+PROMPT_INSTRUCTIONS = """Analyze the document at the end of this prompt and extract key functional and non-functional requirements. Organize the extracted information into a structured requirements document.
 
 # Guidelines:
 # - Identify and categorize requirements into functional and non-functional types.
@@ -91,74 +103,727 @@ def generate_requirements(text):
 # ## Document Summary
 # - Provide a concise overview summarizing the document's key insights.
 
-# Ensure the extracted content follows this structure while maintaining clarity and completeness."""
-        
-        # Process the input
-        inputs = processor(
-            text=prompt,
-            return_tensors="pt",
-            padding=True,
-            truncation=True,
-            max_length=1024
-        ).to(model.device)
-        
-        # Get the prompt length
-        prompt_length = inputs['input_ids'].shape[1]
+# Ensure the extracted content follows this structure while maintaining clarity and completeness.
+
+# Document:
+"""
+
+def prompt_parts(output_format="markdown"):
+    """``(instructions, suffix)`` around the document text for an output format."""
+    if output_format == "json":
+        return JSON_INSTRUCTIONS, JSON_PREFIX
+    if output_format != "markdown":
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+    return PROMPT_INSTRUCTIONS, ""
+
+def build_prompt(text, output_format="markdown"):
+    """Build the requirements-extraction prompt for a document (text or ``Document``)."""
+    instructions, suffix = prompt_parts(output_format)
+    if isinstance(text, Document):
+        text = text.text(page_markers=output_format == "json")
+    return instructions + text + suffix
+
+def clean_generated_text(generated_text):
+    """Strip any echoed prompt text from a decoded generation."""
+    try:
+        # Remove any remaining prompt text if present
+        end_idx = generated_text.find("Extract and structure software requirements")
+        if end_idx != -1:
+            generated_text = generated_text[:end_idx].strip()
+    except Exception as e:
+        logger.error(f"Error processing generated text: {str(e)}")
+    return generated_text
+
+def _generate(loaded, texts, streamer=None, speculation: Speculation = None, output_format="markdown", **generate_kwargs):
+    """
+    Run ``model.generate`` on ``build_prompt(text, output_format)`` for each
+    text and return ``(outputs, prompt_length)``.
+    
+    The instruction prefix's cached keys/values are reused when possible, so
+    only the document tokens are prefilled; if the model rejects the cache
+    the prompt is encoded in full (and prefix reuse is turned off for it).
+    With ``speculation`` (a single text) decoding is assisted by drafted
+    tokens instead; the draft side keeps its own cache, so the prompt is
+    always prefilled in full.
+    """
+    model = loaded.model
+    processor = loaded.processor
+    tokenizer = processor.tokenizer
+    # Decoder-only generation needs left padding so every prompt ends at the same column
+    tokenizer.padding_side = "left"
+    pad_token_id = generate_kwargs.get("pad_token_id", tokenizer.pad_token_id)
+    
+    timer = None
+    if metrics.enabled:
+        timer = DecodeTimer()
+        criteria = list(generate_kwargs.get("stopping_criteria") or [])
+        generate_kwargs["stopping_criteria"] = StoppingCriteriaList(criteria + [timer])
+    
+    instructions, suffix = prompt_parts(output_format)
+    state = None
+    if speculation is None and all(text.strip() for text in texts):
+        state = get_prefix_state(loaded, instructions)
+    with torch.inference_mode():
+        if state is not None:
+            with stage("tokenize"):
+                input_ids, attention_mask = prefixed_batch(
+                    state, tokenizer, [text + suffix for text in texts], PROMPT_MAX_LENGTH,
+                    tokenizer.pad_token_id, device=model.device
+                )
+            rows = len(texts) * generate_kwargs.get("num_beams", 1) * generate_kwargs.get("num_return_sequences", 1)
+            try:
+                if timer is not None:
+                    timer.start()
+                outputs = model.generate(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    past_key_values=cache_for_batch(state, rows),
+                    streamer=streamer,
+                    **generate_kwargs
+                )
+                if timer is not None:
+                    timer.observe(attention_mask, outputs, input_ids.shape[1], pad_token_id)
+                return outputs, input_ids.shape[1]
+            except Exception as e:
+                disable_prefix_cache(loaded, e)
+                if streamer is not None:
+                    # The failed call already consumed the prompt
+                    streamer.next_tokens_are_prompt = True
         
-        # Generate output
-        logger.info("Generating requirements...")
-        outputs = model.generate(
-            **inputs,
-            max_new_tokens=1024,
-            temperature=0.8,
-            top_p=0.95,
-            do_sample=True,
-            pad_token_id=processor.tokenizer.pad_token_id,
-            eos_token_id=processor.tokenizer.eos_token_id,
-            repetition_penalty=1.5,
-            num_beams=5,
-            early_stopping=True,
-            no_repeat_ngram_size=3
+        with stage("tokenize"):
+            inputs = processor(
+                text=[build_prompt(text, output_format) for text in texts],
+                return_tensors="pt",
+                padding=True,
+                truncation=True,
+                max_length=PROMPT_MAX_LENGTH
+            ).to(model.device)
+        if timer is not None:
+            timer.start()
+        if speculation is not None:
+            outputs = assisted_generate(model, speculation, streamer=streamer, **inputs, **generate_kwargs)
+        else:
+            outputs = model.generate(**inputs, streamer=streamer, **generate_kwargs)
+        prompt_length = inputs["input_ids"].shape[1]
+        if timer is not None:
+            timer.observe(inputs["attention_mask"], outputs, prompt_length, pad_token_id)
+        return outputs, prompt_length
+
+def resolve_profile(profile=None) -> GenerationProfile:
+    return profile if isinstance(profile, GenerationProfile) else get_profile(profile)
+
+def generate_requirements_batch(texts, model_name=DEFAULT_MODEL_KEY, registry: ModelRegistry = None, should_stop=None, max_new_tokens=None, profile=None, max_time=None, output_format="markdown"):
+    """
+    Generate requirements for several documents with one batched generate call.
+    
+    Decoding follows the named generation ``profile``; ``max_new_tokens``
+    and ``max_time`` may tighten its token cap and latency budget. Profiles
+    that speculate decode the documents one at a time, since assisted
+    generation verifies a single sequence per call. With ``output_format``
+    "json" each reply is returned as JSON text (see ``src.structured``),
+    starting with the object opening the prompt forced.
+    """
+    registry = registry or get_registry()
+    profile = resolve_profile(profile)
+    max_new_tokens = max_new_tokens or profile.max_new_tokens
+    max_time = profile.latency_budget_seconds if max_time is None else min(max_time, profile.latency_budget_seconds)
+    
+    # Shared model and processor, loaded once per process
+    loaded = registry.get(model_name)
+    processor = loaded.processor
+    
+    # Let callers (e.g. a cancelled or timed-out job) interrupt decoding
+    stopping_criteria = StoppingCriteriaList()
+    if should_stop is not None:
+        stopping_criteria.append(StopWhen(should_stop))
+    
+    generate_kwargs = dict(
+        max_new_tokens=max_new_tokens,
+        max_time=max_time,
+        pad_token_id=processor.tokenizer.pad_token_id,
+        eos_token_id=processor.tokenizer.eos_token_id,
+        stopping_criteria=stopping_criteria,
+        **profile.generate_kwargs
+    )
+    speculation = resolve_speculation(profile, registry)
+    
+    # Generate output
+    logger.info(f"Generating requirements for {len(texts)} document(s) with the {profile.name} profile...")
+    if speculation is None:
+        groups = [texts]
+    else:
+        groups = [[text] for text in texts]
+    generated = []
+    for group in groups:
+        outputs, prompt_length = _generate(
+            loaded, group, speculation=speculation, output_format=output_format, **generate_kwargs
         )
-        
         # Decode only the generated part (excluding the prompt)
-        generated_text = processor.decode(outputs[0][prompt_length:], skip_special_tokens=True)
+        generated.extend(processor.batch_decode(outputs[:, prompt_length:], skip_special_tokens=True))
+    
+    if should_stop is not None and should_stop():
+        logger.info("Generation stopped before completion")
+    
+    if output_format == "json":
+        return [JSON_REPLY_START + text for text in generated]
+    return [clean_generated_text(text) for text in generated]
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+def get_batcher(model_name=DEFAULT_MODEL_KEY, profile=None, output_format="markdown", max_new_tokens=None):
+    """
+    Process-wide micro-batcher for a model, generation profile, output
+    format and token cap, or None when batching is disabled. Single
+    documents and the chunks of chunked extraction share it, so concurrent
+    uploads fill the same generate calls.
+    
+    Configured through GENERATION_MAX_BATCH_SIZE (default 1, i.e. off) and
+    GENERATION_MAX_WAIT_MS.
+    """
+    max_batch_size = int(os.environ.get("GENERATION_MAX_BATCH_SIZE", "1"))
+    if max_batch_size <= 1:
+        return None
+    profile = resolve_profile(profile)
+    key = (model_name, profile.name, output_format, max_new_tokens)
+    with _batchers_lock:
+        if key not in _batchers:
+            _batchers[key] = MicroBatcher(
+                functools.partial(
+                    generate_requirements_batch,
+                    model_name=model_name,
+                    profile=profile,
+                    output_format=output_format,
+                    max_new_tokens=max_new_tokens
+                ),
+                max_batch_size=max_batch_size,
+                max_wait_ms=float(os.environ.get("GENERATION_MAX_WAIT_MS", "20")),
+                name=f"generate-{model_name}-{profile.name}-{output_format}"
+            )
+        return _batchers[key]
+
+def generate_batched(batcher, texts, should_stop=None):
+    """
+    Submit ``texts`` to a shared micro-batcher and wait for their outputs.
+    
+    Every text is queued at once, so they share generate calls with each
+    other and with concurrent callers. A text still queued once
+    ``should_stop`` fires is skipped, and a running batch is only
+    interrupted when all of its callers have given up. Returns the outputs
+    of the texts completed, in order, up to the first one skipped.
+    """
+    futures = [batcher.submit(text, should_stop=should_stop) for text in texts]
+    outputs = []
+    for future in futures:
+        output = future.result()
+        if output is None:
+            break
+        outputs.append(output)
+    for future in futures[len(outputs):]:
+        future.cancel()
+    return outputs
+
+def save_requirements(generated_text):
+    """Save generated requirements to the output directory."""
+    output_dir = Path("output")
+    output_dir.mkdir(exist_ok=True)
+    
+    output_file = output_dir / "generated_requirements.md"
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(generated_text)
+    logger.info(f"Requirements saved to {output_file}")
+
+def generate_requirements(text, model_name=DEFAULT_MODEL_KEY, registry: ModelRegistry = None, should_stop=None, profile=None):
+    """
+    Generate requirements for a single text.
+    
+    Goes through ``generate_requirements_chunked``, so text longer than one
+    prompt is split into chunks rather than truncated, and concurrent
+    callers share the micro-batcher when batching is on.
+    """
+    registry = registry or get_registry()
+    
+    if not registry.is_available(model_name):
+        logger.error("Trained model not found. Please run train.py first.")
+        return
+    
+    try:
+        result = generate_requirements_chunked(
+            [text],
+            model_name=model_name,
+            registry=registry,
+            should_stop=should_stop,
+            profile=profile
+        )
+        if result["coverage"] < 1.0:
+            logger.warning(
+                f"Only {result['coverage']:.0%} of the text reached the model "
+                f"({result['chunks_processed']} of {result['chunks']} chunk(s))"
+            )
+        return result["requirements"]
+    except Exception as e:
+        logger.error(f"Error generating requirements: {str(e)}")
+        return f"Error generating requirements: {str(e)}"
+
+class TimedTextStreamer(TextIteratorStreamer):
+    """
+    TextIteratorStreamer that records when the first new token arrives.
+    
+    While ``keep_open`` is set, the end of a generate call only flushes its
+    text, so several prompts can stream their replies one after another;
+    ``start_reply`` puts a marker (e.g. the ``Chunk``) in front of each.
+    """
+    
+    def __init__(self, tokenizer, **kwargs):
+        super().__init__(tokenizer, **kwargs)
+        self.first_token_at = None
+        self.generated_tokens = 0
+        self.ended = False
+        self.keep_open = False
+    
+    def put(self, value):
+        if not (self.skip_prompt and self.next_tokens_are_prompt):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self.generated_tokens += value.numel()
+        super().put(value)
+    
+    def start_reply(self, marker):
+        self.text_queue.put(marker, timeout=self.timeout)
+    
+    def on_finalized_text(self, text, stream_end=False):
+        super().on_finalized_text(text, stream_end=stream_end and not self.keep_open)
+    
+    def end(self):
+        # Called by generate() and by cleanup of a job that never ran
+        if self.keep_open:
+            # Flushes the reply and resets prompt skipping for the next one
+            super().end()
+        elif not self.ended:
+            self.ended = True
+            super().end()
+
+class RequirementsStream:
+    """
+    Iterator over generated text for one document.
+    
+    Generation runs in the background (see ``stream_requirements``); iterating
+    yields decoded text as it is produced. Documents longer than one prompt
+    are answered chunk by chunk: ``chunk`` is the ``Chunk`` whose reply is
+    being streamed, and ``result()`` merges the replies streamed so far.
+    Timing is available from ``metrics()`` once the first token has arrived.
+    """
+    
+    def __init__(self, streamer, started_at, prompt_tokens, profile, output_format="markdown", chunks=(), input_tokens=0):
+        self.streamer = streamer
+        self.started_at = started_at
+        self.prompt_tokens = prompt_tokens
+        self.profile = profile
+        self.output_format = output_format
+        self.chunks = list(chunks)
+        self.input_tokens = input_tokens
+        self.chunk = None
+        self.chunks_processed = 0
+        self.deadline_hit = False
+        self.finished_at = None
+        self.error = None
+        self.stop_event = threading.Event()
+        self._replies = []
+    
+    def __iter__(self):
+        for text in self.streamer:
+            if isinstance(text, Chunk):
+                self.chunk = text
+                self._replies.append([])
+                if self.output_format == "json":
+                    # The reply continues the object the prompt opened
+                    self._replies[-1].append(JSON_REPLY_START)
+                    yield JSON_REPLY_START
+                elif len(self._replies) > 1:
+                    yield "\n\n"
+            elif text:
+                self._replies[-1].append(text)
+                yield text
+    
+    @property
+    def outputs(self):
+        """The reply of each chunk streamed so far."""
+        return ["".join(reply) for reply in self._replies]
+    
+    def result(self):
+        """``(requirements, structured)`` merged from the replies streamed so far (see ``merge_chunk_outputs``)."""
+        outputs = self.outputs
+        if self.output_format != "json":
+            outputs = [clean_generated_text(output) for output in outputs]
+        return merge_chunk_outputs(self.chunks, outputs, self.output_format)
+    
+    def close(self):
+        """Ask the background generation to stop (e.g. the client went away)."""
+        self.stop_event.set()
+    
+    @property
+    def time_to_first_token(self):
+        if self.streamer.first_token_at is None:
+            return None
+        return self.streamer.first_token_at - self.started_at
+    
+    def metrics(self):
+        finished_at = self.finished_at or time.perf_counter()
+        ttft = self.time_to_first_token
+        decode_seconds = finished_at - self.streamer.first_token_at if ttft is not None else None
+        seen_tokens = sum(chunk.new_tokens for chunk in self.chunks[:self.chunks_processed])
+        return {
+            "profile": self.profile,
+            "prompt_tokens": self.prompt_tokens,
+            "chunks": len(self.chunks),
+            "chunks_processed": self.chunks_processed,
+            "coverage": round(seen_tokens / self.input_tokens, 4) if self.input_tokens else 1.0,
+            "deadline_hit": self.deadline_hit,
+            "generated_tokens": self.streamer.generated_tokens,
+            "time_to_first_token": round(ttft, 4) if ttft is not None else None,
+            "total_seconds": round(finished_at - self.started_at, 4),
+            "tokens_per_second": (
+                round(self.streamer.generated_tokens / decode_seconds, 2)
+                if decode_seconds else None
+            ),
+        }
+
+def _start_in_thread(work, stream):
+    threading.Thread(target=work, name="stream-generate", daemon=True).start()
+
+def stream_requirements(pages, model_name=DEFAULT_MODEL_KEY, registry: ModelRegistry = None, profile=None, max_new_tokens=None, start=None, output_format="markdown", overlap_tokens=64, max_chunks=None):
+    """
+    Start generating requirements for ``pages`` (a text, page texts or a
+    ``Document``) and return a ``RequirementsStream``.
+    
+    The document is split like ``generate_requirements_chunked`` does, so
+    nothing past one prompt's length is dropped: the chunks are answered one
+    after another on the same stream, each reply preceded by its ``Chunk``,
+    until the profile's latency budget runs out.
+    
+    ``profile`` must be a single-sequence generation profile: beam search
+    cannot stream because beams are only resolved at the end. With
+    ``output_format`` "json" each reply is a JSON reply, which
+    ``src.structured.StreamingItemParser`` turns into items as it arrives.
+    
+    ``start(work, stream)`` must schedule ``work`` (which takes an optional
+    ``should_stop`` keyword); by default it runs on a daemon thread. The
+    backend submits it to the job pool so streaming shares the same worker
+    limits, calling ``stream.streamer.end`` if the job is dropped unstarted.
+    """
+    profile = resolve_profile(profile)
+    if not profile.streamable:
+        raise ValueError(f"Generation profile {profile.name!r} cannot be streamed")
+    registry = registry or get_registry()
+    if isinstance(pages, str):
+        pages = [pages]
+    
+    loaded = registry.get(model_name)
+    processor = loaded.processor
+    
+    started_at = time.perf_counter()
+    chunks, input_tokens = plan_chunks(processor.tokenizer, pages, overlap_tokens, max_chunks, output_format)
+    prompt_tokens = sum(count_tokens(processor.tokenizer, [build_prompt(chunk.text, output_format) for chunk in chunks]))
+    
+    streamer = TimedTextStreamer(processor.tokenizer, skip_prompt=True, skip_special_tokens=True)
+    stream = RequirementsStream(streamer, started_at, prompt_tokens, profile.name, output_format, chunks, input_tokens)
+    
+    def work(should_stop=None):
+        def stopped():
+            return stream.stop_event.is_set() or (should_stop is not None and should_stop())
         
-        # Clean up the output
+        stopping_criteria = StoppingCriteriaList([StopWhen(stopped)])
+        deadline = time.perf_counter() + profile.latency_budget_seconds
+        # The streamer stays open across chunks and ends after the last one
+        streamer.keep_open = True
         try:
-            # Remove any remaining prompt text if present
-            end_idx = generated_text.find("Extract and structure software requirements")
-            if end_idx != -1:
-                generated_text = generated_text[:end_idx].strip()
+            for chunk in chunks:
+                if stopped():
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    stream.deadline_hit = True
+                    logger.warning(f"Latency budget of the {profile.name} profile reached after {stream.chunks_processed} chunk(s)")
+                    break
+                streamer.start_reply(chunk)
+                _generate(
+                    loaded,
+                    [chunk.text],
+                    streamer=streamer,
+                    speculation=resolve_speculation(profile, registry),
+                    output_format=output_format,
+                    max_new_tokens=max_new_tokens or profile.max_new_tokens,
+                    max_time=remaining,
+                    pad_token_id=processor.tokenizer.pad_token_id,
+                    eos_token_id=processor.tokenizer.eos_token_id,
+                    stopping_criteria=stopping_criteria,
+                    **profile.generate_kwargs
+                )
+                stream.chunks_processed += 1
+                # max_time ends decoding early, so a reply that ran into the
+                # deadline may be cut short
+                stream.deadline_hit = time.perf_counter() >= deadline
         except Exception as e:
-            logger.error(f"Error processing generated text: {str(e)}")
-        
-        # Save the output to a file
-        output_dir = Path("output")
-        output_dir.mkdir(exist_ok=True)
-        
-        output_file = output_dir / "generated_requirements.md"
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(generated_text)
-        logger.info(f"Requirements saved to {output_file}")
+            logger.error(f"Error streaming requirements: {str(e)}")
+            stream.error = str(e)
+        finally:
+            stream.finished_at = time.perf_counter()
+            streamer.keep_open = False
+            streamer.end()
+            ttft = stream.time_to_first_token
+            if ttft is not None:
+                logger.info(
+                    f"Streamed {streamer.generated_tokens} tokens for {stream.chunks_processed}/{len(chunks)} chunk(s), "
+                    f"time to first token {ttft:.3f}s"
+                )
+        return None
+    
+    (start or _start_in_thread)(work, stream)
+    return stream
+
+def prompt_overhead_tokens(tokenizer, output_format="markdown"):
+    """Tokens taken by the prompt template itself, i.e. unavailable to document text."""
+    # Small margin for tokens merging differently at the text boundaries
+    return count_tokens(tokenizer, [build_prompt("", output_format)])[0] + 8
+
+def requirements_cache_key(loaded, pages, profile: GenerationProfile, max_new_tokens=None, overlap_tokens=64, max_chunks=None, output_format="markdown"):
+    """Cache key of a document's requirements: its text, the model revision and every generation setting."""
+    if isinstance(pages, Document):
+        pages = pages.page_texts()
+    return params_key(
+        pages_hash(pages),
+        loaded.revision,
+        build_prompt("", output_format),
+        profile.cache_key(),
+        PROMPT_MAX_LENGTH,
+        max_new_tokens,
+        overlap_tokens,
+        max_chunks,
+        output_format
+    )
+
+def plan_chunks(tokenizer, pages, overlap_tokens=64, max_chunks=None, output_format="markdown"):
+    """
+    Split pages (texts or a ``Document``) into prompt-sized chunks; returns
+    ``(chunks, input_tokens)`` where ``input_tokens`` counts the whole
+    document, including chunks dropped by ``max_chunks``. JSON prompts mark
+    page starts so items can cite their page.
+    """
+    budget = PROMPT_MAX_LENGTH - prompt_overhead_tokens(tokenizer, output_format)
+    chunks = chunk_document(
+        pages,
+        tokenizer,
+        budget,
+        overlap_tokens=min(overlap_tokens, budget // 4),
+        page_markers=output_format == "json"
+    )
+    input_tokens = sum(chunk.new_tokens for chunk in chunks)
+    if max_chunks is not None:
+        chunks = chunks[:max_chunks]
+    logger.info(f"Split document into {len(chunks)} chunk(s) of up to {budget} tokens")
+    return chunks, input_tokens
+
+def merge_chunk_outputs(chunks, outputs, output_format="markdown"):
+    """
+    The reduce step of chunked extraction: merge the replies to the first
+    ``len(outputs)`` chunks into ``(requirements, structured)``, where
+    ``structured`` is the merged JSON items (None for markdown output).
+    """
+    if output_format == "json":
+        structured = merge_structured([
+            # Items without a page fall back to their chunk's, if it has just one
+            parse_requirements(output, chunk.page)
+            for chunk, output in zip(chunks, outputs)
+        ])
+        return to_markdown(structured), structured
+    if len(outputs) == 1:
+        return outputs[0], None
+    return merge_requirements(outputs), None
+
+def generate_requirements_chunked(pages, model_name=DEFAULT_MODEL_KEY, registry: ModelRegistry = None, should_stop=None, batch_size=4, overlap_tokens=64, max_chunks=None, max_new_tokens=None, cache: ResultCache = None, use_cache=True, profile=None, output_format="markdown"):
+    """
+    Map-reduce extraction for documents longer than one prompt.
+    
+    The pages (texts or a ``Document``) are split into token-budgeted,
+    overlapping chunks along block, heading and page boundaries,
+    requirements are generated per chunk in batches, and the per-chunk
+    documents are merged and deduplicated into one. Returns the merged
+    requirements together with input coverage (fraction of document tokens
+    that reached the model) and per-stage timings in seconds.
+    
+    With ``output_format`` "json" the model answers in the JSON schema of
+    ``src.structured``; the merged items, with page references, are
+    returned as ``structured`` and ``requirements`` is their markdown.
+    
+    Decoding follows the generation ``profile``, whose latency budget is a
+    deadline for the whole document: chunks not reached in time are skipped
+    (lowering coverage) and ``deadline_hit`` is set.
+    
+    When micro-batching is on (see ``get_batcher``) chunks are submitted to
+    the shared batcher, whose batch size replaces ``batch_size``, so chunks
+    of concurrently processed documents are generated together.
+    
+    Results are cached by document text, model revision and generation
+    profile; ``use_cache=False`` skips the lookup but still stores the
+    fresh result.
+    """
+    registry = registry or get_registry()
+    profile = resolve_profile(profile)
+    if not registry.is_available(model_name):
+        raise RuntimeError("Trained model not found. Please run train.py first.")
+    
+    cache = cache or get_cache()
+    loaded = registry.get(model_name)
+    cache_key = requirements_cache_key(loaded, pages, profile, max_new_tokens, overlap_tokens, max_chunks, output_format)
+    if cache is not None and use_cache:
+        cached = cache.get(REQUIREMENTS, cache_key)
+        if cached is not None:
+            cached["cache"] = "hit"
+            return cached
+    
+    timings = {}
+    started = time.perf_counter()
+    chunks, input_tokens = plan_chunks(loaded.processor.tokenizer, pages, overlap_tokens, max_chunks, output_format)
+    timings["chunking"] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    deadline = started + profile.latency_budget_seconds
+    deadline_hit = False
+    outputs = []
+    # Concurrent documents share batched generate calls when batching is on
+    batcher = get_batcher(model_name, profile, output_format, max_new_tokens) if registry is get_registry() else None
+    if batcher is not None:
+        # Chunks still queued at the deadline are skipped
+        def stop():
+            return time.perf_counter() >= deadline or (should_stop is not None and should_stop())
         
-        return generated_text
-    except Exception as e:
-        logger.error(f"Error generating requirements: {str(e)}")
-        return f"Error generating requirements: {str(e)}"
+        outputs = generate_batched(batcher, [chunk.text for chunk in chunks], stop)
+        deadline_hit = time.perf_counter() >= deadline
+        if len(outputs) < len(chunks) and deadline_hit:
+            logger.warning(f"Latency budget of the {profile.name} profile reached after {len(outputs)} chunk(s)")
+    else:
+        for i in range(0, len(chunks), batch_size):
+            if should_stop is not None and should_stop():
+                logger.info("Chunked extraction stopped before completion")
+                break
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                deadline_hit = True
+                logger.warning(f"Latency budget of the {profile.name} profile reached after {len(outputs)} chunk(s)")
+                break
+            batch = chunks[i:i + batch_size]
+            outputs.extend(generate_requirements_batch(
+                [chunk.text for chunk in batch],
+                model_name=model_name,
+                registry=registry,
+                should_stop=should_stop,
+                max_new_tokens=max_new_tokens,
+                profile=profile,
+                max_time=remaining,
+                output_format=output_format
+            ))
+            # max_time ends decoding early, so a batch that ran into the
+            # deadline may be cut short
+            deadline_hit = deadline_hit or time.perf_counter() >= deadline
+    timings["generation"] = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    requirements, structured = merge_chunk_outputs(chunks, outputs, output_format)
+    timings["merge"] = time.perf_counter() - started
+    
+    seen_tokens = sum(chunk.new_tokens for chunk in chunks[:len(outputs)])
+    result = {
+        "requirements": requirements,
+        "coverage": seen_tokens / input_tokens if input_tokens else 1.0,
+        "input_tokens": input_tokens,
+        "chunks": len(chunks),
+        "chunks_processed": len(outputs),
+        "profile": profile.name,
+        "deadline_hit": deadline_hit,
+        "timings": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+    }
+    if structured is not None:
+        result["structured"] = structured
+    # Never cache a result cut short by cancellation, a timeout or the deadline
+    complete = len(outputs) == len(chunks) and not deadline_hit
+    if cache is not None and complete and not (should_stop is not None and should_stop()):
+        cache.put(REQUIREMENTS, cache_key, result)
+    result["cache"] = "miss" if use_cache else "bypass"
+    return result
 
-if __name__ == "__main__":
-    # Check if a PDF file path is provided as command line argument
-    import sys
-    if len(sys.argv) > 1:
-        pdf_path = sys.argv[1]
+def extract_document_cached(pdf_path, file_hash=None, cache: ResultCache = None, use_cache=True) -> Document:
+    """
+    The parsed ``Document`` of a PDF (a path or a seekable binary stream),
+    cached by the SHA-256 of the file's bytes.
+    """
+    cache = cache or get_cache()
+    if cache is None:
+        return extract_document(pdf_path)
+    if file_hash is None:
+        file_hash = sha256_stream(pdf_path) if hasattr(pdf_path, "read") else sha256_file(pdf_path)
+    if use_cache:
+        data = cache.get(DOCUMENTS, file_hash)
+        if data is not None:
+            return Document.from_dict(data)
+    document = extract_document(pdf_path)
+    cache.put(DOCUMENTS, file_hash, document.to_dict())
+    return document
+
+def extract_requirements_from_pdf(pdf_path, should_stop=None, file_hash=None, use_cache=True, profile=None, output_format="markdown"):
+    """Parse a PDF file once and generate its requirements document (see ``generate_requirements_chunked``)."""
+    started = time.perf_counter()
+    document = extract_document_cached(pdf_path, file_hash=file_hash, use_cache=use_cache)
+    extraction_seconds = time.perf_counter() - started
+    if should_stop is not None and should_stop():
+        return None
+    result = generate_requirements_chunked(
+        document, should_stop=should_stop, use_cache=use_cache, profile=profile, output_format=output_format
+    )
+    result["timings"]["pdf_extraction"] = round(extraction_seconds, 3)
+    result["pages"] = len(document.pages)
+    result["ocr_pages"] = document.ocr_pages
+    return result
+
+def main():
+    import argparse
+    
+    logging.basicConfig(level=logging.INFO)
+    
+    parser = argparse.ArgumentParser(description="Generate requirements documents from PDFs")
+    parser.add_argument("pdf_path", nargs="?", help="a single PDF (default: a short built-in sample text)")
+    parser.add_argument("--input-dir", help="batch mode: process every PDF under this directory")
+    parser.add_argument("--out-dir", default="output/batch", help="batch mode: where results and the manifest go")
+    parser.add_argument("--workers", type=int, default=None, help="batch mode: PDF parsing processes")
+    parser.add_argument("--batch-size", type=int, default=8, help="batch mode: chunks per generate call")
+    parser.add_argument("--profile", default=None, help="generation profile (default from GENERATION_PROFILE)")
+    parser.add_argument("--rerun", action="store_true", help="batch mode: ignore the manifest and redo every PDF")
+    parser.add_argument("--no-cache", action="store_true", help="skip result cache lookups")
+    args = parser.parse_args()
+    
+    if args.input_dir:
+        from src.batch import BatchRunner
+        
+        runner = BatchRunner(
+            args.input_dir,
+            args.out_dir,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            profile=args.profile,
+            use_cache=not args.no_cache
+        )
+        report = runner.run(rerun=args.rerun)
+        print(json.dumps(report.to_dict(), indent=2))
+        sys.exit(1 if report.failed else 0)
+    
+    if args.pdf_path:
+        pdf_path = args.pdf_path
         if not os.path.exists(pdf_path):
             logger.error(f"PDF file not found: {pdf_path}")
             sys.exit(1)
         
         logger.info(f"Processing PDF file: {pdf_path}")
-        text = extract_text_from_pdf(pdf_path)
-        generate_requirements(text)
+        result = extract_requirements_from_pdf(pdf_path, use_cache=not args.no_cache, profile=args.profile)
+        save_requirements(result["requirements"])
     else:
         # Use default test text if no PDF file is provided
         test_text = """The system should allow users to log in using their email and password.
@@ -167,4 +832,9 @@ if __name__ == "__main__":
         All user data must be encrypted at rest and in transit.
         Users should be able to upload PDF documents up to 50MB in size."""
         
-        generate_requirements(test_text) 
\ No newline at end of file
+        generated_text = generate_requirements(test_text, profile=args.profile)
+        if generated_text is not None:
+            save_requirements(generated_text)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+import logging
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import PyPDF2
+
+from src.document import NO_TEXT, OCR, TEXT_LAYER, Block, Document, Page, blocks_from_lines
+from src.serving.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+# Below this many pages per worker, process start-up and re-parsing the file
+# in every worker cost more than they save.
+MIN_PAGES_PER_WORKER = 16
+
+# Scanned pages beyond this many per document are left empty, so one huge
+# scan cannot hold the OCR pool for minutes.
+OCR_MAX_PAGES = int(os.environ.get("OCR_MAX_PAGES", "50"))
+OCR_LANGUAGE = os.environ.get("OCR_LANGUAGE", "eng")
+
+# Pools by purpose ("pages", "ocr"), each with its worker count
+_pools: Dict[str, Tuple[ProcessPoolExecutor, int]] = {}
+_pool_lock = threading.Lock()
+
+
+@contextmanager
+def open_pdf(source):
+    """
+    Open a PDF path as a read-only memory map (or pass a stream through).
+
+    Mapping the file lets PyPDF2 seek around it without reading it into a
+    Python buffer, and the pages are shared with any other process mapping
+    the same upload.
+    """
+    if hasattr(source, "read"):
+        yield source
+        return
+    with open(source, 'rb') as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped; let PyPDF2 report them
+            yield file
+            return
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def iter_pdf_pages(pdf_path, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Lazily yield ``(page_no, text)`` for pages ``start``..``stop`` of a PDF.
+
+    ``pdf_path`` may also be a seekable binary stream. Page numbers are
+    1-based. Pages are parsed one at a time as the caller iterates, so memory
+    stays flat however long the document is.
+    """
+    with open_pdf(pdf_path) as stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        num_pages = len(pdf_reader.pages)
+        stop = num_pages if stop is None else min(stop, num_pages)
+        for page_num in range(start, stop):
+            text = pdf_reader.pages[page_num].extract_text() or ""
+            logger.debug(f"Processed page {page_num + 1}/{num_pages}")
+            yield page_num + 1, text
+
+
+def count_pdf_pages(pdf_path) -> int:
+    with open_pdf(pdf_path) as stream:
+        return len(PyPDF2.PdfReader(stream).pages)
+
+
+def _layout_lines(page) -> List[Tuple[str, Optional[float], Optional[Tuple[float, float, float, float]]]]:
+    """
+    The text lines of a PyPDF2 page as ``(text, font_size, bbox)``.
+
+    Positions come from the text matrices PyPDF2 reports while extracting.
+    Some content streams move between lines with operators PyPDF2 does not
+    track, leaving every line at the same height; bboxes are dropped then
+    rather than reported wrong.
+    """
+    lines = []
+    fragments = []
+
+    def end_line():
+        if fragments:
+            text = "".join(fragment for fragment, _, _, _ in fragments)
+            size = max(size for _, _, _, size in fragments)
+            x0 = min(x for _, x, _, _ in fragments)
+            y0 = min(y for _, _, y, _ in fragments)
+            # Text widths are not exposed; half an em per character is close for body fonts
+            x1 = max(x + len(fragment) * size * 0.5 for fragment, x, _, size in fragments)
+            lines.append((text, size, (x0, y0, x1, y0 + size)))
+            fragments.clear()
+        else:
+            lines.append(("", None, None))
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        scale = abs(tm[3] * cm[3]) or 1.0
+        x = tm[4] * cm[0] + tm[5] * cm[2] + cm[4]
+        y = tm[4] * cm[1] + tm[5] * cm[3] + cm[5]
+        for i, part in enumerate(text.split("\n")):
+            if i:
+                end_line()
+            if part:
+                fragments.append((part, x, y, (font_size or 0) * scale))
+
+    text = page.extract_text(visitor_text=visitor) or ""
+    if fragments:
+        end_line()
+    if not any(line.strip() for line, _, _ in lines) and text.strip():
+        return [(line, None, None) for line in text.splitlines()]
+    heights = {bbox[1] for _, _, bbox in lines if bbox}
+    if len(heights) <= 1:
+        lines = [(line, size, None) for line, size, _ in lines]
+    return lines
+
+
+def layout_page(page, number: int) -> Page:
+    """One PyPDF2 page as a ``Page`` of typed blocks (no OCR)."""
+    box = page.mediabox
+    blocks = blocks_from_lines(_layout_lines(page))
+    return Page(number, blocks, TEXT_LAYER if blocks else NO_TEXT, float(box.width), float(box.height))
+
+
+def _layout_page_range(pdf_path, start: int, stop: Optional[int] = None) -> List[Page]:
+    with open_pdf(pdf_path) as stream:
+        pdf_reader = PyPDF2.PdfReader(stream)
+        num_pages = len(pdf_reader.pages)
+        stop = num_pages if stop is None else min(stop, num_pages)
+        return [layout_page(pdf_reader.pages[index], index + 1) for index in range(start, stop)]
+
+
+@lru_cache(maxsize=1)
+def ocr_available() -> bool:
+    """Whether pytesseract, Pillow and the tesseract binary are all present."""
+    try:
+        import pytesseract
+        from PIL import Image  # noqa: F401
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        logger.warning(f"OCR unavailable, scanned pages will be empty: {e}")
+        return False
+    return True
+
+
+def ocr_blocks(image, width: float, height: float, lang: str = OCR_LANGUAGE) -> List[Block]:
+    """
+    Blocks from a page image covering a ``width`` x ``height`` point page.
+
+    Tesseract's words are grouped into its lines, with boxes scaled from
+    pixels to PDF points, and its paragraph breaks kept as blank lines so
+    the usual block heuristics apply.
+    """
+    import pytesseract
+
+    data = pytesseract.image_to_data(image, lang=lang, output_type=pytesseract.Output.DICT)
+    sx, sy = width / image.width, height / image.height
+    lines: Dict[Tuple[int, int, int], List[int]] = {}
+    for i, word in enumerate(data["text"]):
+        if word.strip() and float(data["conf"][i]) >= 0:
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(i)
+
+    layout = []
+    paragraph = None
+    for key, words in lines.items():
+        if paragraph is not None and key[:2] != paragraph:
+            layout.append(("", None, None))
+        paragraph = key[:2]
+        left = min(data["left"][i] for i in words)
+        top = min(data["top"][i] for i in words)
+        right = max(data["left"][i] + data["width"][i] for i in words)
+        bottom = max(data["top"][i] + data["height"][i] for i in words)
+        text = " ".join(data["text"][i] for i in words)
+        # Image rows count down from the top; PDF points count up from the bottom
+        bbox = (left * sx, height - bottom * sy, right * sx, height - top * sy)
+        layout.append((text, (bottom - top) * sy, bbox))
+    return blocks_from_lines(layout)
+
+
+def ocr_page(pdf_path, index: int, lang: str = OCR_LANGUAGE) -> Page:
+    """OCR the images of page ``index`` (0-based), assumed to be a scan of the page."""
+    import io
+
+    from PIL import Image
+
+    with open_pdf(pdf_path) as stream:
+        page = PyPDF2.PdfReader(stream).pages[index]
+        width, height = float(page.mediabox.width), float(page.mediabox.height)
+        blocks = []
+        for image_file in page.images:
+            with Image.open(io.BytesIO(image_file.data)) as image:
+                blocks.extend(ocr_blocks(image.convert("L"), width, height, lang))
+    return Page(index + 1, blocks, OCR if blocks else NO_TEXT, width, height)
+
+
+def _get_pool(workers: int, purpose: str = "pages") -> ProcessPoolExecutor:
+    """
+    Shared worker pool for ``purpose``. Workers are spawned rather than
+    forked so they never inherit the parent's model weights or torch thread
+    state.
+    """
+    with _pool_lock:
+        pool, pool_workers = _pools.get(purpose, (None, 0))
+        if pool is None or pool_workers != workers:
+            if pool is not None:
+                pool.shutdown(wait=False)
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            _pools[purpose] = (pool, workers)
+        return pool
+
+
+def shutdown_pool() -> None:
+    with _pool_lock:
+        for pool, _ in _pools.values():
+            pool.shutdown(wait=True)
+        _pools.clear()
+
+
+def page_ranges(num_pages: int, shards: int) -> List[Tuple[int, int]]:
+    """Split ``num_pages`` into ``shards`` contiguous, near-equal ranges."""
+    shards = max(1, min(shards, num_pages))
+    size, extra = divmod(num_pages, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+def _layout_pages(pdf_path, workers: int) -> List[Page]:
+    if workers <= 1 or hasattr(pdf_path, "read"):
+        return _layout_page_range(pdf_path, 0)
+    num_pages = count_pdf_pages(pdf_path)
+    workers = min(workers, num_pages // MIN_PAGES_PER_WORKER)
+    if workers <= 1:
+        return _layout_page_range(pdf_path, 0, num_pages)
+    # A few shards per worker evens out pages of uneven density
+    ranges = page_ranges(num_pages, workers * 4)
+    pool = _get_pool(workers)
+    futures = [pool.submit(_layout_page_range, str(pdf_path), start, stop) for start, stop in ranges]
+    pages = []
+    for future in futures:
+        pages.extend(future.result())
+    return pages
+
+
+def _ocr_pages(pdf_path, pages: List[Page], workers: int, budget: int) -> None:
+    """Replace pages without a text layer by their OCR, up to ``budget`` pages."""
+    missing = [page for page in pages if page.source == NO_TEXT]
+    if not missing or budget <= 0 or not ocr_available():
+        return
+    if len(missing) > budget:
+        logger.warning(f"{len(missing)} pages need OCR; only the first {budget} will be read")
+        missing = missing[:budget]
+    started = time.perf_counter()
+    if workers <= 1 or len(missing) == 1 or hasattr(pdf_path, "read"):
+        results = [ocr_page(pdf_path, page.number - 1) for page in missing]
+    else:
+        pool = _get_pool(workers, "ocr")
+        futures = [pool.submit(ocr_page, str(pdf_path), page.number - 1) for page in missing]
+        results = [future.result() for future in futures]
+    for page in results:
+        pages[page.number - 1] = page
+    observe_stage("ocr", time.perf_counter() - started)
+    logger.info(f"OCR read {sum(1 for page in results if page.blocks)}/{len(results)} scanned pages")
+
+
+def extract_document(
+    pdf_path,
+    workers: Optional[int] = None,
+    ocr_workers: Optional[int] = None,
+    ocr_page_budget: Optional[int] = None
+) -> Document:
+    """
+    Parse a PDF into a ``Document`` of pages and typed blocks.
+
+    PyPDF2 is pure Python and holds the GIL, so with ``workers`` > 1 (default
+    from PDF_WORKERS, otherwise 1) contiguous page ranges are laid out in
+    separate processes and reassembled in order. Pages that come out empty are
+    OCR'd in a separate pool of ``ocr_workers`` processes (default
+    OCR_WORKERS, otherwise 2), at most ``ocr_page_budget`` (default
+    OCR_MAX_PAGES) per document; without pytesseract they stay empty.
+    """
+    if workers is None:
+        workers = int(os.environ.get("PDF_WORKERS", "1"))
+    if ocr_workers is None:
+        ocr_workers = int(os.environ.get("OCR_WORKERS", "2"))
+    if ocr_page_budget is None:
+        ocr_page_budget = OCR_MAX_PAGES
+    started = time.perf_counter()
+    try:
+        pages = _layout_pages(pdf_path, workers)
+        observe_stage("pdf_parse", time.perf_counter() - started)
+        _ocr_pages(pdf_path, pages, ocr_workers, ocr_page_budget)
+        document = Document(pages)
+        logger.info(
+            f"Extracted {len(pages)} pages from PDF ({document.ocr_pages} by OCR, {document.empty_pages} empty)"
+        )
+        return document
+    except Exception as e:
+        logger.error(f"Error extracting text from PDF: {str(e)}")
+        raise
+
+
+def extract_pages_from_pdf(pdf_path, workers: Optional[int] = None) -> List[str]:
+    """
+    Extract the text of each page of a PDF file, rendered from its blocks.
+    """
+    return extract_document(pdf_path, workers=workers).page_texts()
+
+
+def extract_text_from_pdf(pdf_path, workers: Optional[int] = None) -> str:
+    """Extract text from a PDF file."""
+    return extract_document(pdf_path, workers=workers).text()
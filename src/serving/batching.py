@@ -0,0 +1,147 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+from src.serving.metrics import observe_queue_wait
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Pending:
+    item: Any
+    future: Future
+    should_stop: Optional[Callable[[], bool]]
+    enqueued_at: float
+
+
+class MicroBatcher:
+    """
+    Collects concurrent requests into batches for a single batched call.
+
+    The first request to arrive opens a window of ``max_wait_ms``; every
+    request that arrives before the window closes (up to ``max_batch_size``)
+    is passed to ``batch_fn`` together, and each caller's future receives the
+    output at its position. ``batch_fn`` takes a list of items plus a
+    ``should_stop`` keyword and must return one result per item.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[..., List[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        name: str = "batcher"
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._queue: "queue.Queue[Optional[_Pending]]" = queue.Queue()
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self.total_wait_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any, should_stop: Optional[Callable[[], bool]] = None) -> Future:
+        """
+        Queue an item and return a future for its result.
+        """
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        future: Future = Future()
+        self._queue.put(_Pending(item, future, should_stop, time.perf_counter()))
+        return future
+
+    def __call__(self, item: Any, should_stop: Optional[Callable[[], bool]] = None) -> Any:
+        """
+        Submit an item and block until its result is ready.
+        """
+        return self.submit(item, should_stop=should_stop).result()
+
+    def close(self) -> None:
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "mean_wait_ms": 1000 * self.total_wait_seconds / self.items if self.items else 0.0,
+        }
+
+    def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if pending is None:
+                # Put the sentinel back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(pending)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+
+            # Requests cancelled while waiting never reach the model
+            live = []
+            for pending in batch:
+                if not pending.future.set_running_or_notify_cancel():
+                    continue
+                if pending.should_stop is not None and pending.should_stop():
+                    pending.future.set_result(None)
+                else:
+                    live.append(pending)
+            if not live:
+                continue
+
+            started = time.perf_counter()
+            self.batches += 1
+            self.items += len(live)
+            self.total_wait_seconds += sum(started - p.enqueued_at for p in live)
+            for pending in live:
+                observe_queue_wait("batcher", started - pending.enqueued_at)
+
+            stops = [p.should_stop for p in live]
+            should_stop = None
+            if all(stop is not None for stop in stops):
+                # Only interrupt a shared batch once every caller has given up
+                should_stop = lambda: all(stop() for stop in stops)
+
+            try:
+                results = self.batch_fn([p.item for p in live], should_stop=should_stop)
+                if len(results) != len(live):
+                    raise RuntimeError(
+                        f"{self.name} returned {len(results)} results for {len(live)} items"
+                    )
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(live)} failed: {e}")
+                for pending in live:
+                    pending.future.set_exception(e)
+                continue
+
+            for pending, result in zip(live, results):
+                pending.future.set_result(result)
@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOCUMENTS = "documents"
+REQUIREMENTS = "requirements"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path, block_size: int = 1 << 20) -> str:
+    with open(path, "rb") as f:
+        return sha256_stream(f, block_size)
+
+
+def sha256_stream(f, block_size: int = 1 << 20) -> str:
+    """Hash a seekable binary stream from the start, leaving it rewound."""
+    digest = hashlib.sha256()
+    f.seek(0)
+    for block in iter(lambda: f.read(block_size), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def pages_hash(pages) -> str:
+    """Hash of extracted page text, independent of how the PDF was encoded."""
+    digest = hashlib.sha256()
+    for page in pages:
+        digest.update(page.encode("utf-8"))
+        digest.update(b"\f")
+    return digest.hexdigest()
+
+
+def params_key(*parts: Any) -> str:
+    """Stable cache key for any JSON-serialisable combination of values."""
+    return sha256_bytes(json.dumps(parts, sort_keys=True, default=str).encode("utf-8"))
+
+
+class ResultCache:
+    """
+    Two-tier cache of JSON-serialisable results.
+
+    Reads check an in-memory LRU first and fall back to a SQLite file, which
+    survives restarts and is shared by every worker process on the box. Both
+    tiers are size bounded (least recently used entries go first) and entries
+    older than ``ttl_seconds`` are treated as missing. Keys live in
+    namespaces (e.g. ``DOCUMENTS`` and ``REQUIREMENTS``) with separate counters.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        memory_items: int = 256,
+        memory_bytes: int = 64 * 2**20,
+        disk_bytes: int = 1024 * 2**20,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600
+    ):
+        self.path = path
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.ttl_seconds = ttl_seconds
+        # Values are kept serialised so callers can never mutate a cached result
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        self._memory_size = 0
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " namespace TEXT NOT NULL,"
+                " key TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)")
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get((namespace, key))
+            if entry is not None:
+                created_at, raw = entry
+                if not self._expired(created_at, now):
+                    self._memory.move_to_end((namespace, key))
+                    self._count(namespace, "memory_hits")
+                    return json.loads(raw)
+                self._drop_memory((namespace, key))
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?",
+                    (namespace, key)
+                ).fetchone()
+                if row is not None:
+                    raw, created_at = row
+                    if not self._expired(created_at, now):
+                        self._db.execute(
+                            "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                            (now, namespace, key)
+                        )
+                        self._put_memory((namespace, key), created_at, raw)
+                        self._count(namespace, "disk_hits")
+                        return json.loads(raw)
+                    self._db.execute(
+                        "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                    )
+
+            self._count(namespace, "misses")
+            return None
+
+    def put(self, namespace: str, key: str, value: Any) -> None:
+        raw = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._put_memory((namespace, key), now, raw)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    (namespace, key, raw, len(raw), now, now)
+                )
+                self._evict_disk()
+            self._count(namespace, "writes")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM entries")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            disk_entries, disk_size = 0, 0
+            if self._db is not None:
+                disk_entries, disk_size = self._db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+                ).fetchone()
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_size,
+                "namespaces": {name: dict(counts) for name, counts in self._counters.items()},
+            }
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _count(self, namespace: str, counter: str) -> None:
+        counts = self._counters.setdefault(
+            namespace, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        )
+        counts[counter] += 1
+
+    def _put_memory(self, key: Tuple[str, str], created_at: float, raw: str) -> None:
+        if len(raw) > self.memory_bytes:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (created_at, raw)
+        self._memory_size += len(raw)
+        while len(self._memory) > self.memory_items or self._memory_size > self.memory_bytes:
+            oldest = next(iter(self._memory))
+            self._drop_memory(oldest)
+
+    def _drop_memory(self, key: Tuple[str, str]) -> None:
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_size -= len(entry[1])
+
+    def _evict_disk(self) -> None:
+        if self.ttl_seconds is not None:
+            self._db.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        (total,) = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if total <= self.disk_bytes:
+            return
+        # Drop least recently used rows until back under budget
+        excess = total - self.disk_bytes
+        rows = self._db.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at")
+        doomed = []
+        for namespace, key, size in rows:
+            doomed.append((namespace, key))
+            excess -= size
+            if excess <= 0:
+                break
+        self._db.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+        logger.info(f"Evicted {len(doomed)} entries from result cache")
+
+
+_cache: Optional[ResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ResultCache]:
+    """
+    The process-wide result cache, or None when CACHE_ENABLED is "0".
+
+    Configured through CACHE_PATH, CACHE_MEMORY_ITEMS, CACHE_MAX_MB and
+    CACHE_TTL_SECONDS.
+    """
+    global _cache
+    if os.environ.get("CACHE_ENABLED", "1") == "0":
+        return None
+    with _cache_lock:
+        if _cache is None:
+            ttl = os.environ.get("CACHE_TTL_SECONDS")
+            _cache = ResultCache(
+                path=os.environ.get("CACHE_PATH", "cache/results.sqlite"),
+                memory_items=int(os.environ.get("CACHE_MEMORY_ITEMS", "256")),
+                disk_bytes=int(os.environ.get("CACHE_MAX_MB", "1024")) * 2**20,
+                ttl_seconds=float(ttl) if ttl else 7 * 24 * 3600
+            )
+        return _cache
+
+
+def set_cache(cache: Optional[ResultCache]) -> None:
+    global _cache
+    with _cache_lock:
+        _cache = cache
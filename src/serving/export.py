@@ -0,0 +1,367 @@
+"""
+Inference artifacts: the LoRA adapter merged into the base model and saved
+as safetensors, in fp32, fp16 and per-channel int8 variants.
+
+    python -m src.serving.export --base models/cache --adapter final_model --out exported_model
+
+With MODEL_MMAP=1 (set by ``python -m src.serving.workers``) the weights
+are not copied into the process at all: each tensor is a read-only view of
+one shared mapping of the safetensors file (``map_safetensors``), so every
+worker process serving the same artifact uses the same physical pages. This
+covers fp32/fp16 artifacts on CPU and the non-quantized tensors of the int8
+artifact.
+
+The int8 artifact stores each ``nn.Linear`` weight (except the possibly
+tied ``lm_head``) as int8 with one float32 scale per output channel; at
+load those layers become ``torch.ao`` dynamic-quantized linears, which run
+int8 matmuls on CPU. Everything else stays fp32.
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import torch
+from torch import nn
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_DTYPES = ("fp32", "fp16", "int8")
+MANIFEST_NAME = "export.json"
+QUANTIZATION_NAME = "quantization.json"
+INT8_WEIGHTS_NAME = "model.safetensors"
+# Tied to the input embeddings in the smaller Qwen2 models; quantizing it
+# would untie (and duplicate) the embedding matrix
+SKIP_QUANTIZATION = ("lm_head",)
+SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def mmap_weights_enabled() -> bool:
+    return os.environ.get("MODEL_MMAP", "0") == "1"
+
+
+def map_safetensors(path) -> Dict[str, torch.Tensor]:
+    """
+    The tensors of a ``.safetensors`` file as read-only, zero-copy views of
+    a shared memory mapping. Pages are read on first touch and are the page
+    cache's, so processes mapping the same file share them. The tensors must
+    never be written to.
+    """
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header_size = struct.unpack("<Q", mapped[:8])[0]
+    header = json.loads(mapped[8:8 + header_size])
+    header.pop("__metadata__", None)
+    data_start = 8 + header_size
+    tensors = {}
+    with warnings.catch_warnings():
+        # Read-only buffers are fine for inference, which never writes weights
+        warnings.filterwarnings("ignore", message="The given buffer is not writable")
+        for name, info in header.items():
+            dtype = SAFETENSORS_DTYPES[info["dtype"]]
+            begin, end = info["data_offsets"]
+            count = (end - begin) // torch.empty(0, dtype=dtype).element_size()
+            if count:
+                tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin)
+            else:
+                tensor = torch.empty(0, dtype=dtype)
+            tensors[name] = tensor.reshape(info["shape"])
+    return tensors
+
+
+def map_artifact(path) -> Dict[str, torch.Tensor]:
+    """Every tensor of an artifact directory (all its safetensors shards), memory-mapped."""
+    tensors = {}
+    for shard in sorted(Path(path).glob("*.safetensors")):
+        tensors.update(map_safetensors(shard))
+    return tensors
+
+
+def empty_model(config, dtype: torch.dtype) -> nn.Module:
+    """The module tree of ``config`` with empty (meta) parameters."""
+    from accelerate import init_empty_weights
+
+    # Parameters only; computed buffers such as rotary inv_freq stay real
+    with init_empty_weights(include_buffers=False):
+        return model_class(config)._from_config(config, torch_dtype=dtype)
+
+
+def assign_weights(model: nn.Module, state: Dict[str, torch.Tensor], path) -> nn.Module:
+    """Use the tensors in ``state`` as the model's parameters, without copying them."""
+    model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    missing = [name for name, tensor in model.named_parameters() if tensor.is_meta]
+    if missing:
+        raise ValueError(f"Artifact at {path} is missing weights: {missing[:5]}")
+    model.requires_grad_(False)
+    model.eval()
+    return model
+
+
+def load_mapped_model(path, dtype: str) -> nn.Module:
+    """Build an fp32/fp16 artifact's model around its memory-mapped weights."""
+    from transformers import AutoConfig
+
+    config = AutoConfig.from_pretrained(path, trust_remote_code=True)
+    model = empty_model(config, torch.float16 if dtype == "fp16" else torch.float32)
+    return assign_weights(model, map_artifact(path), path)
+
+
+def model_class(config) -> Any:
+    import transformers
+
+    for name in getattr(config, "architectures", None) or []:
+        cls = getattr(transformers, name, None)
+        if cls is not None:
+            return cls
+    return transformers.Qwen2VLForConditionalGeneration
+
+
+def load_merged_model(base_path: str, adapter_path: Optional[str] = None) -> nn.Module:
+    """Load the base model in fp32 on CPU and fold the LoRA adapter into it."""
+    from transformers import AutoConfig
+
+    config = AutoConfig.from_pretrained(base_path, trust_remote_code=True)
+    model = model_class(config).from_pretrained(
+        base_path,
+        torch_dtype=torch.float32,
+        trust_remote_code=True
+    )
+    if adapter_path:
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, adapter_path).merge_and_unload()
+    model.eval()
+    return model
+
+
+def quantizable_linears(model: nn.Module) -> Iterable[Tuple[str, nn.Linear]]:
+    for name, module in model.named_modules():
+        if isinstance(module, nn.Linear) and name.split(".")[-1] not in SKIP_QUANTIZATION:
+            yield name, module
+
+
+def quantize_weight(weight: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+    """Symmetric per-output-channel int8 quantization: ``weight ~= q * scale[:, None]``."""
+    weight = weight.detach().float()
+    scale = (weight.abs().amax(dim=1) / 127.0).clamp(min=1e-8)
+    q = torch.round(weight / scale[:, None]).clamp(-127, 127).to(torch.int8)
+    return q, scale
+
+
+def save_int8(model: nn.Module, output_dir: Path) -> List[str]:
+    """Write the int8 artifact: quantized linear weights plus fp32 everything else."""
+    from safetensors.torch import save_file
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    tensors: Dict[str, torch.Tensor] = {}
+    quantized = []
+    skip = set()
+    for name, module in quantizable_linears(model):
+        q, scale = quantize_weight(module.weight)
+        tensors[f"{name}.weight.int8"] = q
+        tensors[f"{name}.weight.scale"] = scale
+        skip.add(f"{name}.weight")
+        quantized.append(name)
+    seen = set()
+    for name, tensor in model.state_dict().items():
+        if name in skip:
+            continue
+        # Tied parameters appear under several names; store one copy
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        tensors[name] = tensor.detach().float().contiguous()
+    save_file(tensors, str(output_dir / INT8_WEIGHTS_NAME), metadata={"format": "pt"})
+    model.config.save_pretrained(output_dir)
+    with open(output_dir / QUANTIZATION_NAME, "w") as f:
+        json.dump({"scheme": "dynamic-int8-per-channel", "modules": quantized}, f, indent=2)
+    return quantized
+
+
+def load_int8_model(path: str) -> nn.Module:
+    """
+    Rebuild a model from an int8 artifact.
+
+    The module tree is created with empty (meta) parameters, quantized
+    linears are swapped in with their packed int8 weights (a private copy:
+    packing rearranges them), and the remaining tensors are assigned
+    straight from the file, as shared read-only views with MODEL_MMAP=1.
+    """
+    from safetensors import safe_open
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from transformers import AutoConfig
+
+    path = Path(path)
+    config = AutoConfig.from_pretrained(path, trust_remote_code=True)
+    with open(path / QUANTIZATION_NAME) as f:
+        quantized = json.load(f)["modules"]
+
+    model = empty_model(config, torch.float32)
+
+    with safe_open(str(path / INT8_WEIGHTS_NAME), framework="pt") as weights:
+        for name in quantized:
+            parent_name, _, child = name.rpartition(".")
+            parent = model.get_submodule(parent_name) if parent_name else model
+            linear = getattr(parent, child)
+            q = weights.get_tensor(f"{name}.weight.int8")
+            scale = weights.get_tensor(f"{name}.weight.scale").double()
+            qweight = torch._make_per_channel_quantized_tensor(
+                q, scale, torch.zeros(scale.shape, dtype=torch.long), 0
+            )
+            qlinear = DynamicQuantizedLinear(
+                linear.in_features, linear.out_features,
+                bias_=linear.bias is not None, dtype=torch.qint8
+            )
+            bias = weights.get_tensor(f"{name}.bias") if linear.bias is not None else None
+            qlinear.set_weight_bias(qweight, bias)
+            setattr(parent, child, qlinear)
+
+        skip = {f"{name}.{suffix}" for name in quantized for suffix in ("weight", "bias")}
+        if mmap_weights_enabled():
+            tensors = map_safetensors(path / INT8_WEIGHTS_NAME)
+        else:
+            tensors = {key: weights.get_tensor(key) for key in weights.keys()}
+        state = {
+            key: tensor
+            for key, tensor in tensors.items()
+            if key not in skip and not key.endswith((".weight.int8", ".weight.scale"))
+        }
+    return assign_weights(model, state, path)
+
+
+def export_model(
+    base_path: str,
+    output_dir: str,
+    adapter_path: Optional[str] = None,
+    dtypes: Iterable[str] = ARTIFACT_DTYPES,
+    processor_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Merge ``adapter_path`` into ``base_path`` and write one artifact per
+    dtype under ``output_dir/<dtype>``, plus an ``export.json`` manifest.
+    """
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    model = load_merged_model(base_path, adapter_path)
+    logger.info(f"Merged model loaded in {time.perf_counter() - start:.1f}s")
+
+    processor = None
+    if processor_name:
+        from transformers import AutoProcessor
+        processor = AutoProcessor.from_pretrained(processor_name, trust_remote_code=True)
+
+    artifacts = {}
+    unknown = set(dtypes) - set(ARTIFACT_DTYPES)
+    if unknown:
+        raise ValueError(f"Unknown artifact dtypes: {sorted(unknown)}")
+    # fp16 last: the cast happens in place and is lossy
+    for dtype in sorted(set(dtypes), key=("int8", "fp32", "fp16").index):
+        target = output / dtype
+        start = time.perf_counter()
+        if dtype == "int8":
+            save_int8(model, target)
+        elif dtype == "fp16":
+            model.half().save_pretrained(target, safe_serialization=True)
+        else:
+            model.float().save_pretrained(target, safe_serialization=True)
+        if processor is not None:
+            processor.save_pretrained(target)
+        size = sum(f.stat().st_size for f in target.glob("*.safetensors"))
+        artifacts[dtype] = {"path": dtype, "bytes": size}
+        logger.info(f"Wrote {dtype} artifact to {target} ({size / 2**20:.1f} MiB) in {time.perf_counter() - start:.1f}s")
+
+    manifest = {
+        "base": str(base_path),
+        "adapter": str(adapter_path) if adapter_path else None,
+        "created_at": time.time(),
+        "artifacts": artifacts,
+    }
+    with open(output / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def select_artifact(export_dir, preferred: str = "auto", cuda: Optional[bool] = None) -> Optional[Tuple[str, Path]]:
+    """
+    Pick an artifact from an export directory: ``(dtype, path)`` or None.
+
+    With ``preferred="auto"`` a GPU gets fp16 (then fp32) and a CPU gets int8,
+    then fp32; fp16 matmuls on CPU are slower than fp32.
+    """
+    export_dir = Path(export_dir)
+    manifest_path = export_dir / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path) as f:
+        artifacts = json.load(f)["artifacts"]
+    if cuda is None:
+        cuda = torch.cuda.is_available()
+    if preferred != "auto":
+        order = [preferred]
+    elif cuda:
+        order = ["fp16", "fp32"]
+    else:
+        order = ["int8", "fp32", "fp16"]
+    for dtype in order:
+        if dtype in artifacts and (export_dir / artifacts[dtype]["path"]).exists():
+            return dtype, export_dir / artifacts[dtype]["path"]
+    return None
+
+
+def load_artifact(path, dtype: str) -> nn.Module:
+    """Load one exported artifact for inference."""
+    if dtype == "int8":
+        return load_int8_model(path)
+    cuda = torch.cuda.is_available()
+    if mmap_weights_enabled() and not cuda:
+        return load_mapped_model(path, dtype)
+    from transformers import AutoConfig
+
+    config = AutoConfig.from_pretrained(path, trust_remote_code=True)
+    model = model_class(config).from_pretrained(
+        path,
+        torch_dtype=torch.float16 if dtype == "fp16" else torch.float32,
+        device_map="auto" if cuda else None,
+        trust_remote_code=True
+    )
+    model.eval()
+    return model
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export merged inference artifacts")
+    parser.add_argument("--base", default="models/cache", help="base model checkpoint")
+    parser.add_argument("--adapter", default=None, help="LoRA adapter to merge (e.g. final_model)")
+    parser.add_argument("--out", default="exported_model")
+    parser.add_argument("--dtypes", nargs="+", default=list(ARTIFACT_DTYPES), choices=ARTIFACT_DTYPES)
+    parser.add_argument("--processor", default=None, help="processor to copy next to the weights")
+    args = parser.parse_args()
+    manifest = export_model(args.base, args.out, args.adapter, args.dtypes, args.processor)
+    print(json.dumps(manifest, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from src.serving.metrics import observe_queue_wait
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    TIMED_OUT = "timed_out"
+
+
+TERMINAL_STATUSES = {
+    JobStatus.SUCCEEDED,
+    JobStatus.FAILED,
+    JobStatus.CANCELLED,
+    JobStatus.TIMED_OUT,
+}
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    """
+    A unit of work tracked by the ``JobManager``.
+
+    ``completion`` resolves once the job reaches a terminal status, including
+    timeouts and cancellation of jobs whose worker is still winding down.
+    """
+    id: str
+    timeout: Optional[float] = None
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    completion: Future = field(default_factory=Future)
+    future: Optional[Future] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "status": self.status.value,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+        if self.started_at is not None:
+            data["queue_seconds"] = round(self.started_at - self.created_at, 3)
+        if include_result and self.status == JobStatus.SUCCEEDED:
+            data["result"] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Runs blocking work on a bounded thread or process pool.
+
+    At most ``max_workers`` jobs run at once and at most ``max_queue`` more
+    wait behind them; beyond that ``submit`` raises ``QueueFullError`` so the
+    caller can apply backpressure. Running jobs that exceed their timeout or
+    are cancelled are marked finished immediately and asked to stop through
+    their ``cancel_event`` (thread pools only; process workers run to
+    completion and their result is discarded).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 1,
+        max_queue: int = 8,
+        timeout: Optional[float] = None,
+        executor: str = "thread",
+        retention_seconds: float = 3600.0,
+        poll_interval: float = 0.25
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor type: {executor}")
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.executor_type = executor
+        self.retention_seconds = retention_seconds
+        self.poll_interval = poll_interval
+
+        if executor == "process":
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=max_workers,
+                thread_name_prefix="inference-worker"
+            )
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._watchdog = threading.Thread(
+            target=self._watch, name="job-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        cooperative: bool = False,
+        on_done: Optional[Callable[[], None]] = None
+    ) -> Job:
+        """
+        Queue ``fn(*args)`` and return its ``Job``.
+
+        With ``cooperative=True`` the job's ``cancel_event.is_set`` is passed
+        as the ``should_stop`` keyword so long-running work can exit early.
+        ``on_done`` runs once the underlying work has actually finished, which
+        makes it the right place to release files the job reads.
+        """
+        job = Job(id=uuid.uuid4().hex, timeout=timeout if timeout is not None else self.timeout)
+        kwargs = {}
+        if cooperative and self.executor_type == "thread":
+            kwargs["should_stop"] = job.cancel_event.is_set
+
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError("JobManager has been shut down")
+            self._prune()
+            if self._pending() >= self.max_workers + self.max_queue:
+                raise QueueFullError(
+                    f"Job queue is full ({self.max_queue} waiting, "
+                    f"{self.max_workers} running)"
+                )
+            self._jobs[job.id] = job
+            if self.executor_type == "thread":
+                # Run in the submitter's context so logs keep its request id
+                context = contextvars.copy_context()
+                job.future = self._executor.submit(context.run, self._run_in_thread, job, fn, args, kwargs)
+            else:
+                job.future = self._executor.submit(fn, *args, **kwargs)
+
+        job.future.add_done_callback(lambda future: self._on_future_done(job, future, on_done))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job. Returns False if it already finished.
+        """
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_event.set()
+        if job.future is not None:
+            job.future.cancel()
+        self._finish(job, JobStatus.CANCELLED, error="Job was cancelled")
+        return True
+
+    async def wait(self, job: Job) -> Job:
+        """
+        Await a job's terminal status without blocking the event loop.
+        """
+        await asyncio.wrap_future(job.completion)
+        return job
+
+    def pending(self) -> int:
+        """
+        Number of jobs whose work has not yet finished (queued or running).
+        """
+        with self._lock:
+            return self._pending()
+
+    def _pending(self) -> int:
+        return sum(
+            1 for job in self._jobs.values()
+            if job.future is not None and not job.future.done()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {status.value: 0 for status in JobStatus}
+            for job in self._jobs.values():
+                counts[job.status.value] += 1
+            return {
+                "executor": self.executor_type,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending(),
+                "jobs": counts,
+            }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self._closed.set()
+        with self._lock:
+            jobs: List[Job] = list(self._jobs.values())
+        for job in jobs:
+            if not job.done:
+                self.cancel(job.id)
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run_in_thread(self, job: Job, fn: Callable[..., Any], args, kwargs) -> Any:
+        if job.done:
+            return None
+        self._mark_running(job)
+        return fn(*args, **kwargs)
+
+    def _mark_running(self, job: Job) -> None:
+        with self._lock:
+            if job.status != JobStatus.QUEUED:
+                return
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+        observe_queue_wait("jobs", job.started_at - job.created_at)
+
+    def _on_future_done(self, job: Job, future: Future, on_done: Optional[Callable[[], None]]) -> None:
+        try:
+            if future.cancelled():
+                self._finish(job, JobStatus.CANCELLED, error="Job was cancelled")
+            elif future.exception() is not None:
+                error = future.exception()
+                logger.error(f"Job {job.id} failed: {error}")
+                self._finish(job, JobStatus.FAILED, error=str(error))
+            else:
+                self._finish(job, JobStatus.SUCCEEDED, result=future.result())
+        finally:
+            if on_done is not None:
+                try:
+                    on_done()
+                except Exception as e:
+                    logger.error(f"Cleanup for job {job.id} failed: {e}")
+
+    def _finish(self, job: Job, status: JobStatus, result: Any = None, error: Optional[str] = None) -> None:
+        with self._lock:
+            if job.done:
+                return
+            job.status = status
+            job.result = result
+            job.error = error
+            job.finished_at = time.time()
+        if not job.completion.done():
+            job.completion.set_result(job)
+
+    def _watch(self) -> None:
+        """
+        Track process-pool start times and enforce per-job timeouts.
+        """
+        while not self._closed.wait(self.poll_interval):
+            now = time.time()
+            with self._lock:
+                active = [job for job in self._jobs.values() if not job.done]
+            for job in active:
+                if job.started_at is None and job.future is not None and job.future.running():
+                    self._mark_running(job)
+                if job.timeout is None or job.started_at is None:
+                    continue
+                if now - job.started_at > job.timeout:
+                    logger.warning(f"Job {job.id} timed out after {job.timeout}s")
+                    job.cancel_event.set()
+                    self._finish(
+                        job,
+                        JobStatus.TIMED_OUT,
+                        error=f"Job exceeded its {job.timeout}s timeout"
+                    )
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and job.finished_at is not None and job.finished_at < cutoff
+            and (job.future is None or job.future.done())
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,298 @@
+import contextvars
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "docs_extractor"
+
+# Seconds; spans tokenization (milliseconds) to long beam-search decodes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# The request being served on this thread/task; "-" outside requests
+request_id_var: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+
+LabelValues = Tuple[str, ...]
+# (labels, value) pairs reported by a collector for one metric
+Samples = Iterable[Tuple[Dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [
+                (self.name + "_total", dict(zip(self.labelnames, key)), value)
+                for key, value in self._values.items()
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label combination."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per labels: [count per bucket (non-cumulative, plus +Inf), sum]
+        self._values: Dict[LabelValues, List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, **labels: str) -> int:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            return sum(entry[0]) if entry else 0
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        result = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                labels = dict(zip(self.labelnames, key))
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    result.append((self.name + "_bucket", dict(labels, le=_format_value(float(bound))), cumulative))
+                result.append((self.name + "_sum", labels, total))
+                result.append((self.name + "_count", labels, cumulative))
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class MetricsRegistry:
+    """
+    The process's metrics and their Prometheus text exposition.
+
+    Counters and histograms are updated inline; ``collectors`` are called at
+    scrape time and report values other components already track (job
+    queue, result cache, resident models), so those cost nothing between
+    scrapes. With ``enabled=False`` the module helpers return immediately
+    and ``render`` is empty.
+    """
+
+    def __init__(self, enabled: bool = True, namespace: str = NAMESPACE):
+        self.enabled = enabled
+        self.namespace = namespace
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], Samples]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        full_name = f"{self.namespace}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, documentation, labelnames, **kwargs)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {full_name} is already registered differently")
+            return metric
+
+    def register_collector(self, name: str, kind: str, documentation: str, collect: Callable[[], Samples]) -> None:
+        """
+        Report ``collect()``'s ``(labels, value)`` pairs as ``name`` (a
+        ``gauge`` or ``counter``) on every scrape. Re-registering a name
+        replaces its collector.
+        """
+        with self._lock:
+            self._collectors[f"{self.namespace}_{name}"] = (kind, documentation, collect)
+
+    def render(self) -> str:
+        if not self.enabled:
+            return ""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines = []
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for name, (kind, documentation, collect) in collectors:
+            try:
+                samples = list(collect())
+            except Exception as e:
+                logger.error(f"Metrics collector {name} failed: {e}")
+                continue
+            if not samples:
+                continue
+            sample_name = name + "_total" if kind == "counter" else name
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def clear(self) -> None:
+        """Reset every counter and histogram (collectors stay registered)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+
+metrics = MetricsRegistry(enabled=os.environ.get("METRICS", "1") != "0")
+
+STAGE_SECONDS = metrics.histogram(
+    "stage_seconds",
+    "Time spent in each processing stage (upload, pdf_parse, model_load, tokenize, prefill, decode)",
+    ["stage"]
+)
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "queue_wait_seconds",
+    "Time work waited in a queue before it started",
+    ["queue"]
+)
+TOKENS = metrics.counter("tokens", "Prompt tokens in and generated tokens out", ["direction"])
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "http_request_seconds",
+    "HTTP request latency by route and status",
+    ["method", "route", "status"]
+)
+
+_DISABLED = nullcontext()
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    if metrics.enabled:
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+@contextmanager
+def _timed_stage(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def stage(name: str):
+    """Context manager timing a block as ``name`` in the stage histogram."""
+    if not metrics.enabled:
+        return _DISABLED
+    return _timed_stage(name)
+
+
+def observe_queue_wait(queue: str, seconds: float) -> None:
+    if metrics.enabled:
+        QUEUE_WAIT_SECONDS.observe(seconds, queue=queue)
+
+
+def count_tokens(direction: str, tokens: int) -> None:
+    if metrics.enabled and tokens:
+        TOKENS.inc(tokens, direction=direction)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    if metrics.enabled:
+        HTTP_REQUEST_SECONDS.observe(seconds, method=method, route=route, status=str(status))
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current ``request_id`` to every log record."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+LOG_FORMAT = "%(levelname)s:%(name)s:[%(request_id)s] %(message)s"
+
+
+def install_request_id_logging(fmt: str = LOG_FORMAT) -> None:
+    """
+    Tag the root logger's handlers' output with the request id. Jobs keep
+    the id of the request that submitted them (``JobManager`` runs them in
+    a copy of the submitter's context).
+    """
+    root = logging.getLogger()
+    if not root.handlers:
+        logging.basicConfig(level=logging.INFO)
+    for handler in root.handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+        handler.setFormatter(logging.Formatter(fmt))
@@ -0,0 +1,148 @@
+import copy
+import hashlib
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, List, Optional, Sequence, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PrefixState:
+    """
+    The key/value cache of a fixed prompt prefix for one loaded model.
+
+    ``key`` identifies the prefix text; the state lives on the
+    ``LoadedModel`` it was computed with, so reloading or replacing a model
+    starts from an empty cache and a changed template gets a new key.
+    """
+    key: str
+    input_ids: List[int]
+    cache: Any
+    prefill_seconds: float
+    hits: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return len(self.input_ids)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "prefill_seconds": round(self.prefill_seconds, 4),
+            "hits": self.hits,
+        }
+
+
+def prefix_cache_enabled() -> bool:
+    return os.environ.get("PREFIX_CACHE", "1") != "0"
+
+
+def max_prefix_states() -> int:
+    """How many prompt templates (e.g. one per output format) keep a cached prefix per model."""
+    return max(1, int(os.environ.get("PREFIX_CACHE_STATES", "4")))
+
+
+def prefix_key(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+
+
+_compute_lock = threading.Lock()
+
+
+def get_prefix_state(loaded, prefix: str) -> Optional[PrefixState]:
+    """
+    The cached prefix state for ``loaded`` (a registry ``LoadedModel``),
+    computing it with one forward pass on first use. Returns None when
+    prefix reuse is disabled or failed before for this model.
+    """
+    if not prefix_cache_enabled() or loaded.prefix_cache.get("disabled"):
+        return None
+    key = prefix_key(prefix)
+    state = loaded.prefix_cache.get(key)
+    if state is not None:
+        return state
+    with _compute_lock:
+        state = loaded.prefix_cache.get(key)
+        if state is not None:
+            return state
+        model = loaded.model
+        tokenizer = loaded.processor.tokenizer
+        input_ids = tokenizer(prefix, add_special_tokens=False)["input_ids"]
+        started = time.perf_counter()
+        with torch.inference_mode():
+            outputs = model(
+                input_ids=torch.tensor([input_ids], device=model.device),
+                attention_mask=torch.ones((1, len(input_ids)), dtype=torch.long, device=model.device),
+                use_cache=True
+            )
+        cache = outputs.past_key_values
+        if isinstance(cache, tuple):
+            from transformers import DynamicCache
+            cache = DynamicCache.from_legacy_cache(cache)
+        state = PrefixState(
+            key=key,
+            input_ids=input_ids,
+            cache=cache,
+            prefill_seconds=time.perf_counter() - started
+        )
+        # Keep the most recent templates so alternating output formats do
+        # not recompute each other's prefix; dicts keep insertion order
+        states = [k for k in loaded.prefix_cache if k != "disabled"]
+        for stale in states[:max(0, len(states) - max_prefix_states() + 1)]:
+            del loaded.prefix_cache[stale]
+        loaded.prefix_cache[key] = state
+        logger.info(f"Cached {state.tokens}-token prompt prefix in {state.prefill_seconds:.3f}s")
+        return state
+
+
+def disable_prefix_cache(loaded, error: Exception) -> None:
+    """Stop using prefix reuse for a model whose generate() rejected it."""
+    logger.warning(f"Prefix cache reuse failed ({error}); falling back to full prefill for this model")
+    loaded.prefix_cache.clear()
+    loaded.prefix_cache["disabled"] = True
+
+
+def prefixed_batch(
+    state: PrefixState,
+    tokenizer,
+    texts: Sequence[str],
+    max_length: int,
+    pad_token_id: int,
+    device=None
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    ``input_ids``/``attention_mask`` of ``prefix + text`` for each text.
+
+    The prefix tokens are identical in every row (so they line up with the
+    cached keys/values) and rows are padded between the prefix and the
+    document; masked padding keeps the documents' positions contiguous with
+    the prefix. Documents are truncated to ``max_length`` total tokens.
+    """
+    budget = max(0, max_length - state.tokens)
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    encoded = [ids[:budget] for ids in encoded]
+    longest = max(len(ids) for ids in encoded)
+    input_ids, attention_mask = [], []
+    for ids in encoded:
+        padding = longest - len(ids)
+        input_ids.append(state.input_ids + [pad_token_id] * padding + ids)
+        attention_mask.append([1] * state.tokens + [0] * padding + [1] * len(ids))
+    return (
+        torch.tensor(input_ids, dtype=torch.long, device=device),
+        torch.tensor(attention_mask, dtype=torch.long, device=device),
+    )
+
+
+def cache_for_batch(state: PrefixState, rows: int) -> Any:
+    """A private copy of the prefix cache repeated for ``rows`` sequences."""
+    cache = copy.deepcopy(state.cache)
+    if rows > 1:
+        cache.batch_repeat_interleave(rows)
+    state.hits += 1
+    return cache
@@ -0,0 +1,131 @@
+import os
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional
+
+DEFAULT_PROFILE = "balanced"
+SPECULATION_MODES = ("prompt_lookup", "draft")
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """
+    A named decoding configuration.
+
+    ``generate_kwargs`` go straight to ``model.generate``. Every call is
+    capped at ``max_new_tokens`` and must finish within
+    ``latency_budget_seconds`` (passed as ``max_time``, which ends decoding
+    cleanly with whatever has been generated so far). Only single-sequence
+    profiles can be streamed; beam search resolves its output at the end.
+
+    ``speculation`` turns on assisted generation: ``prompt_lookup`` drafts
+    up to ``speculative_tokens`` tokens by copying n-grams from the prompt,
+    ``draft`` asks the small draft model for them (see
+    ``src.serving.speculative``). Either needs single-beam decoding.
+    """
+    name: str
+    generate_kwargs: Dict[str, Any] = field(default_factory=dict)
+    max_new_tokens: int = 1024
+    latency_budget_seconds: float = 120.0
+    description: str = ""
+    speculation: Optional[str] = None
+    speculative_tokens: int = 10
+
+    def __post_init__(self):
+        if self.speculation is None:
+            return
+        if self.speculation not in SPECULATION_MODES:
+            raise ValueError(
+                f"Unknown speculation {self.speculation!r}; choose one of: {', '.join(SPECULATION_MODES)}"
+            )
+        if self.generate_kwargs.get("num_beams", 1) != 1:
+            raise ValueError(f"Generation profile {self.name!r} cannot speculate with beam search")
+
+    @property
+    def streamable(self) -> bool:
+        return self.generate_kwargs.get("num_beams", 1) == 1
+
+    def cache_key(self) -> Dict[str, Any]:
+        """Everything about the profile that can change its output."""
+        return {
+            "profile": self.name,
+            "generate_kwargs": self.generate_kwargs,
+            "max_new_tokens": self.max_new_tokens,
+            "latency_budget_seconds": self.latency_budget_seconds,
+            "speculation": self.speculation,
+            "speculative_tokens": self.speculative_tokens if self.speculation else None,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.cache_key(), streamable=self.streamable, description=self.description)
+
+
+PROFILES: Dict[str, GenerationProfile] = {
+    profile.name: profile
+    for profile in (
+        GenerationProfile(
+            name="fast",
+            generate_kwargs={
+                "do_sample": False,
+                "num_beams": 1,
+                "repetition_penalty": 1.1,
+            },
+            max_new_tokens=512,
+            latency_budget_seconds=30.0,
+            description="Greedy decoding with a short output cap",
+        ),
+        GenerationProfile(
+            name="balanced",
+            generate_kwargs={
+                "do_sample": True,
+                "temperature": 0.8,
+                "top_p": 0.95,
+                "num_beams": 1,
+                "repetition_penalty": 1.2,
+            },
+            max_new_tokens=1024,
+            latency_budget_seconds=60.0,
+            description="Nucleus sampling, one sequence",
+        ),
+        GenerationProfile(
+            name="quality",
+            generate_kwargs={
+                "do_sample": False,
+                "num_beams": 4,
+                "early_stopping": True,
+                "repetition_penalty": 1.3,
+                "no_repeat_ngram_size": 3,
+            },
+            max_new_tokens=1024,
+            latency_budget_seconds=180.0,
+            description="Beam search with n-gram blocking; not streamable",
+        ),
+    )
+}
+
+# Values accepted by the old streaming ``decoding`` parameter
+DECODING_ALIASES = {
+    "greedy": "fast",
+    "sample": "balanced",
+}
+
+
+def get_profile(name: Optional[str] = None) -> GenerationProfile:
+    """
+    Look up a profile by name (or old decoding alias). Without a name, the
+    GENERATION_PROFILE environment variable picks the default.
+
+    SPECULATION_<NAME> (``prompt_lookup``, ``draft`` or ``off``) and
+    SPECULATIVE_TOKENS_<NAME> override a profile's speculation settings.
+    """
+    name = name or os.environ.get("GENERATION_PROFILE", DEFAULT_PROFILE)
+    name = DECODING_ALIASES.get(name, name)
+    if name not in PROFILES:
+        raise ValueError(f"Unknown generation profile {name!r}; choose one of: {', '.join(PROFILES)}")
+    profile = PROFILES[name]
+    speculation = os.environ.get(f"SPECULATION_{name.upper()}")
+    tokens = os.environ.get(f"SPECULATIVE_TOKENS_{name.upper()}")
+    if speculation is not None:
+        profile = replace(profile, speculation=None if speculation in ("", "off", "0") else speculation)
+    if tokens:
+        profile = replace(profile, speculative_tokens=int(tokens))
+    return profile
@@ -0,0 +1,438 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.serving.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_KEY = "default"
+
+# Files whose change means the checkpoint (and so its cached results) changed
+CHECKPOINT_SUFFIXES = (".safetensors", ".bin", ".pt", ".pth", ".json")
+
+project_root = Path(__file__).parent.parent.parent
+
+
+def configured_base_model(config_path: Path = project_root / "configs" / "training_config.json") -> str:
+    """
+    ``model.name`` from the training config: the base model that
+    ``src/download_model.py`` fetches and ``src/train.py`` fine-tunes.
+    """
+    try:
+        with open(config_path) as f:
+            return json.load(f)["model"]["name"]
+    except (OSError, ValueError, KeyError):
+        logger.warning(f"No model.name in {config_path}; using Qwen/Qwen2-VL-2B-Instruct")
+        return "Qwen/Qwen2-VL-2B-Instruct"
+
+
+BASE_MODEL_NAME = configured_base_model()
+
+
+@dataclass
+class ModelSpec:
+    """
+    Where to load a named model from.
+
+    ``path`` is a full checkpoint directory. When ``adapter_path`` is set the
+    checkpoint at ``path`` is treated as the base model and the PEFT adapter is
+    applied on top of it. ``dtype`` marks ``path`` as an exported artifact
+    (``fp32``, ``fp16`` or ``int8``, see ``src.serving.export``).
+    ``text_only`` loads a plain causal LM instead of Qwen2-VL (e.g. the
+    draft model for speculative decoding, see ``src.serving.speculative``).
+    """
+    name: str
+    path: str
+    processor_name: str = BASE_MODEL_NAME
+    adapter_path: Optional[str] = None
+    revision: Optional[str] = None
+    dtype: Optional[str] = None
+    text_only: bool = False
+
+    def exists(self) -> bool:
+        if self.adapter_path and not Path(self.adapter_path).exists():
+            return False
+        return Path(self.path).exists()
+
+
+@dataclass
+class LoadedModel:
+    """
+    A model/processor pair resident in the registry.
+
+    ``prefix_cache`` holds per-model derived state (the prompt prefix
+    key/value cache, see ``src.serving.prefix_cache``) and so is discarded
+    together with the model.
+    """
+    spec: ModelSpec
+    model: Any
+    processor: Any
+    load_seconds: float
+    memory_bytes: int
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    hits: int = 0
+    prefix_cache: Dict[str, Any] = field(default_factory=dict)
+    fingerprint: Optional[str] = None
+
+    @property
+    def revision(self) -> str:
+        """
+        ``MODEL_REVISION`` when set, otherwise the checkpoint's location plus
+        the fingerprint of its files taken at load time, so retraining a
+        checkpoint in place gives a new revision (and new cache keys).
+        """
+        if self.spec.revision:
+            return self.spec.revision
+        location = self.spec.adapter_path or self.spec.path
+        return f"{location}@{self.fingerprint}" if self.fingerprint else location
+
+
+def checkpoint_fingerprint(*paths: Optional[str]) -> Optional[str]:
+    """
+    Hash of the name, size and modification time of the weight and config
+    files in ``paths`` (checkpoint directories are flat, so only their top
+    level is read), or None if there are none, e.g. for a hub model id.
+    """
+    entries = []
+    for path in paths:
+        if not path:
+            continue
+        root = Path(path)
+        files = [root] if root.is_file() else sorted(root.iterdir()) if root.is_dir() else []
+        for file in files:
+            if file.is_file() and file.suffix in CHECKPOINT_SUFFIXES:
+                stat = file.stat()
+                entries.append(f"{file.relative_to(root.parent)}:{stat.st_size}:{stat.st_mtime_ns}")
+    if not entries:
+        return None
+    return hashlib.sha256("\n".join(entries).encode("utf-8")).hexdigest()[:16]
+
+
+def model_memory_bytes(model: Any) -> int:
+    """
+    Bytes held by a model's parameters and buffers.
+    """
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def process_rss_bytes() -> Optional[int]:
+    """
+    Current resident set size of this process, or None if unavailable.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def load_qwen2vl(spec: ModelSpec) -> Tuple[Any, Any]:
+    """
+    Default loader: the fine-tuned Qwen2-VL checkpoint plus its processor.
+    """
+    import torch
+    from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+
+    processor = AutoProcessor.from_pretrained(
+        spec.processor_name,
+        trust_remote_code=True
+    )
+
+    if spec.dtype:
+        from src.serving.export import load_artifact
+        return load_artifact(spec.path, spec.dtype), processor
+
+    model_class = Qwen2VLForConditionalGeneration
+    if spec.text_only:
+        from transformers import AutoModelForCausalLM
+        model_class = AutoModelForCausalLM
+
+    model = model_class.from_pretrained(
+        spec.path,
+        torch_dtype=torch.float16,
+        device_map="auto",
+        trust_remote_code=True
+    )
+
+    if spec.adapter_path:
+        from peft import PeftModel
+        model = PeftModel.from_pretrained(model, spec.adapter_path)
+
+    model.eval()
+    return model, processor
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded models and processors.
+
+    Models are loaded on first use (or eagerly via ``preload``) and shared by
+    every caller. When the resident models exceed ``memory_budget_bytes`` or
+    ``max_models``, the least recently used ones are evicted. The ``loader``
+    callable receives a ``ModelSpec`` and returns ``(model, processor)``, which
+    lets tests and benchmarks plug in a tiny randomly initialised model.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[ModelSpec], Tuple[Any, Any]] = load_qwen2vl,
+        memory_budget_bytes: Optional[int] = None,
+        max_models: Optional[int] = None
+    ):
+        self.loader = loader
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_models = max_models
+        self._specs: Dict[str, ModelSpec] = {}
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+
+    def register(self, spec: ModelSpec) -> None:
+        """
+        Register (or replace) a named model. A replaced model is unloaded.
+        """
+        with self._lock:
+            previous = self._specs.get(spec.name)
+            self._specs[spec.name] = spec
+            if previous is not None and previous != spec:
+                self.unload(spec.name)
+
+    def is_available(self, name: str = DEFAULT_MODEL_KEY) -> bool:
+        with self._lock:
+            if name in self._loaded:
+                return True
+            spec = self._specs.get(name)
+        return spec is not None and spec.exists()
+
+    def get(self, name: str = DEFAULT_MODEL_KEY) -> LoadedModel:
+        """
+        Return the named model, loading it if it is not resident.
+        """
+        with self._lock:
+            entry = self._touch(name)
+            if entry is not None:
+                return entry
+            if name not in self._specs:
+                raise KeyError(f"No model registered under '{name}'")
+            load_lock = self._load_locks.setdefault(name, threading.Lock())
+
+        # Load outside the registry lock so other models stay usable, but
+        # never load the same model twice concurrently.
+        with load_lock:
+            with self._lock:
+                entry = self._touch(name)
+                if entry is not None:
+                    return entry
+                spec = self._specs[name]
+            entry = self._load(spec)
+            with self._lock:
+                self._loaded[name] = entry
+                self._evict(keep=name)
+            return entry
+
+    def preload(self, name: str = DEFAULT_MODEL_KEY) -> Optional[LoadedModel]:
+        """
+        Load a model ahead of the first request if its checkpoint exists.
+        """
+        if not self.is_available(name):
+            logger.warning(f"Model '{name}' not found; skipping preload")
+            return None
+        return self.get(name)
+
+    def unload(self, name: str) -> bool:
+        with self._lock:
+            entry = self._loaded.pop(name, None)
+        if entry is None:
+            return False
+        self._release(entry)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            names = list(self._loaded)
+        for name in names:
+            self.unload(name)
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(entry.memory_bytes for entry in self._loaded.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Load-time and memory statistics for the registry and each model.
+        """
+        with self._lock:
+            models = {
+                name: {
+                    "revision": entry.revision,
+                    "load_seconds": round(entry.load_seconds, 3),
+                    "memory_bytes": entry.memory_bytes,
+                    "hits": entry.hits,
+                    "loaded_at": entry.loaded_at,
+                    "last_used": entry.last_used,
+                    "prefix_cache": {
+                        key: state.stats()
+                        for key, state in entry.prefix_cache.items()
+                        if hasattr(state, "stats")
+                    },
+                }
+                for name, entry in self._loaded.items()
+            }
+            return {
+                "registered": sorted(self._specs),
+                "resident": list(self._loaded),
+                "resident_bytes": sum(e.memory_bytes for e in self._loaded.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "process_rss_bytes": process_rss_bytes(),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "models": models,
+            }
+
+    def _touch(self, name: str) -> Optional[LoadedModel]:
+        entry = self._loaded.get(name)
+        if entry is not None:
+            self._loaded.move_to_end(name)
+            entry.hits += 1
+            entry.last_used = time.time()
+        return entry
+
+    def _load(self, spec: ModelSpec) -> LoadedModel:
+        logger.info(f"Loading model '{spec.name}' from {spec.path}")
+        start = time.perf_counter()
+        model, processor = self.loader(spec)
+        elapsed = time.perf_counter() - start
+        observe_stage("model_load", elapsed)
+        memory = model_memory_bytes(model)
+        self.loads += 1
+        logger.info(
+            f"Loaded model '{spec.name}' in {elapsed:.2f}s "
+            f"({memory / 2**20:.1f} MiB)"
+        )
+        return LoadedModel(
+            spec=spec,
+            model=model,
+            processor=processor,
+            load_seconds=elapsed,
+            memory_bytes=memory,
+            fingerprint=None if spec.revision else checkpoint_fingerprint(spec.path, spec.adapter_path)
+        )
+
+    def _evict(self, keep: str) -> None:
+        def over_budget() -> bool:
+            if self.max_models is not None and len(self._loaded) > self.max_models:
+                return True
+            if self.memory_budget_bytes is not None:
+                total = sum(e.memory_bytes for e in self._loaded.values())
+                return total > self.memory_budget_bytes
+            return False
+
+        while over_budget() and len(self._loaded) > 1:
+            name = next(iter(self._loaded))
+            if name == keep:
+                break
+            entry = self._loaded.pop(name)
+            self.evictions += 1
+            logger.info(f"Evicting model '{name}' from registry")
+            self._release(entry)
+
+    @staticmethod
+    def _release(entry: LoadedModel) -> None:
+        # In-flight requests keep their own references to the model, so the
+        # weights are only freed once the last of them finishes.
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def default_model_spec() -> ModelSpec:
+    """
+    The default model: an exported artifact from MODEL_EXPORT_DIR (default
+    ``exported_model``) chosen by MODEL_ARTIFACT (``auto``, ``fp32``,
+    ``fp16`` or ``int8``) when one exists and MODEL_PATH is not set,
+    otherwise the ``final_model`` checkpoint that ``src/train.py`` saves
+    (``paths.final_model_dir``), loaded as before.
+    """
+    revision = os.environ.get("MODEL_REVISION") or None
+    if "MODEL_PATH" not in os.environ:
+        from src.serving.export import select_artifact
+
+        export_dir = Path(os.environ.get("MODEL_EXPORT_DIR", str(project_root / "exported_model")))
+        selected = select_artifact(export_dir, os.environ.get("MODEL_ARTIFACT", "auto"))
+        if selected is not None:
+            dtype, path = selected
+            logger.info(f"Using {dtype} artifact from {path}")
+            has_processor = (path / "tokenizer_config.json").exists()
+            return ModelSpec(
+                name=DEFAULT_MODEL_KEY,
+                path=str(path),
+                processor_name=str(path) if has_processor else BASE_MODEL_NAME,
+                revision=revision,
+                dtype=dtype
+            )
+    return ModelSpec(
+        name=DEFAULT_MODEL_KEY,
+        path=os.environ.get("MODEL_PATH", str(project_root / "final_model")),
+        adapter_path=os.environ.get("MODEL_ADAPTER_PATH") or None,
+        revision=revision
+    )
+
+
+def get_registry() -> ModelRegistry:
+    """
+    The process-wide registry, created on first use from environment settings.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            budget_mb = os.environ.get("MODEL_MEMORY_BUDGET_MB")
+            max_models = os.environ.get("MODEL_MAX_RESIDENT")
+            _registry = ModelRegistry(
+                memory_budget_bytes=int(budget_mb) * 2**20 if budget_mb else None,
+                max_models=int(max_models) if max_models else None
+            )
+            _registry.register(default_model_spec())
+            from src.serving.speculative import draft_model_spec
+            draft = draft_model_spec()
+            if draft is not None:
+                _registry.register(draft)
+        return _registry
+
+
+def set_registry(registry: Optional[ModelRegistry]) -> None:
+    """
+    Replace the process-wide registry (e.g. with one using a tiny test model).
+    """
+    global _registry
+    with _registry_lock:
+        _registry = registry
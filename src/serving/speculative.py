@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DRAFT_MODEL_KEY = "draft"
+
+
+@dataclass
+class Speculation:
+    """
+    How one generate call drafts candidate tokens: ``mode`` is
+    ``prompt_lookup`` or ``draft`` and ``generate_kwargs`` are the extra
+    ``model.generate`` arguments that switch assisted generation on.
+    """
+    mode: str
+    generate_kwargs: Dict[str, Any] = field(default_factory=dict)
+
+
+class SpeculationCounter:
+    """
+    Counts the target model's forward passes during one assisted generate
+    call to derive how many drafted tokens were proposed and accepted.
+
+    Each assisted step feeds the target the ``k`` candidate tokens plus the
+    last accepted one (the first step also carries the prompt) and yields
+    ``accepted + 1`` new tokens, so over a whole call
+    ``accepted = generated - steps`` and ``proposed = fed - steps - prompt``.
+    """
+
+    def __init__(self, model, prompt_length: int):
+        self.model = model
+        self.prompt_length = prompt_length
+        self.steps = 0
+        self.fed_tokens = 0
+        self._handle = None
+
+    def _hook(self, module, args, kwargs):
+        input_ids = kwargs.get("input_ids")
+        if input_ids is None and args:
+            input_ids = args[0]
+        if input_ids is not None:
+            self.steps += 1
+            self.fed_tokens += input_ids.shape[-1]
+
+    def __enter__(self) -> "SpeculationCounter":
+        self._handle = self.model.register_forward_pre_hook(self._hook, with_kwargs=True)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._handle.remove()
+
+    def report(self, generated_tokens: int) -> Dict[str, Any]:
+        proposed = max(0, self.fed_tokens - self.steps - self.prompt_length)
+        accepted = max(0, generated_tokens - self.steps)
+        return {
+            "target_steps": self.steps,
+            "generated_tokens": generated_tokens,
+            "proposed_tokens": proposed,
+            "accepted_tokens": accepted,
+            "acceptance_rate": accepted / proposed if proposed else None,
+            "tokens_per_step": generated_tokens / self.steps if self.steps else None,
+        }
+
+
+COUNTERS = ("target_steps", "generated_tokens", "proposed_tokens", "accepted_tokens")
+
+
+class SpeculationStats:
+    """Process-wide totals of assisted generation calls, per mode."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, mode: str, report: Dict[str, Any]) -> None:
+        with self._lock:
+            totals = self._totals.setdefault(mode, dict.fromkeys(("calls",) + COUNTERS, 0))
+            totals["calls"] += 1
+            for key in COUNTERS:
+                totals[key] += report[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            result = {}
+            for mode, totals in self._totals.items():
+                proposed, steps = totals["proposed_tokens"], totals["target_steps"]
+                result[mode] = dict(
+                    totals,
+                    acceptance_rate=round(totals["accepted_tokens"] / proposed, 4) if proposed else None,
+                    tokens_per_step=round(totals["generated_tokens"] / steps, 4) if steps else None,
+                )
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self._totals.clear()
+
+
+speculation_stats = SpeculationStats()
+
+
+def draft_model_spec():
+    """
+    The draft model registered under ``draft`` when DRAFT_MODEL_PATH is set.
+
+    It must share the main model's tokenizer (e.g. a small Qwen2 checkpoint
+    for Qwen2-VL); DRAFT_MODEL_TEXT_ONLY=0 loads it as Qwen2-VL instead of
+    a plain causal LM.
+    """
+    from src.serving.registry import ModelSpec
+
+    path = os.environ.get("DRAFT_MODEL_PATH")
+    if not path:
+        return None
+    return ModelSpec(
+        name=DRAFT_MODEL_KEY,
+        path=path,
+        text_only=os.environ.get("DRAFT_MODEL_TEXT_ONLY", "1") != "0"
+    )
+
+
+def resolve_speculation(profile, registry) -> Optional[Speculation]:
+    """
+    The speculation a profile asks for, or None when it does not speculate
+    or its draft model is not available in ``registry``.
+    """
+    if profile.speculation == "prompt_lookup":
+        # Candidates are n-grams copied from the prompt, i.e. the source document
+        return Speculation("prompt_lookup", {"prompt_lookup_num_tokens": profile.speculative_tokens})
+    if profile.speculation == "draft":
+        if not registry.is_available(DRAFT_MODEL_KEY):
+            logger.warning("Draft model not available; generating without speculation")
+            return None
+        draft = registry.get(DRAFT_MODEL_KEY)
+        return Speculation("draft", {
+            "assistant_model": draft.model,
+            "num_assistant_tokens": profile.speculative_tokens,
+        })
+    return None
+
+
+def assisted_generate(model, speculation: Speculation, input_ids, **generate_kwargs):
+    """
+    ``model.generate`` with the speculation's candidate source, recording
+    the proposed/accepted draft tokens in ``speculation_stats``.
+
+    Assisted generation verifies a single sequence, so ``input_ids`` must
+    hold one row.
+    """
+    prompt_length = input_ids.shape[1]
+    with SpeculationCounter(model, prompt_length) as counter:
+        outputs = model.generate(input_ids=input_ids, **generate_kwargs, **speculation.generate_kwargs)
+    report = counter.report(outputs.shape[1] - prompt_length)
+    speculation_stats.record(speculation.mode, report)
+    if report["acceptance_rate"] is not None:
+        logger.info(
+            f"{speculation.mode} speculation accepted {report['accepted_tokens']}/{report['proposed_tokens']} "
+            f"drafted tokens ({report['tokens_per_step']:.2f} tokens per target step)"
+        )
+    return outputs
@@ -0,0 +1,247 @@
+"""
+Cold start: heavy imports, model load and a warm-up generation, with readiness.
+
+The backend answers ``/health`` as soon as it is up (liveness) and
+``/ready`` only once ``Startup`` has finished, so traffic is not routed to
+a pod that would make its first request pay for importing torch, loading
+the model and compiling the first generate call.
+
+``python -m src.serving.startup`` prints an import-time profile (time spent
+per imported module, from ``python -X importtime``) of the modules given.
+"""
+import importlib
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from src.serving.metrics import observe_stage
+
+logger = logging.getLogger(__name__)
+
+project_root = Path(__file__).parent.parent.parent
+
+PHASES = ("imports", "model_load", "warmup")
+
+# Imported off the request path; src.inference pulls in torch, transformers and PyPDF2
+HEAVY_MODULES = ("src.inference",)
+
+WARMUP_TEXT = (
+    "The system shall let users upload PDF documents. "
+    "Uploads must complete within 2 seconds."
+)
+
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+def warmup_enabled() -> bool:
+    return os.environ.get("STARTUP_WARMUP", "1") != "0"
+
+
+def startup_budget_seconds() -> Optional[float]:
+    budget = os.environ.get("STARTUP_BUDGET_SECONDS")
+    return float(budget) if budget else None
+
+
+class Startup:
+    """
+    Runs the cold-start phases once, in order, and records how long each
+    took. ``ready`` turns true only after all of them succeeded; a missing
+    model or a failed phase leaves the process live but not ready.
+
+    ``warmup`` generates ``warmup_tokens`` tokens per output format so the
+    prompt prefix caches are filled and the first real request does not
+    pay for one-off kernel selection or allocation.
+    """
+
+    def __init__(
+        self,
+        model_name: str = None,
+        warmup: Optional[bool] = None,
+        warmup_tokens: int = None,
+        budget_seconds: Optional[float] = None,
+        output_formats: Sequence[str] = None
+    ):
+        self.model_name = model_name
+        self.warmup = warmup_enabled() if warmup is None else warmup
+        self.warmup_tokens = warmup_tokens or int(os.environ.get("STARTUP_WARMUP_TOKENS", "8"))
+        self.budget_seconds = budget_seconds if budget_seconds is not None else startup_budget_seconds()
+        self.output_formats = output_formats
+        self.status = STARTING
+        self.phase: Optional[str] = None
+        self.phases: Dict[str, float] = {}
+        self.error: Optional[str] = None
+        self.started_at = time.perf_counter()
+        self.seconds: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def start(self) -> "Startup":
+        """Run the phases on a daemon thread so the server starts listening immediately."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="startup", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout: float = None) -> bool:
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready
+
+    def run(self) -> None:
+        try:
+            with self._phase("imports"):
+                for module in HEAVY_MODULES:
+                    importlib.import_module(module)
+            with self._phase("model_load"):
+                from src.serving.registry import DEFAULT_MODEL_KEY, get_registry
+                model_name = self.model_name or DEFAULT_MODEL_KEY
+                if get_registry().preload(model_name) is None:
+                    raise RuntimeError(f"Model '{model_name}' not found")
+            if self.warmup:
+                with self._phase("warmup"):
+                    self._warm_up()
+        except Exception as e:
+            self.status, self.error = FAILED, f"{self.phase}: {e}"
+            logger.error(f"Startup failed during {self.error}")
+            return
+        finally:
+            self.seconds = time.perf_counter() - self.started_at
+        self.status, self.phase = READY, None
+        logger.info(
+            f"Ready in {self.seconds:.2f}s ("
+            + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases.items())
+            + ")"
+        )
+        if self.budget_seconds is not None and self.seconds > self.budget_seconds:
+            logger.warning(f"Cold start took {self.seconds:.2f}s, over the {self.budget_seconds:.2f}s budget")
+
+    def _warm_up(self) -> None:
+        from src.inference import generate_requirements_batch
+        from src.serving.registry import DEFAULT_MODEL_KEY
+        from src.structured import OUTPUT_FORMATS
+
+        for output_format in self.output_formats or OUTPUT_FORMATS:
+            generate_requirements_batch(
+                [WARMUP_TEXT],
+                model_name=self.model_name or DEFAULT_MODEL_KEY,
+                max_new_tokens=self.warmup_tokens,
+                output_format=output_format
+            )
+
+    @contextmanager
+    def _phase(self, name: str):
+        self.phase = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            self.phases[name] = seconds
+            observe_stage(f"startup_{name}", seconds)
+
+    def to_dict(self) -> dict:
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self.started_at
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "phase": self.phase,
+            "seconds": round(seconds, 3),
+            "phases": {phase: round(value, 3) for phase, value in self.phases.items()},
+            "budget_seconds": self.budget_seconds,
+            "over_budget": self.budget_seconds is not None and seconds > self.budget_seconds,
+            "error": self.error,
+        }
+
+
+@dataclass
+class ImportTiming:
+    """One line of ``-X importtime`` output, in microseconds."""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+IMPORTTIME_PATTERN = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def parse_importtime(output: str) -> List[ImportTiming]:
+    timings = []
+    for line in output.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            timings.append(ImportTiming(module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return timings
+
+
+def profile_imports(module: str, python: str = sys.executable) -> List[ImportTiming]:
+    """Import ``module`` in a fresh interpreter and return the time spent per imported module."""
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=project_root,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def import_totals(timings: Sequence[ImportTiming], module: str) -> Dict[str, float]:
+    """
+    Milliseconds to import ``module`` (its cumulative time) and the
+    self-time of each top-level package it pulled in.
+    """
+    packages: Dict[str, int] = {}
+    for timing in timings:
+        package = timing.module.split(".")[0]
+        packages[package] = packages.get(package, 0) + timing.self_us
+    total = next((t.cumulative_us for t in timings if t.module == module and t.depth == 0), None)
+    if total is None:
+        total = sum(packages.values())
+    return {
+        "total_ms": round(total / 1000, 1),
+        "packages_ms": {
+            package: round(us / 1000, 1)
+            for package, us in sorted(packages.items(), key=lambda item: -item[1])
+        },
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import-time profile: time spent per module and package")
+    parser.add_argument("modules", nargs="*", default=["backend.main", "src.inference"])
+    parser.add_argument("--top", type=int, default=15, help="modules and packages to list per import")
+    args = parser.parse_args()
+
+    for module in args.modules:
+        timings = profile_imports(module)
+        totals = import_totals(timings, module)
+        print(f"{module}: {totals['total_ms']:.1f} ms")
+        print(f"  {'package':<40} {'self ms':>9}")
+        for package, ms in list(totals["packages_ms"].items())[:args.top]:
+            print(f"  {package:<40} {ms:>9.1f}")
+        print(f"  {'module':<40} {'self ms':>9} {'cumulative ms':>14}")
+        for timing in sorted(timings, key=lambda t: -t.self_us)[:args.top]:
+            print(f"  {timing.module:<40} {timing.self_us / 1000:>9.1f} {timing.cumulative_us / 1000:>14.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
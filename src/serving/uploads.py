@@ -0,0 +1,86 @@
+import hashlib
+import logging
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_MAX_UPLOAD_BYTES = 50 * 2**20
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size cap."""
+
+
+@dataclass
+class SpooledUpload:
+    """
+    An upload copied to its own temporary file.
+
+    The file belongs to whoever holds this object: call ``cleanup`` (or use
+    it as a context manager) once nothing will read ``path`` any more.
+    """
+    path: str
+    size: int
+    sha256: str
+
+    def cleanup(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+
+
+def max_upload_bytes() -> int:
+    limit = os.environ.get("MAX_UPLOAD_MB")
+    return int(float(limit) * 2**20) if limit else DEFAULT_MAX_UPLOAD_BYTES
+
+
+def spool_upload(
+    source: BinaryIO,
+    max_bytes: Optional[int] = None,
+    suffix: str = ".pdf",
+    directory: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE
+) -> SpooledUpload:
+    """
+    Copy an upload stream to a temporary file in fixed-size chunks.
+
+    At most ``chunk_size`` bytes are held in memory at once, the SHA-256 is
+    computed on the way through, and the copy stops with ``UploadTooLarge``
+    as soon as ``max_bytes`` is exceeded. On any failure the partial file is
+    removed before the exception propagates.
+    """
+    max_bytes = max_upload_bytes() if max_bytes is None else max_bytes
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(
+                        f"Upload exceeds the {max_bytes / 2**20:.0f} MB limit"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        raise
+    return SpooledUpload(path=path, size=size, sha256=digest.hexdigest())
@@ -0,0 +1,205 @@
+"""
+Multi-process serving: several backend workers on one port sharing the weights.
+
+    python -m src.serving.workers --workers 4 --port 8000
+
+The launcher binds the listening socket once and starts each worker in a
+fresh (spawned) interpreter that accepts connections on it. Workers load an
+exported artifact with MODEL_MMAP=1, so the weights are one read-only
+mapping whose pages all of them share (see ``src.serving.export``); each
+worker adds only its activations, caches and Python heap. The CPUs are
+partitioned between workers: each one is pinned to its own cores and its
+OpenMP/MKL thread pools are sized to match, so N workers do not run N
+full-width thread pools against each other. A worker that exits is
+restarted on the same cores.
+
+Every worker runs its own startup (see ``src.serving.startup``) and keeps
+its own jobs, caches and metrics; ``/ready`` and ``/metrics`` describe the
+worker that answered.
+"""
+import argparse
+import importlib
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+logger = logging.getLogger(__name__)
+
+APP = "backend.main:app"
+THREAD_VARIABLES = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+# A worker that keeps dying is restarted at most this often
+RESTART_INTERVAL_SECONDS = 1.0
+
+
+def available_cpus() -> List[int]:
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def partition_cpus(workers: int, cpus: Optional[Sequence[int]] = None) -> List[List[int]]:
+    """
+    Split ``cpus`` into ``workers`` contiguous groups whose sizes differ by
+    at most one. With fewer CPUs than workers, workers share CPUs round-robin.
+    """
+    cpus = list(cpus) if cpus is not None else available_cpus()
+    if workers >= len(cpus):
+        return [[cpus[index % len(cpus)]] for index in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    groups, start = [], 0
+    for index in range(workers):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(cpus[start:end])
+        start = end
+    return groups
+
+
+def worker_environment(index: int, cpus: Sequence[int]) -> Dict[str, str]:
+    """Environment of one worker, applied before it imports torch."""
+    env = {name: str(len(cpus)) for name in THREAD_VARIABLES}
+    env["WORKER_INDEX"] = str(index)
+    # Shared weights are the point of running several workers
+    env["MODEL_MMAP"] = os.environ.get("MODEL_MMAP", "1")
+    env["TOKENIZERS_PARALLELISM"] = "false"
+    return env
+
+
+def load_callable(target: str):
+    """``module:function`` to the function."""
+    module, _, name = target.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def run_worker(index: int, cpus: List[int], sock, app: str, log_level: str, init: Optional[str]) -> None:
+    """Entry point of one worker process."""
+    os.environ.update(worker_environment(index, cpus))
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if init:
+        load_callable(init)()
+
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+class WorkerPool:
+    """
+    Starts, supervises and stops the worker processes.
+
+    ``init`` (``module:function``) is called in each worker before the app
+    is imported, e.g. to install a different model registry.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        host: str = "0.0.0.0",
+        port: int = 8000,
+        app: str = APP,
+        cpus: Optional[Sequence[int]] = None,
+        init: Optional[str] = None,
+        log_level: str = "info"
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.app = app
+        self.cpu_groups = partition_cpus(workers, cpus)
+        self.init = init
+        self.log_level = log_level
+        self.processes: Dict[int, multiprocessing.Process] = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._socket = None
+        self._stopping = False
+
+    def start(self) -> None:
+        import uvicorn
+
+        self._socket = uvicorn.Config(self.app, host=self.host, port=self.port).bind_socket()
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def _spawn(self, index: int) -> None:
+        cpus = self.cpu_groups[index]
+        process = self._context.Process(
+            target=run_worker,
+            args=(index, cpus, self._socket, self.app, self.log_level, self.init),
+            name=f"worker-{index}"
+        )
+        process.start()
+        self.processes[index] = process
+        logger.info(f"Started worker {index} (pid {process.pid}) on CPUs {cpus} with {len(cpus)} thread(s)")
+
+    def run(self) -> None:
+        """Serve until SIGINT/SIGTERM, restarting workers that exit."""
+        def stop(signum, frame):
+            self._stopping = True
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        self.start()
+        try:
+            while not self._stopping:
+                time.sleep(RESTART_INTERVAL_SECONDS)
+                for index, process in list(self.processes.items()):
+                    if not process.is_alive() and not self._stopping:
+                        logger.warning(f"Worker {index} (pid {process.pid}) exited with {process.exitcode}; restarting")
+                        self._spawn(index)
+        finally:
+            self.stop()
+
+    def stop(self, timeout: float = 30.0) -> None:
+        self._stopping = True
+        for process in self.processes.values():
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self.processes.values():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+                process.join()
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the backend from several worker processes sharing the model weights")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SERVE_WORKERS", "2")))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--app", default=APP)
+    parser.add_argument("--init", default=None, help="module:function to call in each worker before serving")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    from src.serving.metrics import install_request_id_logging
+
+    install_request_id_logging()
+    pool = WorkerPool(
+        args.workers,
+        host=args.host,
+        port=args.port,
+        app=args.app,
+        init=args.init,
+        log_level=args.log_level
+    )
+    pool.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from datasets import Dataset
+
+from src.data.packing import IGNORE_INDEX, build_example
+from src.spin.monitor import PhaseMonitor
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_INPUT_IDS = "synthetic_input_ids"
+SYNTHETIC_LABELS = "synthetic_labels"
+SPIN_INDEX = "spin_index"
+CACHE_INFO = "spin_cache.json"
+
+SYNTHETIC_GENERATION_KWARGS = {
+    "do_sample": True,
+    "temperature": 0.7,
+}
+
+
+def prompt_ids(row: Dict[str, Any]) -> List[int]:
+    """
+    The prompt tokens of a processed training row.
+
+    Unpadded rows (``dynamic`` mode) carry prompt+target in ``input_ids``
+    with the prompt labelled ``IGNORE_INDEX``; padded rows (``max_length``
+    mode) hold only the prompt in ``input_ids``, masked by ``attention_mask``.
+    """
+    if "segment_ids" in row:
+        raise ValueError("SPIN needs one example per row; use an unpacked dataset")
+    labels = row["labels"]
+    if len(labels) == len(row["input_ids"]) and labels and labels[0] == IGNORE_INDEX:
+        length = next((i for i, label in enumerate(labels) if label != IGNORE_INDEX), len(labels))
+        return list(row["input_ids"][:length])
+    mask = row.get("attention_mask")
+    if mask is None:
+        return list(row["input_ids"])
+    return [token for token, keep in zip(row["input_ids"], mask) if keep]
+
+
+def synthetic_dir(output_dir, iteration: int) -> Path:
+    return Path(output_dir) / "synthetic" / f"iteration-{iteration:03d}"
+
+
+def sequences_fingerprint(*columns: Sequence[Sequence[int]]) -> str:
+    """Digest of one or more columns of token sequences, row by row."""
+    digest = hashlib.sha256()
+    for column in columns:
+        for sequence in column:
+            array = np.asarray(sequence, dtype=np.int64)
+            digest.update(len(array).to_bytes(8, "little"))
+            digest.update(array.tobytes())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def model_revision(model) -> str:
+    """
+    The base checkpoint name plus a digest of the trainable weights, so a
+    model identifies the same state across runs and changes as it trains.
+    Only trainable parameters are hashed (the LoRA adapter in practice),
+    which keeps this cheap next to a generation or reference pass.
+    """
+    digest = hashlib.sha256()
+    for name, param in model.named_parameters():
+        if param.requires_grad:
+            digest.update(name.encode())
+            digest.update(param.detach().float().cpu().numpy().tobytes())
+    config = getattr(model, "config", None)
+    name = getattr(config, "_name_or_path", None) or type(model).__name__
+    return f"{name}@{digest.hexdigest()[:16]}"
+
+
+def read_cache_info(path) -> Optional[Dict[str, Any]]:
+    """The JSON metadata stored with a cached phase result, if any."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+@torch.no_grad()
+def generate_synthetic_dataset(
+    model,
+    tokenizer,
+    dataset: Dataset,
+    iteration: int,
+    output_dir,
+    batch_size: int = 16,
+    max_new_tokens: int = 512,
+    max_length: Optional[int] = None,
+    generation_kwargs: Optional[Dict[str, Any]] = None,
+    revision: Optional[str] = None
+) -> Tuple[Dataset, Dict[str, Any]]:
+    """
+    Generate one opponent response per training row and store them.
+
+    Prompts are sorted by length and generated ``batch_size`` at a time with
+    left padding, so a whole batch decodes in lockstep with little padding.
+    The result (``index``, ``iteration``, ``synthetic_input_ids`` and
+    ``synthetic_labels`` per row, in dataset order) is saved as an Arrow
+    dataset under ``output_dir/synthetic/iteration-NNN``, together with the
+    prompts' fingerprint, the model ``revision`` (see ``model_revision``)
+    and the generation settings. A stored result is only loaded instead of
+    regenerated when all of those match.
+    Returns the samples and the generation phase metrics (empty on reuse).
+    """
+    generation_kwargs = {**SYNTHETIC_GENERATION_KWARGS, **(generation_kwargs or {})}
+    prompts = [prompt_ids(row) for row in dataset]
+    info = {
+        "iteration": iteration,
+        "rows": len(prompts),
+        "dataset": sequences_fingerprint(prompts),
+        "revision": revision or model_revision(model),
+        "max_new_tokens": max_new_tokens,
+        "max_length": max_length,
+        "generation_kwargs": generation_kwargs,
+    }
+    # Compared against the stored copy, so normalise it the same way
+    info = json.loads(json.dumps(info, default=str))
+    path = synthetic_dir(output_dir, iteration)
+    cached_info = read_cache_info(path / CACHE_INFO)
+    if cached_info == info:
+        logger.info(f"Reusing synthetic samples for iteration {iteration} from {path}")
+        return Dataset.load_from_disk(str(path)), {}
+    if cached_info is not None:
+        stale = [key for key in info if cached_info.get(key) != info[key]]
+        logger.info(f"Regenerating synthetic samples for iteration {iteration}; changed: {', '.join(stale)}")
+
+    order = sorted(range(len(prompts)), key=lambda i: len(prompts[i]))
+    pad_token_id = tokenizer.pad_token_id
+    if pad_token_id is None:
+        pad_token_id = tokenizer.eos_token_id
+    eos_token_id = tokenizer.eos_token_id
+    max_length = max_length or max(len(p) for p in prompts) + max_new_tokens + 1
+    device = next(model.parameters()).device
+
+    was_training = model.training
+    model.eval()
+    generated: Dict[int, List[int]] = {}
+    with PhaseMonitor("generation") as monitor:
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            longest = max(len(prompts[i]) for i in indices)
+            input_ids = torch.full((len(indices), longest), pad_token_id, dtype=torch.long)
+            attention_mask = torch.zeros((len(indices), longest), dtype=torch.long)
+            for row, i in enumerate(indices):
+                length = len(prompts[i])
+                if length:
+                    input_ids[row, -length:] = torch.tensor(prompts[i])
+                    attention_mask[row, -length:] = 1
+            outputs = model.generate(
+                input_ids=input_ids.to(device),
+                attention_mask=attention_mask.to(device),
+                max_new_tokens=max_new_tokens,
+                pad_token_id=pad_token_id,
+                eos_token_id=eos_token_id,
+                **generation_kwargs
+            )
+            new_tokens = 0
+            for row, i in enumerate(indices):
+                response = outputs[row, longest:].tolist()
+                if eos_token_id in response:
+                    response = response[:response.index(eos_token_id)]
+                elif pad_token_id in response:
+                    response = response[:response.index(pad_token_id)]
+                generated[i] = response
+                new_tokens += len(response)
+            monitor.step(samples=len(indices), tokens=new_tokens)
+    if was_training:
+        model.train()
+
+    rows = {"index": [], "iteration": [], SYNTHETIC_INPUT_IDS: [], SYNTHETIC_LABELS: []}
+    for i, prompt in enumerate(prompts):
+        example = build_example(prompt, generated[i], eos_token_id, max_length)
+        rows["index"].append(i)
+        rows["iteration"].append(iteration)
+        rows[SYNTHETIC_INPUT_IDS].append(example["input_ids"])
+        rows[SYNTHETIC_LABELS].append(example["labels"])
+    synthetic = Dataset.from_dict(rows)
+    if path.exists():
+        shutil.rmtree(path)
+    synthetic.save_to_disk(str(path))
+    # Written last so an interrupted save is never taken for a complete one
+    with open(path / CACHE_INFO, "w") as f:
+        json.dump(info, f)
+
+    metrics = monitor.metrics()
+    logger.info(
+        f"Generated {len(synthetic)} synthetic samples for iteration {iteration} in "
+        f"{metrics['generation_seconds']:.1f}s ({metrics['generation_tokens_per_second']:.1f} tokens/s, "
+        f"{metrics['generation_step_seconds'] or 0:.2f}s/batch)"
+    )
+    return synthetic, metrics
+
+
+def attach_synthetic(dataset: Dataset, synthetic: Dataset) -> Dataset:
+    """
+    Add the synthetic columns to the matching rows of ``dataset``, plus a
+    ``spin_index`` column locating each row in per-iteration arrays.
+    """
+    if len(synthetic) != len(dataset):
+        raise ValueError("Synthetic samples do not match the training set")
+    columns = [SYNTHETIC_INPUT_IDS, SYNTHETIC_LABELS]
+    dataset = dataset.remove_columns([c for c in columns + [SPIN_INDEX] if c in dataset.column_names])
+    for column in columns:
+        dataset = dataset.add_column(column, synthetic[column])
+    return dataset.add_column(SPIN_INDEX, list(range(len(dataset))))
+
+
+class SyntheticPairCollator:
+    """
+    Wraps a collator so rows may carry a synthetic response: the real fields
+    go through ``base_collator`` and the synthetic ones are right-padded into
+    ``synthetic_input_ids``, ``synthetic_attention_mask`` and
+    ``synthetic_labels``; ``spin_index`` is passed through as a tensor.
+    """
+
+    def __init__(self, base_collator, pad_token_id: int):
+        self.base_collator = base_collator
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features: Sequence[Dict[str, Any]]) -> Dict[str, torch.Tensor]:
+        synthetic = None
+        indices = None
+        if features and SPIN_INDEX in features[0]:
+            indices = [feature.pop(SPIN_INDEX) for feature in features]
+        if features and SYNTHETIC_INPUT_IDS in features[0]:
+            synthetic = [
+                (feature.pop(SYNTHETIC_INPUT_IDS), feature.pop(SYNTHETIC_LABELS))
+                for feature in features
+            ]
+        batch = self.base_collator(features)
+        if synthetic is not None:
+            longest = max(len(ids) for ids, _ in synthetic)
+            input_ids, labels, attention_mask = [], [], []
+            for ids, target in synthetic:
+                padding = longest - len(ids)
+                input_ids.append(list(ids) + [self.pad_token_id] * padding)
+                labels.append(list(target) + [IGNORE_INDEX] * padding)
+                attention_mask.append([1] * len(ids) + [0] * padding)
+            batch[SYNTHETIC_INPUT_IDS] = torch.tensor(input_ids, dtype=torch.long)
+            batch[SYNTHETIC_LABELS] = torch.tensor(labels, dtype=torch.long)
+            batch["synthetic_attention_mask"] = torch.tensor(attention_mask, dtype=torch.long)
+        if indices is not None:
+            batch[SPIN_INDEX] = torch.tensor(indices, dtype=torch.long)
+        return batch
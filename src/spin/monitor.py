@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import torch
+
+
+def gpu_utilization() -> Optional[float]:
+    """Current GPU utilisation in [0, 1], or None when it cannot be read."""
+    if not torch.cuda.is_available():
+        return None
+    try:
+        # Needs pynvml; not every install has it
+        return torch.cuda.utilization() / 100.0
+    except Exception:
+        return None
+
+
+class PhaseMonitor:
+    """
+    Wall time, step time and idle fractions for one phase of a training run.
+
+    Used as a context manager around a phase. CPU idle is the share of the
+    machine's cores the process left unused; GPU idle is sampled from the
+    driver every ``interval`` seconds in a background thread and is None
+    without a GPU (or pynvml).
+    """
+
+    def __init__(self, name: str, interval: float = 0.5):
+        self.name = name
+        self.interval = interval
+        self.steps = 0
+        self.samples = 0
+        self.tokens = 0
+        self._gpu_samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._cpu_started = 0.0
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def __enter__(self) -> "PhaseMonitor":
+        if gpu_utilization() is not None:
+            self._thread = threading.Thread(target=self._sample, name=f"{self.name}-monitor", daemon=True)
+            self._thread.start()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        self.seconds = time.perf_counter() - self._started
+        self.cpu_seconds = time.process_time() - self._cpu_started
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def step(self, samples: int = 0, tokens: int = 0) -> None:
+        self.steps += 1
+        self.samples += samples
+        self.tokens += tokens
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            value = gpu_utilization()
+            if value is not None:
+                self._gpu_samples.append(value)
+
+    def metrics(self) -> Dict[str, Any]:
+        seconds = self.seconds or 1e-9
+        gpu_idle = None
+        if self._gpu_samples:
+            gpu_idle = 1.0 - sum(self._gpu_samples) / len(self._gpu_samples)
+        return {
+            f"{self.name}_seconds": self.seconds,
+            f"{self.name}_steps": self.steps,
+            f"{self.name}_step_seconds": self.seconds / self.steps if self.steps else None,
+            f"{self.name}_samples_per_second": self.samples / seconds,
+            f"{self.name}_tokens_per_second": self.tokens / seconds,
+            f"{self.name}_cpu_idle_fraction": max(0.0, 1.0 - self.cpu_seconds / (seconds * (os.cpu_count() or 1))),
+            f"{self.name}_gpu_idle_fraction": gpu_idle,
+        }
@@ -0,0 +1,198 @@
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from src.data.packing import IGNORE_INDEX
+from src.spin.generation import (
+    SYNTHETIC_INPUT_IDS,
+    SYNTHETIC_LABELS,
+    model_revision,
+    sequences_fingerprint
+)
+from src.spin.monitor import PhaseMonitor
+
+logger = logging.getLogger(__name__)
+
+REAL, SYNTHETIC = 0, 1
+
+
+def sequence_logprobs(logits: torch.Tensor, labels: torch.Tensor) -> torch.Tensor:
+    """
+    Summed log-probability of the supervised tokens of each sequence.
+    ``labels`` are aligned with the inputs (shifted here, as in the LM loss)
+    and ``IGNORE_INDEX`` positions do not count.
+    """
+    logits = logits[:, :-1, :].float()
+    labels = labels[:, 1:]
+    mask = labels != IGNORE_INDEX
+    token_logps = torch.gather(
+        F.log_softmax(logits, dim=-1), 2, labels.clamp(min=0).unsqueeze(-1)
+    ).squeeze(-1)
+    return (token_logps * mask).sum(dim=-1)
+
+
+def pad_pairs(
+    real: Sequence[Tuple[Sequence[int], Sequence[int]]],
+    synthetic: Sequence[Tuple[Sequence[int], Sequence[int]]],
+    pad_token_id: int
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Right-pad real and synthetic ``(input_ids, labels)`` pairs into one batch
+    (real rows first) so both are scored in a single forward pass.
+    """
+    rows = list(real) + list(synthetic)
+    longest = max(len(ids) for ids, _ in rows)
+    input_ids, labels, attention_mask = [], [], []
+    for ids, target in rows:
+        padding = longest - len(ids)
+        input_ids.append(list(ids) + [pad_token_id] * padding)
+        labels.append(list(target) + [IGNORE_INDEX] * padding)
+        attention_mask.append([1] * len(ids) + [0] * padding)
+    return (
+        torch.tensor(input_ids, dtype=torch.long),
+        torch.tensor(attention_mask, dtype=torch.long),
+        torch.tensor(labels, dtype=torch.long),
+    )
+
+
+class ReferenceLogprobs:
+    """
+    Per-example reference log-probabilities for one SPIN iteration, held in
+    a float32 memory-mapped array of shape ``(rows, 2)`` (real, synthetic).
+
+    The file lives next to a small JSON header and is only marked complete
+    once every row has been written, so an interrupted precompute is redone
+    rather than read back half empty. The header also records what the
+    values were computed from (reference model revision, dataset
+    fingerprint, longest scored sequence); a file is only reused for the
+    same inputs.
+    """
+
+    def __init__(self, path, rows: int, mode: str = "r"):
+        self.path = Path(path)
+        self.rows = rows
+        self.values = np.memmap(self.path, dtype=np.float32, mode=mode, shape=(rows, 2))
+
+    @property
+    def header_path(self) -> Path:
+        return self.path.with_suffix(".json")
+
+    @classmethod
+    def open(cls, path, info: Dict[str, Any]) -> Optional["ReferenceLogprobs"]:
+        """
+        The stored array if it is complete and was computed for ``info``
+        (which must include ``rows``), otherwise None.
+        """
+        path = Path(path)
+        header = path.with_suffix(".json")
+        if not path.exists() or not header.exists():
+            return None
+        with open(header) as f:
+            stored = json.load(f)
+        if not stored.pop("complete", False):
+            return None
+        if stored != info:
+            stale = [key for key in info if stored.get(key) != info[key]]
+            logger.info(f"Not reusing reference logprobs from {path}; changed: {', '.join(stale)}")
+            return None
+        return cls(path, info["rows"])
+
+    def mark_complete(self, info: Dict[str, Any]) -> None:
+        self.values.flush()
+        with open(self.header_path, "w") as f:
+            json.dump({**info, "rows": self.rows, "complete": True}, f)
+
+    def lookup(self, indices: torch.Tensor, device=None) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Reference (real, synthetic) log-probabilities for dataset rows."""
+        values = torch.from_numpy(np.asarray(self.values[indices.cpu().numpy()]))
+        values = values.to(device) if device is not None else values
+        return values[:, REAL], values[:, SYNTHETIC]
+
+
+def reference_path(output_dir, iteration: int) -> Path:
+    return Path(output_dir) / "reference" / f"iteration-{iteration:03d}.f32"
+
+
+@torch.no_grad()
+def precompute_reference_logprobs(
+    model,
+    dataset,
+    iteration: int,
+    output_dir,
+    pad_token_id: int,
+    batch_size: int = 8,
+    revision: Optional[str] = None
+) -> Tuple[ReferenceLogprobs, Dict[str, Any]]:
+    """
+    Score every real and synthetic example of ``dataset`` once with the
+    frozen model of this iteration and store the results.
+
+    ``dataset`` must carry unpadded ``input_ids``/``labels`` (``dynamic``
+    processing mode) plus the synthetic columns. Rows are visited in length
+    order so each batch is padded as little as possible; real and synthetic
+    sequences share one forward pass per batch. ``revision`` identifies the
+    frozen model (``model_revision`` by default). Returns the stored values
+    and the phase metrics (empty on reuse).
+    """
+    first = dataset[0]
+    if len(first["labels"]) != len(first["input_ids"]):
+        raise ValueError(
+            "Reference logprobs need labels aligned with input_ids; "
+            "prepare the dataset with packing_mode='dynamic'"
+        )
+
+    columns = [dataset[column] for column in ("input_ids", "labels", SYNTHETIC_INPUT_IDS, SYNTHETIC_LABELS)]
+    lengths = [max(len(real), len(synthetic)) for real, synthetic in zip(columns[0], columns[2])]
+    info = {
+        "rows": len(dataset),
+        "iteration": iteration,
+        "revision": revision or model_revision(model),
+        "dataset": sequences_fingerprint(*columns),
+        "max_length": max(lengths),
+    }
+    path = reference_path(output_dir, iteration)
+    existing = ReferenceLogprobs.open(path, info)
+    if existing is not None:
+        logger.info(f"Reusing reference logprobs for iteration {iteration} from {path}")
+        return existing, {}
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.with_suffix(".json").unlink(missing_ok=True)
+    reference = ReferenceLogprobs(path, len(dataset), mode="w+")
+    order = sorted(range(len(dataset)), key=lambda i: lengths[i])
+    device = next(model.parameters()).device
+
+    was_training = model.training
+    model.eval()
+    with PhaseMonitor("reference") as monitor:
+        for start in range(0, len(order), batch_size):
+            indices = order[start:start + batch_size]
+            rows = dataset.select(indices)
+            input_ids, attention_mask, labels = pad_pairs(
+                zip(rows["input_ids"], rows["labels"]),
+                zip(rows[SYNTHETIC_INPUT_IDS], rows[SYNTHETIC_LABELS]),
+                pad_token_id
+            )
+            logits = model(
+                input_ids=input_ids.to(device),
+                attention_mask=attention_mask.to(device)
+            ).logits
+            logps = sequence_logprobs(logits, labels.to(device)).cpu().numpy()
+            reference.values[indices, REAL] = logps[:len(indices)]
+            reference.values[indices, SYNTHETIC] = logps[len(indices):]
+            monitor.step(samples=len(indices), tokens=int(attention_mask.sum()))
+    if was_training:
+        model.train()
+
+    reference.mark_complete(info)
+    metrics = monitor.metrics()
+    logger.info(
+        f"Precomputed reference logprobs for {len(dataset)} pairs in "
+        f"{metrics['reference_seconds']:.1f}s ({metrics['reference_tokens_per_second']:.1f} tokens/s)"
+    )
+    return ReferenceLogprobs(path, len(dataset)), metrics
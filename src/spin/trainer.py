@@ -1,17 +1,87 @@
+import json
 import torch
 import torch.nn as nn
-from transformers import Trainer, TrainingArguments
+import torch.nn.functional as F
+from transformers import Trainer, TrainerCallback, TrainingArguments
+from transformers.trainer_utils import PREFIX_CHECKPOINT_DIR, get_last_checkpoint
 from peft import get_peft_model, LoraConfig
+from pathlib import Path
 from typing import Optional, Dict, Any
 import logging
 
+from src.data.packing import IGNORE_INDEX
+from src.spin.generation import (
+    CACHE_INFO,
+    SPIN_INDEX,
+    SYNTHETIC_INPUT_IDS,
+    SYNTHETIC_LABELS,
+    SyntheticPairCollator,
+    attach_synthetic,
+    generate_synthetic_dataset,
+    model_revision,
+    read_cache_info,
+    synthetic_dir
+)
+from src.spin.monitor import PhaseMonitor
+from src.spin.reference import precompute_reference_logprobs, sequence_logprobs
+
 logger = logging.getLogger(__name__)
 
+SPIN_STATE = "spin_state.json"
+
+def iteration_dir(output_dir, iteration: int) -> Path:
+    return Path(output_dir) / f"iteration-{iteration:03d}"
+
+def checkpoint_iteration(checkpoint) -> int:
+    """The SPIN iteration a checkpoint was saved in (0 if it has no SPIN state)."""
+    info = read_cache_info(Path(checkpoint) / SPIN_STATE)
+    return info["iteration"] if info else 0
+
+def last_spin_checkpoint(output_dir) -> Optional[str]:
+    """The latest checkpoint of the latest SPIN iteration that saved one."""
+    for directory in sorted(Path(output_dir).glob("iteration-*"), reverse=True):
+        checkpoint = get_last_checkpoint(str(directory))
+        if checkpoint is not None:
+            return checkpoint
+    return get_last_checkpoint(str(output_dir)) if Path(output_dir).is_dir() else None
+
+class SPINStateCallback(TrainerCallback):
+    """Records the SPIN iteration next to each checkpoint the trainer saves."""
+    
+    def __init__(self, trainer: "SPINTrainer"):
+        self.trainer = trainer
+    
+    def on_save(self, args, state, control, **kwargs):
+        if state.is_world_process_zero:
+            checkpoint = Path(args.output_dir) / f"{PREFIX_CHECKPOINT_DIR}-{state.global_step}"
+            with open(checkpoint / SPIN_STATE, "w") as f:
+                json.dump({"iteration": self.trainer.current_iteration}, f)
+
 class SPINTrainer(Trainer):
     """
     Self-Play Fine-Tuning (SPIN) trainer that implements the SPIN algorithm.
     The trainer generates synthetic data from the model's previous iterations
     and uses it for self-improvement.
+    
+    Each iteration after the first starts with a generation phase: the
+    current model answers every training prompt in large batches (see
+    ``generate_synthetic_dataset``), the responses are stored as an Arrow
+    dataset for that iteration, and the training steps then read them from
+    the dataset instead of decoding inside ``compute_loss``.
+    
+    The frozen iteration-t model is then run once over every real and
+    synthetic pair and its sequence log-probabilities are stored in a
+    memory-mapped array (see ``precompute_reference_logprobs``). Training
+    steps minimise the SPIN logistic loss against those cached values, so no
+    second model is kept resident and no reference forward pass is needed
+    per step. This needs unpadded rows (``packing_mode="dynamic"``); with
+    padded rows the trainer falls back to adding ``beta`` times the LM loss
+    on the synthetic responses.
+    
+    Checkpoints of iteration t are saved under ``output_dir/iteration-t``
+    with the iteration recorded beside them, since the step count restarts
+    every iteration. Resuming from one restarts the loop at that iteration
+    and reuses the synthetic data it was training on.
     """
     
     def __init__(
@@ -21,41 +91,117 @@ class SPINTrainer(Trainer):
         beta: float = 0.1,
         train_dataset: Optional[Any] = None,
         eval_dataset: Optional[Any] = None,
+        generation_batch_size: int = 16,
+        max_new_tokens: int = 512,
+        num_iterations: Optional[int] = None,
+        reference_batch_size: int = 8,
         **kwargs
     ):
         super().__init__(model, args, train_dataset, eval_dataset, **kwargs)
         self.beta = beta
         self.current_iteration = 0
         self.best_eval_loss = float('inf')
+        self.generation_batch_size = generation_batch_size
+        self.max_new_tokens = max_new_tokens
+        self.num_iterations = num_iterations or int(args.num_train_epochs)
+        self.reference_batch_size = reference_batch_size
+        self.reference = None
+        self.real_train_dataset = train_dataset
+        self.output_root = args.output_dir
+        self.add_callback(SPINStateCallback(self))
+        self.pad_token_id = self.tokenizer.pad_token_id
+        if self.pad_token_id is None:
+            self.pad_token_id = self.tokenizer.eos_token_id
+        self.data_collator = SyntheticPairCollator(self.data_collator, self.pad_token_id)
+    
+    def _set_signature_columns_if_needed(self):
+        super()._set_signature_columns_if_needed()
+        # Keep the synthetic columns that the model's forward() does not take
+        for column in (SYNTHETIC_INPUT_IDS, SYNTHETIC_LABELS, SPIN_INDEX):
+            if column not in self._signature_columns:
+                self._signature_columns.append(column)
+    
+    def generate_synthetic(self, iteration: int, revision: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Generation phase: produce opponent responses for the whole training
+        set with the current model and attach them to the training dataset,
+        then score the pairs with the (still frozen) model as the reference.
+        Both results are cached under the model's current revision (or
+        ``revision``), so a rerun only reuses them for the same weights and
+        training data.
+        """
+        revision = revision or model_revision(self.model)
+        synthetic, metrics = generate_synthetic_dataset(
+            self.model,
+            self.tokenizer,
+            self.real_train_dataset,
+            iteration,
+            self.output_root,
+            batch_size=self.generation_batch_size,
+            max_new_tokens=self.max_new_tokens,
+            revision=revision
+        )
+        self.train_dataset = attach_synthetic(self.real_train_dataset, synthetic)
+        
+        first = self.train_dataset[0]
+        if len(first["labels"]) != len(first["input_ids"]):
+            logger.warning("Padded training rows; using the additive synthetic loss instead of the SPIN objective")
+            self.reference = None
+            return metrics
+        self.reference, reference_metrics = precompute_reference_logprobs(
+            self.model,
+            self.train_dataset,
+            iteration,
+            self.output_root,
+            self.pad_token_id,
+            batch_size=self.reference_batch_size,
+            revision=revision
+        )
+        metrics.update(reference_metrics)
+        return metrics
         
-    def compute_loss(self, model, inputs, return_outputs=False):
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
         """
-        Compute the SPIN loss which combines:
-        1. Standard language modeling loss
-        2. Self-play loss from synthetic data
+        Compute the SPIN loss.
+        
+        In the first iteration this is the standard language modeling loss.
+        Afterwards it is the SPIN logistic loss
+        ``-log sigmoid(beta * ((log p(real) - log p_ref(real)) - (log p(synthetic) - log p_ref(synthetic))))``
+        with the reference terms read from the precomputed array.
         """
+        spin_index = inputs.pop(SPIN_INDEX, None)
+        synthetic_input_ids = inputs.pop(SYNTHETIC_INPUT_IDS, None)
+        synthetic_labels = inputs.pop(SYNTHETIC_LABELS, None)
+        synthetic_attention_mask = inputs.pop("synthetic_attention_mask", None)
+        
+        if self.current_iteration > 0 and self.reference is not None and spin_index is not None:
+            # Real and synthetic sequences share one forward pass
+            length = max(inputs["input_ids"].shape[1], synthetic_input_ids.shape[1])
+            
+            def pad(tensor, value):
+                return F.pad(tensor, (0, length - tensor.shape[1]), value=value)
+            
+            input_ids = torch.cat([pad(inputs["input_ids"], self.pad_token_id), pad(synthetic_input_ids, self.pad_token_id)])
+            attention_mask = torch.cat([pad(inputs["attention_mask"], 0), pad(synthetic_attention_mask, 0)])
+            labels = torch.cat([pad(inputs["labels"], IGNORE_INDEX), pad(synthetic_labels, IGNORE_INDEX)])
+            outputs = model(input_ids=input_ids, attention_mask=attention_mask)
+            real_logps, synthetic_logps = sequence_logprobs(outputs.logits, labels).chunk(2)
+            reference_real, reference_synthetic = self.reference.lookup(spin_index, device=real_logps.device)
+            margin = (real_logps - reference_real) - (synthetic_logps - reference_synthetic)
+            total_loss = -F.logsigmoid(self.beta * margin).mean()
+            return (total_loss, outputs) if return_outputs else total_loss
+        
         # Get real data loss
         outputs = model(**inputs)
         real_loss = outputs.loss
         
-        # Generate synthetic data from previous iteration
-        if self.current_iteration > 0:
-            with torch.no_grad():
-                synthetic_outputs = self.model.generate(
-                    input_ids=inputs["input_ids"],
-                    attention_mask=inputs["attention_mask"],
-                    max_length=self.args.max_length,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.pad_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                )
-            
+        # Synthetic data generated by the previous iteration's model
+        if self.current_iteration > 0 and synthetic_input_ids is not None:
             # Compute loss on synthetic data
-            synthetic_loss = self.model(
-                input_ids=synthetic_outputs,
-                attention_mask=torch.ones_like(synthetic_outputs),
-                labels=synthetic_outputs
+            synthetic_loss = model(
+                input_ids=synthetic_input_ids,
+                attention_mask=synthetic_attention_mask,
+                labels=synthetic_labels
             ).loss
             
             # Combine losses with beta parameter
@@ -90,7 +236,7 @@ class SPINTrainer(Trainer):
         
         if eval_output["eval_loss"] < self.best_eval_loss:
             self.best_eval_loss = eval_output["eval_loss"]
-            self.save_model()
+            self.save_model(self.output_root)
             
         return eval_output
     
@@ -110,17 +256,49 @@ class SPINTrainer(Trainer):
             )
             self.model = get_peft_model(self.model, lora_config)
             
+        resume = kwargs.get("resume_from_checkpoint")
+        if resume is True:
+            resume = kwargs["resume_from_checkpoint"] = last_spin_checkpoint(self.output_root)
+        start = checkpoint_iteration(resume) if resume else 0
+        if start:
+            logger.info(f"Resuming SPIN iteration {start + 1} from {resume}")
+        
         # Training loop
-        for iteration in range(self.args.num_train_epochs):
-            self.current_iteration = iteration
-            logger.info(f"Starting SPIN iteration {iteration + 1}")
-            
-            train_output = super().train(*args, **kwargs)
-            
-            # Evaluate after each iteration
-            eval_output = self.evaluate()
-            logger.info(f"SPIN iteration {iteration + 1} completed")
-            logger.info(f"Training loss: {train_output.training_loss}")
-            logger.info(f"Evaluation loss: {eval_output['eval_loss']}")
+        try:
+            for iteration in range(start, self.num_iterations):
+                self.current_iteration = iteration
+                self.args.output_dir = str(iteration_dir(self.output_root, iteration))
+                logger.info(f"Starting SPIN iteration {iteration + 1}")
+                
+                metrics = {}
+                if iteration > 0:
+                    revision = None
+                    if resume and iteration == start:
+                        # The checkpoint's weights are only loaded once training
+                        # starts, so reuse the data generated before the interruption
+                        info = read_cache_info(synthetic_dir(self.output_root, iteration) / CACHE_INFO)
+                        revision = info["revision"] if info else None
+                    metrics.update(self.generate_synthetic(iteration, revision))
+                
+                with PhaseMonitor("training") as monitor:
+                    train_output = super().train(*args, **kwargs)
+                # A checkpoint only applies to the iteration it was saved in
+                kwargs.pop("resume_from_checkpoint", None)
+                monitor.steps = train_output.global_step
+                monitor.samples = int(len(self.train_dataset) * self.args.num_train_epochs)
+                metrics.update(monitor.metrics())
+                
+                # Evaluate after each iteration
+                eval_output = self.evaluate()
+                logger.info(f"SPIN iteration {iteration + 1} completed")
+                logger.info(f"Training loss: {train_output.training_loss}")
+                logger.info(f"Evaluation loss: {eval_output['eval_loss']}")
+                phases = ", ".join(
+                    f"{key} {value:.3f}" for key, value in metrics.items() if isinstance(value, float)
+                )
+                logger.info(f"Phase metrics: {phases}")
+                self.log({key: value for key, value in metrics.items() if value is not None})
+        finally:
+            self.args.output_dir = self.output_root
             
         return train_output 
\ No newline at end of file
@@ -0,0 +1,259 @@
+import io
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.chunking import PAGE_MARKER, normalize_item, parse_sections
+from src.dedup import LINE_GUARD_WORDS, LINE_THRESHOLD, dedupe
+
+OUTPUT_FORMATS = ("markdown", "json")
+
+# JSON keys and the markdown sections they correspond to
+SECTIONS = {
+    "functional": "Functional Requirements",
+    "non_functional": "Non-Functional Requirements",
+    "user_stories": "User Stories",
+    "acceptance_criteria": "Acceptance Criteria",
+}
+
+REQUIREMENTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        key: {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "text": {"type": "string"},
+                    "page": {"type": ["integer", "null"]},
+                },
+                "required": ["text", "page"],
+            },
+        }
+        for key in SECTIONS
+    },
+    "required": list(SECTIONS),
+}
+
+# Static, like the markdown instructions, so its keys/values are cached once
+JSON_INSTRUCTIONS = """Analyze the document at the end of this prompt and extract its software requirements as JSON.
+
+# Reply with one JSON object and nothing else, with exactly these keys in this order:
+# "functional": core functionalities of the system.
+# "non_functional": quality attributes such as performance, security, scalability and reliability.
+# "user_stories": "As a [user role], I want [feature] so that [benefit]."
+# "acceptance_criteria": measurable conditions each requirement must meet.
+#
+# Each key holds an array of objects {"text": "<one requirement>", "page": <page number>},
+# where the page number comes from the nearest "[page N]" marker before the text the
+# requirement was taken from. Do not repeat the prompt.
+
+# Document:
+"""
+
+# Appended after the document so decoding starts inside the object
+JSON_PREFIX = '\n\nJSON:\n{"functional": ['
+# The part of the prefix that belongs to the model's reply
+JSON_REPLY_START = '{"functional": ['
+
+PAGE_PATTERN = re.compile(r"\d+")
+
+
+def empty_requirements() -> Dict[str, List[Dict[str, Any]]]:
+    return {key: [] for key in SECTIONS}
+
+
+def normalize_entry(value: Any, default_page: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    One schema item (``{"text": str, "page": int | None}``) from whatever
+    the model produced: an object with a text-like field, or a bare string.
+    """
+    if isinstance(value, str):
+        text, page = value, None
+    elif isinstance(value, dict):
+        text = next((value[key] for key in ("text", "requirement", "description") if isinstance(value.get(key), str)), None)
+        page = value.get("page", value.get("source_page"))
+    else:
+        return None
+    if text is None or not text.strip():
+        return None
+    if isinstance(page, list):
+        page = page[0] if page else None
+    if page is not None and not isinstance(page, int):
+        match = PAGE_PATTERN.search(str(page))
+        page = int(match.group()) if match else None
+    return {"text": " ".join(text.split()), "page": page if page is not None else default_page}
+
+
+class StreamingItemParser:
+    """
+    Incremental parser for the JSON reply of the ``json`` output format.
+
+    ``feed`` takes decoded text as it streams in and returns the
+    ``(section, item)`` pairs completed by it, so items can be sent to
+    clients before generation ends. Only the item being read is buffered.
+    Malformed items are skipped and anything after the object is ignored,
+    so a reply cut short by the token limit still yields its complete items.
+    """
+
+    def __init__(self, default_page: Optional[int] = None):
+        self.default_page = default_page
+        self.result = empty_requirements()
+        self.items = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._section: Optional[str] = None
+        self._capture: Optional[List[str]] = None
+        self._capturing_key = False
+
+    def feed(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        completed = []
+        for char in text:
+            if self._capture is not None:
+                self._capture.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._capturing_key:
+                        self._key = self._load(self._capture)
+                        self._capture, self._capturing_key = None, False
+                    elif self._depth == 2 and self._capture is not None:
+                        self._emit(completed)
+                continue
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1:
+                    self._capture, self._capturing_key = [char], True
+                elif self._depth == 2 and self._section is not None:
+                    self._capture = [char]
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 2 and char == "[":
+                    self._section = self._key if self._key in SECTIONS else None
+                elif self._depth == 3 and char == "{" and self._section is not None:
+                    self._capture = [char]
+            elif char in "}]":
+                if self._depth == 3 and char == "}" and self._capture is not None:
+                    self._emit(completed)
+                self._depth = max(0, self._depth - 1)
+                if self._depth < 2:
+                    self._section = None
+        return completed
+
+    @staticmethod
+    def _load(chars: Optional[List[str]]) -> Any:
+        try:
+            return json.loads("".join(chars or ()))
+        except ValueError:
+            return None
+
+    def _emit(self, completed: list) -> None:
+        item = normalize_entry(self._load(self._capture), self.default_page)
+        self._capture = None
+        if item is not None:
+            self.result[self._section].append(item)
+            self.items += 1
+            completed.append((self._section, item))
+
+
+def from_markdown(markdown: str, default_page: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """The schema form of a markdown requirements document (one item per bullet)."""
+    sections = parse_sections(markdown)
+    result = empty_requirements()
+    for key, title in SECTIONS.items():
+        for line in sections[title]:
+            text = re.sub(r"^\s*([-*+]|\d+[.)])\s+", "", line).strip()
+            if text:
+                result[key].append({"text": text, "page": default_page})
+    return result
+
+
+def parse_requirements(text: str, default_page: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Requirements from one generated reply, as the JSON schema. Replies
+    without any parseable item (e.g. the model answered in markdown) are
+    read as markdown instead.
+    """
+    parser = StreamingItemParser(default_page)
+    parser.feed(text)
+    if parser.items:
+        return parser.result
+    return from_markdown(text, default_page)
+
+
+def merge_structured(
+    results: Sequence[Dict[str, List[Dict[str, Any]]]],
+    similarity: Optional[float] = LINE_THRESHOLD
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Merge per-chunk results like ``merge_requirements``: first-seen order,
+    exact and (unless ``similarity`` is None) near-duplicates dropped, each
+    kept item keeping its page reference.
+    """
+    merged = empty_requirements()
+    for key in SECTIONS:
+        items, keys, seen = [], [], set()
+        for result in results:
+            for item in result.get(key, ()):
+                normalized = normalize_item(item["text"])
+                if normalized and normalized not in seen:
+                    seen.add(normalized)
+                    keys.append(normalized)
+                    items.append(item)
+        if similarity is not None:
+            items = [items[i] for i in dedupe(keys, similarity, exact=True, guard=LINE_GUARD_WORDS)]
+        merged[key] = items
+    return merged
+
+
+def _page_suffix(item: Dict[str, Any]) -> str:
+    return f" (p. {item['page']})" if item.get("page") is not None else ""
+
+
+def to_markdown(structured: Dict[str, List[Dict[str, Any]]]) -> str:
+    """The usual markdown requirements document, with page references."""
+    output = ["# Requirements Document"]
+    for key, title in SECTIONS.items():
+        output.append("")
+        output.append(f"## {title}")
+        output.extend(f"- {item['text']}{_page_suffix(item)}" for item in structured.get(key, ()))
+    return "\n".join(output).strip() + "\n"
+
+
+def to_json(structured: Dict[str, List[Dict[str, Any]]]) -> str:
+    return json.dumps({key: structured.get(key, []) for key in SECTIONS}, indent=2, ensure_ascii=False)
+
+
+def to_docx(structured: Dict[str, List[Dict[str, Any]]], title: str = "Extracted Requirements") -> bytes:
+    """A Word document of the requirements (needs python-docx)."""
+    try:
+        import docx
+    except ImportError as e:
+        raise RuntimeError("DOCX output needs python-docx (pip install python-docx)") from e
+
+    document = docx.Document()
+    document.add_heading(title, level=1)
+    for key, section_title in SECTIONS.items():
+        document.add_heading(section_title, level=2)
+        for item in structured.get(key, ()):
+            paragraph = document.add_paragraph(item["text"], style="List Bullet")
+            suffix = _page_suffix(item)
+            if suffix:
+                paragraph.add_run(suffix).italic = True
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def structured_result(result: Dict[str, Any]) -> Dict[str, List[Dict[str, Any]]]:
+    """A job result's requirements in schema form, parsing markdown results on demand."""
+    if result.get("structured") is not None:
+        return result["structured"]
+    return from_markdown(result["requirements"])
+
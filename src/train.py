@@ -1,104 +1,300 @@
 import os
+import sys
+import json
+import argparse
+import dataclasses
 import torch
+from torch.utils.data import DataLoader
 from transformers import (
     Qwen2VLForConditionalGeneration,
     AutoProcessor,
     TrainingArguments,
     Trainer,
-    DataCollatorForLanguageModeling
+    default_data_collator
 )
+from transformers.trainer_utils import get_last_checkpoint
 from peft import LoraConfig, get_peft_model
-from datasets import load_dataset
 import logging
 from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.data.builder import DatasetBuilder
+from src.data.packing import DynamicPaddingCollator, LengthBucketBatchSampler, PackedCollator
+from src.data.processor import RequirementsProcessor
+from src.spin.trainer import SPINTrainer, last_spin_checkpoint
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONFIG = "configs/training_config.json"
+TRAINERS = ("sft", "spin")
+
+
+def load_config(path: str, overrides: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Read the training config and apply ``section.key=value`` overrides
+    (values are parsed as JSON when possible, e.g. ``training.bf16=true``).
+    """
+    with open(path) as f:
+        config = json.load(f)
+    for override in overrides or []:
+        key, _, raw = override.partition("=")
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+        section = config
+        *parents, leaf = key.split(".")
+        for parent in parents:
+            section = section.setdefault(parent, {})
+        section[leaf] = value
+    return config
+
+
+def resolve_precision(precision: str) -> Dict[str, bool]:
+    """Map ``auto``/``bf16``/``fp16``/``fp32`` to TrainingArguments flags."""
+    if precision == "auto":
+        if torch.cuda.is_available() and torch.cuda.is_bf16_supported():
+            precision = "bf16"
+        elif torch.cuda.is_available():
+            precision = "fp16"
+        else:
+            precision = "fp32"
+    if precision not in ("bf16", "fp16", "fp32"):
+        raise ValueError(f"Unknown precision {precision!r}")
+    return {"bf16": precision == "bf16", "fp16": precision == "fp16"}
+
+
+def build_training_arguments(config: Dict[str, Any]) -> TrainingArguments:
+    """
+    ``TrainingArguments`` from the ``training`` section. Keys are passed
+    straight through, so any TrainingArguments field can be swept from the
+    config; unknown keys are an error rather than silently ignored.
+    """
+    training = dict(config["training"])
+    fields = {field.name for field in dataclasses.fields(TrainingArguments)}
+    # Renamed in newer transformers releases
+    if "evaluation_strategy" in training and "evaluation_strategy" not in fields:
+        training["eval_strategy"] = training.pop("evaluation_strategy")
+    for key in ("trainer", "precision"):
+        training.pop(key, None)
+    unknown = sorted(set(training) - fields)
+    if unknown:
+        raise ValueError(f"Unknown training config keys: {', '.join(unknown)}")
+
+    if "fp16" not in training and "bf16" not in training:
+        training.update(resolve_precision(config["training"].get("precision", "auto")))
+    training.setdefault("output_dir", config["paths"]["model_output_dir"])
+    training.setdefault("report_to", "none")
+    # Collators consume position_ids/segment_ids and SPIN columns the model's
+    # forward() does not declare
+    training.setdefault("remove_unused_columns", False)
+    if training.get("gradient_checkpointing"):
+        training.setdefault("gradient_checkpointing_kwargs", {"use_reentrant": False})
+    return TrainingArguments(**training)
+
+
+def build_lora_config(config: Dict[str, Any]) -> LoraConfig:
+    return LoraConfig(**config["lora"])
+
+
+def training_dtype(args: TrainingArguments) -> torch.dtype:
+    if args.bf16:
+        return torch.bfloat16
+    if args.fp16:
+        return torch.float16
+    return torch.float32
+
+
+def build_collator(processor: RequirementsProcessor, config: Dict[str, Any], args: TrainingArguments):
+    if processor.packing_mode == "packed":
+        block_diagonal = config["data"].get("block_diagonal", True)
+        # Without the block mask only varlen flash attention keeps packed examples apart
+        if not block_diagonal and config["model"].get("attn_implementation") != "flash_attention_2":
+            raise ValueError(
+                "Packing with data.block_diagonal false needs model.attn_implementation "
+                "'flash_attention_2'; otherwise packed examples attend to each other"
+            )
+        return PackedCollator(block_diagonal=block_diagonal, mask_dtype=training_dtype(args))
+    if processor.packing_mode == "dynamic":
+        return DynamicPaddingCollator(processor.tokenizer.pad_token_id)
+    return default_data_collator
+
+
+class LengthBucketMixin:
+    """
+    Trainer mixin that feeds unpacked, variable-length rows through
+    ``LengthBucketBatchSampler`` so each batch is padded only to lengths
+    close to its own. Falls back to the stock dataloader for distributed
+    runs and for fixed-length rows.
+    """
+
+    bucket_by_length = False
+
+    def get_train_dataloader(self) -> DataLoader:
+        if not self.bucket_by_length or self.args.world_size > 1:
+            return super().get_train_dataloader()
+        dataset = self.train_dataset
+        lengths = [len(ids) for ids in dataset["input_ids"]]
+        sampler = LengthBucketBatchSampler(
+            lengths,
+            self.args.per_device_train_batch_size,
+            seed=self.args.seed,
+            drop_last=self.args.dataloader_drop_last
+        )
+        workers = self.args.dataloader_num_workers
+        return DataLoader(
+            dataset,
+            batch_sampler=sampler,
+            collate_fn=self.data_collator,
+            num_workers=workers,
+            pin_memory=self.args.dataloader_pin_memory,
+            persistent_workers=workers > 0
+        )
+
+
+class BucketedTrainer(LengthBucketMixin, Trainer):
+    pass
+
+
+class BucketedSPINTrainer(LengthBucketMixin, SPINTrainer):
+    pass
+
+
+def check_model_cache(cache_dir: Path, model_name: str) -> None:
+    """
+    Fail when the cache holds a different model than ``model.name``
+    (download_model.py records the name in ``model_info.json``).
+    """
+    info_path = cache_dir / "model_info.json"
+    if not info_path.exists():
+        logger.warning(f"{info_path} not found; cannot check that the cache holds {model_name}")
+        return
+    with open(info_path) as f:
+        cached_name = json.load(f).get("name")
+    if cached_name != model_name:
+        raise ValueError(
+            f"model.name is {model_name!r} but {cache_dir} holds {cached_name!r}; "
+            f"run python src/download_model.py --model {model_name}"
+        )
+
+
+def load_model(config: Dict[str, Any], args: TrainingArguments, cache_dir: Path):
+    model_kwargs = {}
+    if config["model"].get("attn_implementation"):
+        model_kwargs["attn_implementation"] = config["model"]["attn_implementation"]
+    model = Qwen2VLForConditionalGeneration.from_pretrained(
+        cache_dir,
+        torch_dtype=training_dtype(args),
+        device_map="auto",
+        **model_kwargs
+    )
+    if args.gradient_checkpointing:
+        # LoRA freezes the embeddings; checkpointed blocks still need inputs
+        # that require grad for the adapters to receive gradients
+        model.enable_input_require_grads()
+        model.config.use_cache = False
+    model = get_peft_model(model, build_lora_config(config))
+    model.print_trainable_parameters()
+    return model
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Fine-tune the requirements extractor")
+    parser.add_argument("--config", default=DEFAULT_CONFIG)
+    parser.add_argument(
+        "--set", dest="overrides", action="append", default=[],
+        metavar="SECTION.KEY=VALUE", help="Override a config value (repeatable)"
+    )
+    parser.add_argument("--trainer", choices=TRAINERS, help="Overrides training.trainer")
+    parser.add_argument(
+        "--resume", nargs="?", const="auto", default=None,
+        help="Resume from a checkpoint path, or the latest one in the output dir"
+    )
+    cli = parser.parse_args()
+
+    config = load_config(cli.config, cli.overrides)
+    trainer_type = cli.trainer or config["training"].get("trainer", "sft")
+    if trainer_type not in TRAINERS:
+        raise ValueError(f"training.trainer must be one of {TRAINERS}")
+
     # 1. Load model and processor from cache
-    cache_dir = Path("models/cache")
+    cache_dir = Path(config["paths"].get("model_cache_dir", "models/cache"))
     if not cache_dir.exists():
         logger.error("Model cache not found. Please run download_model.py first.")
         return
-    
+    check_model_cache(cache_dir, config["model"]["name"])
+
+    training_args = build_training_arguments(config)
     logger.info("Loading model and processor from cache")
-    
-    model = Qwen2VLForConditionalGeneration.from_pretrained(
-        cache_dir,
-        torch_dtype=torch.float16,
-        device_map="auto"
-    )
-    
     processor = AutoProcessor.from_pretrained(cache_dir)
-    
-    # 2. Setup LoRA for efficient fine-tuning
-    lora_config = LoraConfig(
-        r=8,
-        lora_alpha=16,
-        target_modules=["q_proj", "k_proj", "v_proj", "o_proj"],
-        lora_dropout=0.05,
-        bias="none",
-        task_type="CAUSAL_LM"
-    )
-    
-    model = get_peft_model(model, lora_config)
-    model.print_trainable_parameters()
-    
-    # 3. Load and prepare dataset
-    dataset = load_dataset("text", data_files={"train": "data/raw/*.txt"})
-    
-    def tokenize_function(examples):
-        # Process text with the processor
-        processed = processor(
-            text=examples["text"],
-            padding="max_length",
-            truncation=True,
-            max_length=512,
-            return_tensors="pt"
-        )
-        return processed
-    
-    tokenized_dataset = dataset.map(
-        tokenize_function,
-        batched=True,
-        remove_columns=dataset["train"].column_names
-    )
-    
-    # 4. Setup training arguments
-    training_args = TrainingArguments(
-        output_dir="./results",
-        num_train_epochs=2,
-        per_device_train_batch_size=4,
-        gradient_accumulation_steps=4,
-        learning_rate=1e-4,
-        fp16=True,
-        logging_steps=10,
-        save_steps=50,
-        save_total_limit=2,
-        remove_unused_columns=False,
-        optim="adamw_torch",
-        report_to="none"  # Disable wandb logging
+    tokenizer = processor.tokenizer
+    if tokenizer.pad_token_id is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = load_model(config, training_args, cache_dir)
+
+    # 2. Build (or reuse) the tokenised splits
+    packing_mode = config["data"].get("packing_mode", "max_length")
+    if trainer_type == "spin" and packing_mode == "packed":
+        raise ValueError("SPIN needs one example per row; use packing_mode 'dynamic'")
+    data_processor = RequirementsProcessor(
+        tokenizer,
+        max_length=config["model"]["max_length"],
+        max_prompt_length=config["model"]["max_prompt_length"],
+        packing_mode=packing_mode
     )
-    
-    # 5. Initialize trainer
-    trainer = Trainer(
+    builder = DatasetBuilder.from_config(data_processor, config)
+    report = builder.build(config["data"]["input_dir"])
+    if report.failed:
+        logger.warning(f"{report.failed} documents failed to process and are excluded")
+    train_dataset = builder.load_split("train")
+    eval_dataset = builder.load_split("validation") if report.rows.get("validation") else None
+    if eval_dataset is None and training_args.load_best_model_at_end:
+        raise ValueError("load_best_model_at_end needs a non-empty validation split")
+
+    # 3. Trainer
+    trainer_kwargs = dict(
         model=model,
         args=training_args,
-        train_dataset=tokenized_dataset["train"],
-        data_collator=DataCollatorForLanguageModeling(
-            tokenizer=processor.tokenizer,
-            mlm=False
-        )
+        train_dataset=train_dataset,
+        eval_dataset=eval_dataset,
+        data_collator=build_collator(data_processor, config, training_args),
+        tokenizer=tokenizer
     )
-    
-    # 6. Train the model
-    logger.info("Starting training...")
-    trainer.train()
-    
-    # 7. Save the model
-    trainer.save_model("./final_model")
-    logger.info("Training completed and model saved.")
+    if trainer_type == "spin":
+        spin = config.get("spin", {})
+        trainer = BucketedSPINTrainer(
+            beta=spin.get("beta", 0.1),
+            num_iterations=spin.get("num_iterations"),
+            generation_batch_size=spin.get("generation_batch_size", 16),
+            max_new_tokens=spin.get("max_new_tokens", 512),
+            reference_batch_size=spin.get("reference_batch_size", 8),
+            **trainer_kwargs
+        )
+    else:
+        trainer = BucketedTrainer(**trainer_kwargs)
+    trainer.bucket_by_length = packing_mode == "dynamic" and config["data"].get("bucket_by_length", True)
+
+    resume = cli.resume
+    if resume == "auto" and trainer_type == "spin":
+        # SPIN keeps each iteration's checkpoints in their own directory
+        resume = last_spin_checkpoint(training_args.output_dir)
+    elif resume == "auto":
+        resume = get_last_checkpoint(training_args.output_dir) if os.path.isdir(training_args.output_dir) else None
+    if cli.resume == "auto" and resume is None:
+        logger.info("No checkpoint to resume from; starting fresh")
+
+    # 4. Train the model
+    logger.info(f"Starting {trainer_type} training...")
+    trainer.train(resume_from_checkpoint=resume)
+
+    # 5. Save the model where serving loads it from (MODEL_PATH, default final_model)
+    final_dir = Path(config["paths"].get("final_model_dir", "final_model"))
+    trainer.save_model(str(final_dir))
+    logger.info(f"Training completed and model saved to {final_dir}.")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,48 @@
+"""
+Shared fixtures. Everything here runs on CPU without model weights; tests
+that need torch or transformers skip when they are not installed.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).parent.parent
+if str(project_root) not in sys.path:
+    sys.path.append(str(project_root))
+
+
+class WordTokenizer:
+    """
+    Whitespace tokenizer with the call/decode interface the chunker and
+    prompt helpers use: one token per word.
+    """
+
+    pad_token_id = 0
+    eos_token_id = 1
+
+    def __call__(self, texts, add_special_tokens=True, **kwargs):
+        if isinstance(texts, str):
+            return {"input_ids": texts.split()}
+        return {"input_ids": [text.split() for text in texts]}
+
+    def decode(self, ids, **kwargs):
+        return " ".join(ids)
+
+
+@pytest.fixture
+def tokenizer():
+    return WordTokenizer()
+
+
+@pytest.fixture
+def metrics_registry():
+    """The process-wide metrics, enabled and emptied for the test."""
+    from src.serving.metrics import metrics
+
+    enabled = metrics.enabled
+    metrics.enabled = True
+    metrics.clear()
+    yield metrics
+    metrics.clear()
+    metrics.enabled = enabled
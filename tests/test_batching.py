@@ -0,0 +1,86 @@
+import threading
+
+from src.serving.batching import MicroBatcher
+
+
+def test_concurrent_submissions_share_a_batch():
+    calls = []
+
+    def batch_fn(items, should_stop=None):
+        calls.append(list(items))
+        return [item.upper() for item in items]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(text) for text in ["a", "b", "c"]]
+        assert [future.result(5) for future in futures] == ["A", "B", "C"]
+    finally:
+        batcher.close()
+    assert calls == [["a", "b", "c"]]
+    assert batcher.stats()["mean_batch_size"] == 3
+
+
+def test_batches_are_capped_at_max_batch_size():
+    sizes = []
+
+    def batch_fn(items, should_stop=None):
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=200)
+    try:
+        futures = [batcher.submit(i) for i in range(5)]
+        assert [future.result(5) for future in futures] == list(range(5))
+    finally:
+        batcher.close()
+    assert sizes == [2, 2, 1]
+
+
+def test_stopped_items_never_reach_the_model():
+    seen = []
+
+    def batch_fn(items, should_stop=None):
+        seen.extend(items)
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=4, max_wait_ms=100)
+    try:
+        skipped = batcher.submit("skipped", should_stop=lambda: True)
+        kept = batcher.submit("kept", should_stop=lambda: False)
+        assert skipped.result(5) is None
+        assert kept.result(5) == "kept"
+    finally:
+        batcher.close()
+    assert seen == ["kept"]
+
+
+def test_a_shared_batch_stops_only_when_every_caller_gave_up():
+    first_gave_up = threading.Event()
+    stopped = []
+
+    def batch_fn(items, should_stop=None):
+        first_gave_up.set()
+        stopped.append(should_stop())
+        return items
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=200)
+    try:
+        first = batcher.submit("a", should_stop=first_gave_up.is_set)
+        second = batcher.submit("b", should_stop=lambda: False)
+        assert [first.result(5), second.result(5)] == ["a", "b"]
+    finally:
+        batcher.close()
+    assert stopped == [False]
+
+
+def test_batch_errors_reach_every_caller():
+    def batch_fn(items, should_stop=None):
+        raise RuntimeError("out of memory")
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=2, max_wait_ms=100)
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            assert isinstance(future.exception(5), RuntimeError)
+    finally:
+        batcher.close()
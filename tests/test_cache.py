@@ -0,0 +1,72 @@
+import io
+import time
+
+from src.serving.cache import REQUIREMENTS, ResultCache, params_key, sha256_file, sha256_stream
+
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ResultCache(memory_items=2)
+    cache.put(REQUIREMENTS, "a", 1)
+    cache.put(REQUIREMENTS, "b", 2)
+    cache.get(REQUIREMENTS, "a")
+    cache.put(REQUIREMENTS, "c", 3)
+    assert cache.get(REQUIREMENTS, "b") is None
+    assert cache.get(REQUIREMENTS, "a") == 1
+    assert cache.get(REQUIREMENTS, "c") == 3
+
+
+def test_memory_tier_respects_its_byte_budget():
+    cache = ResultCache(memory_bytes=20)
+    cache.put(REQUIREMENTS, "small", "x")
+    cache.put(REQUIREMENTS, "large", "y" * 100)
+    assert cache.get(REQUIREMENTS, "large") is None
+    assert cache.stats()["memory_bytes"] <= 20
+
+
+def test_results_cannot_be_mutated_through_the_cache():
+    cache = ResultCache()
+    cache.put(REQUIREMENTS, "a", {"items": [1]})
+    cache.get(REQUIREMENTS, "a")["items"].append(2)
+    assert cache.get(REQUIREMENTS, "a") == {"items": [1]}
+
+
+def test_expired_entries_are_missing(tmp_path, monkeypatch):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite"), ttl_seconds=60)
+    cache.put(REQUIREMENTS, "a", 1)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get(REQUIREMENTS, "a") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_disk_tier_survives_restarts_and_counts_hits(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    ResultCache(path=path).put(REQUIREMENTS, "a", {"requirements": "x"})
+    cache = ResultCache(path=path)
+    assert cache.get(REQUIREMENTS, "a") == {"requirements": "x"}
+    assert cache.get(REQUIREMENTS, "a") == {"requirements": "x"}
+    counts = cache.stats()["namespaces"][REQUIREMENTS]
+    assert (counts["disk_hits"], counts["memory_hits"]) == (1, 1)
+
+
+def test_disk_tier_evicts_least_recently_used_over_budget(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite"), memory_items=1, disk_bytes=250)
+    for key in "abc":
+        cache.put(REQUIREMENTS, key, "x" * 100)
+        time.sleep(0.01)
+    assert cache.stats()["disk_entries"] == 2
+    assert cache.get(REQUIREMENTS, "a") is None
+
+
+def test_params_key_is_order_independent_for_dicts():
+    assert params_key({"a": 1, "b": 2}) == params_key({"b": 2, "a": 1})
+    assert params_key("x", 1) != params_key("x", 2)
+
+
+def test_streams_hash_like_files_and_are_rewound(tmp_path):
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(b"%PDF" * 1000)
+    stream = io.BytesIO(path.read_bytes())
+    stream.seek(10)
+    assert sha256_stream(stream, block_size=64) == sha256_file(path)
+    assert stream.tell() == 0
@@ -0,0 +1,87 @@
+import pytest
+
+from src.chunking import PAGE_MARKER, chunk_document, merge_requirements, parse_sections
+
+
+def words(prefix, count):
+    return " ".join(f"{prefix}{i}" for i in range(count))
+
+
+def test_short_document_is_one_chunk(tokenizer):
+    chunks = chunk_document(["Intro paragraph here.", "Second page text."], tokenizer, max_tokens=100, overlap_tokens=10)
+    assert len(chunks) == 1
+    assert (chunks[0].first_page, chunks[0].last_page) == (1, 2)
+    assert chunks[0].new_tokens == chunks[0].tokens == 6
+
+
+def test_chunks_respect_the_token_budget_and_cover_every_token(tokenizer):
+    pages = ["\n\n".join(words(f"p{page}w{block}_", 30) for block in range(4)) for page in range(5)]
+    chunks = chunk_document(pages, tokenizer, max_tokens=100, overlap_tokens=20)
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 100 for chunk in chunks)
+    assert sum(chunk.new_tokens for chunk in chunks) == 5 * 4 * 30
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks)))
+
+
+def test_chunks_overlap_with_the_previous_chunk(tokenizer):
+    pages = ["\n\n".join(words(f"b{block}_", 10) for block in range(12))]
+    chunks = chunk_document(pages, tokenizer, max_tokens=40, overlap_tokens=15)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        last_block = previous.text.split("\n\n")[-1]
+        assert chunk.text.startswith(last_block)
+
+
+def test_oversized_paragraphs_are_split(tokenizer):
+    sentence = words("s", 20) + "."
+    chunks = chunk_document([" ".join([sentence] * 5)], tokenizer, max_tokens=50, overlap_tokens=5)
+    assert len(chunks) > 1
+    assert all(chunk.tokens <= 50 for chunk in chunks)
+
+
+def test_chunks_do_not_end_on_a_heading(tokenizer):
+    body = words("w", 25)
+    page = "\n\n".join([body, body, "## Security", body])
+    chunks = chunk_document([page], tokenizer, max_tokens=60, overlap_tokens=5)
+    assert all(not chunk.text.rstrip().endswith("## Security") for chunk in chunks)
+
+
+def test_page_markers_mark_each_page(tokenizer):
+    chunks = chunk_document(["first page", "second page"], tokenizer, max_tokens=100, overlap_tokens=5, page_markers=True)
+    assert PAGE_MARKER.format(1) in chunks[0].text
+    assert PAGE_MARKER.format(2) in chunks[0].text
+
+
+def test_overlap_must_be_smaller_than_the_budget(tokenizer):
+    with pytest.raises(ValueError):
+        chunk_document(["text"], tokenizer, max_tokens=10, overlap_tokens=10)
+
+
+def test_merge_requirements_keeps_first_seen_order_and_drops_duplicates():
+    first = "# Requirements Document\n## Functional Requirements\n- Users can log in.\n- Users can upload PDF files.\n"
+    second = (
+        "## Functional Requirements\n- users can log in\n- Admins can export reports.\n"
+        "## Non-Functional Requirements\n- Pages load within 2 seconds.\n"
+    )
+    sections = parse_sections(merge_requirements([first, second]))
+    assert sections["Functional Requirements"] == [
+        "- Users can log in.",
+        "- Users can upload PDF files.",
+        "- Admins can export reports.",
+    ]
+    assert sections["Non-Functional Requirements"] == ["- Pages load within 2 seconds."]
+
+
+def test_merge_requirements_drops_reworded_near_duplicates():
+    first = "## Functional Requirements\n- The system shall allow users to upload PDF documents for review by the team.\n"
+    second = "## Functional Requirements\n- The system shall allow users to upload PDF documents for review by the whole team.\n"
+    merged = parse_sections(merge_requirements([first, second]))
+    assert len(merged["Functional Requirements"]) == 1
+    exact_only = parse_sections(merge_requirements([first, second], similarity=None))
+    assert len(exact_only["Functional Requirements"]) == 2
+
+
+def test_merge_requirements_keeps_a_requirement_and_its_negation():
+    allowed = "The system shall encrypt user data at rest and in transit"
+    negated = "The system shall not encrypt user data at rest and in transit"
+    documents = [f"## Non-Functional Requirements\n- {allowed}\n", f"## Non-Functional Requirements\n- {negated}\n"]
+    assert parse_sections(merge_requirements(documents))["Non-Functional Requirements"] == [f"- {allowed}", f"- {negated}"]
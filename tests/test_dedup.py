@@ -0,0 +1,113 @@
+import numpy as np
+
+from src.dedup import (
+    LINE_GUARD_WORDS,
+    MinHasher,
+    SignatureStore,
+    dedupe,
+    find_duplicates,
+    jaccard,
+    text_key,
+)
+
+
+def random_texts(count, words=12, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"w{i}" for i in range(5000)]
+    return [" ".join(rng.choice(vocabulary, size=words)) for _ in range(count)]
+
+
+def test_signatures_ignore_case_and_punctuation():
+    hasher = MinHasher()
+    signatures = hasher.signatures(["Users can log in.", "users CAN log-in", "admins export reports"])
+    assert (signatures[0] == signatures[1]).all()
+    assert not (signatures[0] == signatures[2]).all()
+
+
+def test_signatures_are_stable_across_instances_and_batches():
+    texts = random_texts(20)
+    first = MinHasher(seed=3).signatures(texts)
+    assert (MinHasher(seed=3).signatures(texts) == first).all()
+    assert (MinHasher(seed=3).signatures(texts[5:6]) == first[5:6]).all()
+    assert not (MinHasher(seed=4).signatures(texts) == first).all()
+
+
+def test_empty_texts_get_all_ones_rows():
+    signatures = MinHasher(num_perm=8).signatures(["", "one word"])
+    assert (signatures[0] == np.iinfo(np.uint32).max).all()
+    assert signatures.shape == (2, 8)
+
+
+def test_signature_agreement_estimates_jaccard():
+    hasher = MinHasher(num_perm=256)
+    a = "the system shall export monthly reports for every active customer account"
+    b = "the system shall export monthly reports for every customer account"
+    estimate = (hasher.signatures([a]) == hasher.signatures([b])).mean()
+    assert abs(estimate - jaccard(hasher.shingles(a), hasher.shingles(b))) < 0.1
+
+
+def test_find_duplicates_recalls_near_duplicates_without_false_positives():
+    base = random_texts(300, words=30)
+    # One word changed: word-pair Jaccard of about 0.87
+    near = [text.rsplit(" ", 1)[0] + " changed" for text in base]
+    duplicate_of = find_duplicates(MinHasher().signatures(base + near), threshold=0.7)
+    assert (duplicate_of[:300] == -1).all()
+    found = duplicate_of[300:] == np.arange(300)
+    assert found.mean() >= 0.95
+    assert ((duplicate_of[300:] == -1) | found).all()
+
+
+def test_find_duplicates_compares_each_row_with_its_buckets_first_row():
+    texts = ["users can log in with email"] * 5 + ["admins export reports"]
+    pairs = []
+
+    def verify(i, j):
+        pairs.append((i, j))
+        return True
+
+    duplicate_of = find_duplicates(MinHasher().signatures(texts), 0.7, verify)
+    assert duplicate_of.tolist() == [-1, 0, 0, 0, 0, -1]
+    # Settled rows are not compared again in later bands
+    assert sorted(pairs) == [(1, 0), (2, 0), (3, 0), (4, 0)]
+
+
+def test_dedupe_keeps_the_first_of_each_group():
+    texts = ["Users can log in.", "admins export reports", "users can log in", "Admins export reports!"]
+    assert dedupe(texts) == [0, 1]
+    assert dedupe(texts[:1]) == [0]
+
+
+def test_dedupe_guard_keeps_a_requirement_and_its_negation():
+    allowed = "The system shall encrypt user data at rest and in transit"
+    negated = "The system shall not encrypt user data at rest and in transit"
+    assert dedupe([allowed, negated], exact=True) == [0]
+    assert dedupe([allowed, negated], guard=LINE_GUARD_WORDS) == [0, 1]
+    # Same guard words still merge
+    assert dedupe([allowed, allowed + "."], guard=LINE_GUARD_WORDS) == [0]
+
+
+def test_signature_store_round_trips_and_reuses_signatures(tmp_path):
+    path = tmp_path / "signatures.npz"
+    texts = random_texts(10)
+    store = SignatureStore(path, MinHasher())
+    signatures = store.signatures(texts)
+    assert store.hashed == 10
+    store.save()
+
+    reloaded = SignatureStore(path, MinHasher())
+    assert len(reloaded) == 10
+    assert (reloaded.signatures(texts) == signatures).all()
+    assert reloaded.hashed == 0
+    reloaded.signatures(texts + ["a new text"])
+    assert reloaded.hashed == 1
+
+    reloaded.save(keep=[text_key(text) for text in texts[:3]])
+    assert len(SignatureStore(path, MinHasher())) == 3
+
+
+def test_signature_store_ignores_other_hasher_parameters(tmp_path):
+    path = tmp_path / "signatures.npz"
+    store = SignatureStore(path, MinHasher(num_perm=16))
+    store.signatures(["some text"])
+    store.save()
+    assert len(SignatureStore(path, MinHasher(num_perm=32))) == 0
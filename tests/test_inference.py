@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src import inference
+from src.chunking import Chunk, parse_sections
+from src.inference import PROMPT_MAX_LENGTH, build_prompt, plan_chunks, prompt_overhead_tokens
+from src.serving.batching import MicroBatcher
+from src.structured import JSON_REPLY_START
+
+
+def test_texts_are_generated_through_the_shared_batcher():
+    batches = []
+
+    def batch_fn(texts, should_stop=None):
+        batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+    batcher = MicroBatcher(batch_fn, max_batch_size=8, max_wait_ms=100)
+    try:
+        assert inference.generate_batched(batcher, ["a", "b", "c"]) == ["A", "B", "C"]
+        assert batches == [["a", "b", "c"]]
+        # Texts still queued once the caller gives up are skipped
+        assert inference.generate_batched(batcher, ["d", "e"], should_stop=lambda: True) == []
+        assert len(batches) == 1
+    finally:
+        batcher.close()
+
+
+def test_single_texts_are_chunked_instead_of_truncated(monkeypatch):
+    calls = []
+
+    class Registry:
+        def is_available(self, model_name):
+            return True
+
+    def chunked(pages, **kwargs):
+        calls.append(pages)
+        return {"requirements": "- merged", "coverage": 1.0, "chunks": 3, "chunks_processed": 3}
+
+    monkeypatch.setattr(inference, "generate_requirements_chunked", chunked)
+    text = "word " * (PROMPT_MAX_LENGTH * 2)
+    assert inference.generate_requirements(text, registry=Registry()) == "- merged"
+    assert calls == [[text]]
+
+
+@pytest.mark.parametrize("output_format", ["markdown", "json"])
+def test_prompt_overhead_counts_the_template_tokens(tokenizer, output_format):
+    template_tokens = len(build_prompt("", output_format).split())
+    assert prompt_overhead_tokens(tokenizer, output_format) == template_tokens + 8
+
+
+@pytest.mark.parametrize("enabled", [True, False])
+def test_plan_chunks_fits_prompts_whether_or_not_metrics_are_enabled(tokenizer, metrics_registry, enabled):
+    metrics_registry.enabled = enabled
+    pages = [" ".join(f"p{page}w{i}" for i in range(400)) for page in range(4)]
+    chunks, input_tokens = plan_chunks(tokenizer, pages)
+    assert input_tokens == 1600
+    overhead = prompt_overhead_tokens(tokenizer)
+    assert all(chunk.tokens + overhead <= PROMPT_MAX_LENGTH for chunk in chunks)
+
+
+def test_decode_timer_records_tokens_in_and_out(metrics_registry):
+    import torch
+
+    timer = inference.DecodeTimer()
+    timer(None, None)
+    outputs = torch.tensor([[5, 6, 7, 8, 0]])
+    timer.observe(torch.ones(1, 2, dtype=torch.long), outputs, prompt_length=2, pad_token_id=0)
+    rendered = metrics_registry.render()
+    assert 'docs_extractor_tokens_total{direction="in"} 2' in rendered
+    assert 'docs_extractor_tokens_total{direction="out"} 2' in rendered
+
+
+class Replies(list):
+    """Stands in for the streamer: the markers and text a stream reads."""
+
+    first_token_at = None
+    generated_tokens = 0
+
+
+def read_events(stream):
+    from backend.main import stream_events
+
+    return [
+        (raw.split("\n")[0][len("event: "):], json.loads(raw.split("\n")[1][len("data: "):]))
+        for raw in stream_events(stream)
+    ]
+
+
+def test_long_documents_stream_chunk_by_chunk_and_merge():
+    chunks = [Chunk(0, "first", 1, 1, 10, 10), Chunk(1, "second", 2, 3, 10, 8)]
+    replies = [
+        chunks[0], "## Functional Requirements\n", "- Users can log in\n",
+        chunks[1], "## Functional Requirements\n- Users can log in\n- Admins export reports\n",
+    ]
+    stream = inference.RequirementsStream(Replies(replies), 0.0, 40, "fast", chunks=chunks, input_tokens=18)
+    stream.chunks_processed = 2
+    events = read_events(stream)
+    assert [payload["index"] for name, payload in events if name == "chunk"] == [0, 1]
+    tokens = "".join(payload["text"] for name, payload in events if name == "token")
+    assert tokens.count("- Users can log in") == 2
+    merged = parse_sections(dict(events)["result"]["requirements"])
+    assert merged["Functional Requirements"] == ["- Users can log in", "- Admins export reports"]
+    assert dict(events)["metrics"]["coverage"] == 1.0
+
+
+def test_json_replies_stream_items_per_chunk_and_merge():
+    chunks = [Chunk(0, "first", 1, 1, 10, 10), Chunk(1, "second", 2, 3, 10, 8)]
+    replies = [
+        chunks[0], '{"text": "Users can log in"}', "]}",
+        chunks[1], '{"text": "Users can log in"}, ', '{"text": "Admins export reports", "page": 3}', "]}",
+    ]
+    stream = inference.RequirementsStream(Replies(replies), 0.0, 40, "fast", "json", chunks, input_tokens=18)
+    stream.chunks_processed = 2
+    events = read_events(stream)
+    assert [name for name, _ in events].count("chunk") == 2
+    assert [payload["text"] for name, payload in events if name == "token"].count(JSON_REPLY_START) == 2
+    # A chunk on one page supplies the page of items that do not cite one
+    assert [payload["item"]["page"] for name, payload in events if name == "item"] == [1, None, 3]
+    assert dict(events)["result"]["structured"]["functional"] == [
+        {"text": "Users can log in", "page": 1},
+        {"text": "Admins export reports", "page": 3},
+    ]
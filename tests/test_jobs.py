@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+from src.serving.jobs import JobManager, JobStatus, QueueFullError
+
+
+def wait_for(job, timeout=5.0):
+    return job.completion.result(timeout)
+
+
+@pytest.fixture
+def manager():
+    managers = []
+
+    def make(**kwargs):
+        kwargs.setdefault("poll_interval", 0.02)
+        jobs = JobManager(**kwargs)
+        managers.append(jobs)
+        return jobs
+
+    yield make
+    for jobs in managers:
+        jobs.shutdown()
+
+
+def test_job_result_is_recorded(manager):
+    jobs = manager()
+    job = jobs.submit(lambda a, b: a + b, 2, 3)
+    assert wait_for(job).status == JobStatus.SUCCEEDED
+    assert job.to_dict()["result"] == 5
+
+
+def test_failures_are_reported(manager):
+    jobs = manager()
+
+    def fail():
+        raise ValueError("bad page")
+
+    job = jobs.submit(fail)
+    assert wait_for(job).status == JobStatus.FAILED
+    assert job.error == "bad page"
+
+
+def test_full_queue_rejects_new_jobs(manager):
+    jobs = manager(max_workers=1, max_queue=1)
+    release = threading.Event()
+    running = jobs.submit(release.wait, 5)
+    queued = jobs.submit(release.wait, 5)
+    with pytest.raises(QueueFullError):
+        jobs.submit(release.wait, 5)
+    release.set()
+    wait_for(running)
+    wait_for(queued)
+    # Capacity is back once the work has finished
+    wait_for(jobs.submit(lambda: None))
+
+
+def test_running_job_times_out_and_is_asked_to_stop(manager):
+    jobs = manager(timeout=0.1)
+    stopped = threading.Event()
+
+    def work(should_stop):
+        while not should_stop():
+            time.sleep(0.01)
+        stopped.set()
+
+    job = jobs.submit(work, cooperative=True)
+    assert wait_for(job).status == JobStatus.TIMED_OUT
+    assert stopped.wait(5)
+
+
+def test_cancel_queued_and_running_jobs(manager):
+    jobs = manager(max_workers=1, max_queue=2)
+    stopped = threading.Event()
+
+    def work(should_stop):
+        while not should_stop():
+            time.sleep(0.01)
+        stopped.set()
+
+    running = jobs.submit(work, cooperative=True)
+    queued = jobs.submit(lambda: "never")
+    while running.status != JobStatus.RUNNING:
+        time.sleep(0.01)
+    assert jobs.cancel(queued.id)
+    assert jobs.cancel(running.id)
+    assert queued.status == running.status == JobStatus.CANCELLED
+    assert stopped.wait(5)
+    assert not jobs.cancel(running.id)
+
+
+def test_on_done_runs_after_the_work_finishes(manager):
+    jobs = manager(timeout=0.05)
+    order = []
+
+    def work():
+        time.sleep(0.2)
+        order.append("work")
+
+    job = jobs.submit(work, on_done=lambda: order.append("cleanup"))
+    assert wait_for(job).status == JobStatus.TIMED_OUT
+    deadline = time.time() + 5
+    while len(order) < 2 and time.time() < deadline:
+        time.sleep(0.01)
+    assert order == ["work", "cleanup"]
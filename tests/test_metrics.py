@@ -0,0 +1,84 @@
+import logging
+
+from src.serving.metrics import (
+    MetricsRegistry,
+    RequestIdFilter,
+    count_tokens,
+    observe_stage,
+    request_id_var,
+)
+
+
+def test_counter_and_histogram_exposition():
+    registry = MetricsRegistry(namespace="test")
+    registry.counter("tokens", "Tokens", ["direction"]).inc(5, direction="in")
+    histogram = registry.histogram("stage_seconds", "Stages", ["stage"], buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="decode")
+    histogram.observe(0.5, stage="decode")
+    lines = registry.render().splitlines()
+    assert "# TYPE test_tokens counter" in lines
+    assert 'test_tokens_total{direction="in"} 5' in lines
+    assert 'test_stage_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+    assert 'test_stage_seconds_bucket{stage="decode",le="1.0"} 2' in lines
+    assert 'test_stage_seconds_bucket{stage="decode",le="+Inf"} 2' in lines
+    assert 'test_stage_seconds_sum{stage="decode"} 0.55' in lines
+    assert 'test_stage_seconds_count{stage="decode"} 2' in lines
+
+
+def test_collectors_are_called_at_scrape_time_and_failures_are_skipped():
+    registry = MetricsRegistry(namespace="test")
+    pending = [3]
+    registry.register_collector("jobs_pending", "gauge", "Pending jobs", lambda: [({}, pending[0])])
+    registry.register_collector("broken", "gauge", "Fails", lambda: 1 / 0)
+    assert "test_jobs_pending 3" in registry.render()
+    pending[0] = 1
+    rendered = registry.render()
+    assert "test_jobs_pending 1" in rendered
+    assert "broken" not in rendered
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry(namespace="test")
+    registry.counter("errors", "Errors", ["message"]).inc(message='bad "quote"\n')
+    assert 'test_errors_total{message="bad \\"quote\\"\\n"} 1' in registry.render()
+
+
+def test_disabled_registry_renders_nothing(metrics_registry):
+    metrics_registry.enabled = False
+    observe_stage("decode", 1.0)
+    count_tokens("in", 10)
+    assert metrics_registry.render() == ""
+
+
+def test_module_helpers_update_the_process_metrics(metrics_registry):
+    observe_stage("decode", 0.2)
+    count_tokens("out", 7)
+    count_tokens("out", 0)
+    rendered = metrics_registry.render()
+    assert 'docs_extractor_stage_seconds_count{stage="decode"} 1' in rendered
+    assert 'docs_extractor_tokens_total{direction="out"} 7' in rendered
+
+
+def test_request_id_filter_tags_records():
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, "message", None, None)
+    token = request_id_var.set("abc123")
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    assert record.request_id == "abc123"
+
+
+def test_metrics_endpoint_serves_the_exposition(metrics_registry):
+    from fastapi.testclient import TestClient
+
+    from backend.main import app
+
+    observe_stage("pdf_parse", 0.01)
+    # No context manager: the startup event (model load) is not run
+    client = TestClient(app)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'docs_extractor_stage_seconds_count{stage="pdf_parse"} 1' in response.text
+    assert "docs_extractor_ready 0" in response.text
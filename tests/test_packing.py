@@ -0,0 +1,36 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from src.data.packing import IGNORE_INDEX, PackedCollator, build_example, pack_examples
+
+
+def packed_batch(**kwargs):
+    examples = [build_example([5, 6], [7], eos_token_id=2, max_length=8), build_example([8], [9, 10], eos_token_id=2, max_length=8)]
+    rows = pack_examples(examples, max_length=8, pad_token_id=0)
+    assert len(rows) == 1
+    return rows, PackedCollator(**kwargs)(rows)
+
+
+def test_packed_examples_cannot_attend_across_boundaries_by_default():
+    rows, batch = packed_batch()
+    mask = batch["attention_mask"]
+    assert mask.shape == (1, 1, 8, 8)
+    segments = rows[0]["segment_ids"]
+    allowed = mask[0, 0] == 0
+    for query, query_segment in enumerate(segments):
+        for key, key_segment in enumerate(segments):
+            if query_segment and key_segment and query_segment != key_segment:
+                assert not allowed[query, key]
+    assert batch["labels"][0, segments.index(2)] == IGNORE_INDEX
+
+
+def test_mask_uses_the_training_dtype():
+    _, batch = packed_batch(mask_dtype=torch.bfloat16)
+    assert batch["attention_mask"].dtype == torch.bfloat16
+
+
+def test_varlen_mode_leaves_boundaries_to_position_ids():
+    rows, batch = packed_batch(block_diagonal=False)
+    assert "attention_mask" not in batch
+    assert batch["position_ids"][0].tolist() == rows[0]["position_ids"]
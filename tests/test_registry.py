@@ -0,0 +1,134 @@
+import threading
+
+import pytest
+
+from src.serving.registry import ModelRegistry, ModelSpec
+
+
+class FakeTensor:
+    def __init__(self, numel):
+        self._numel = numel
+
+    def numel(self):
+        return self._numel
+
+    def element_size(self):
+        return 1
+
+
+class FakeModel:
+    """Reports ``size`` bytes of parameters, like a model of that size."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def parameters(self):
+        return [FakeTensor(self.size)]
+
+    def buffers(self):
+        return []
+
+
+def make_registry(sizes, **kwargs):
+    loaded = []
+
+    def loader(spec):
+        loaded.append(spec.name)
+        return FakeModel(sizes[spec.name]), object()
+
+    registry = ModelRegistry(loader=loader, **kwargs)
+    for name in sizes:
+        registry.register(ModelSpec(name=name, path=name))
+    return registry, loaded
+
+
+def test_models_load_once_and_are_shared():
+    registry, loaded = make_registry({"a": 10})
+    first = registry.get("a")
+    assert registry.get("a") is first
+    assert loaded == ["a"]
+    assert first.hits == 1
+
+
+def test_least_recently_used_model_is_evicted_over_max_models():
+    registry, loaded = make_registry({"a": 10, "b": 10, "c": 10}, max_models=2)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert registry.stats()["resident"] == ["a", "c"]
+    assert registry.evictions == 1
+    registry.get("b")
+    assert loaded == ["a", "b", "c", "b"]
+
+
+def test_memory_budget_evicts_but_keeps_the_requested_model():
+    registry, _ = make_registry({"a": 60, "b": 60, "big": 500}, memory_budget_bytes=100)
+    registry.get("a")
+    registry.get("b")
+    assert registry.stats()["resident"] == ["b"]
+    # Larger than the whole budget on its own, but still served
+    registry.get("big")
+    assert registry.stats()["resident"] == ["big"]
+    assert registry.resident_bytes() == 500
+
+
+def test_concurrent_gets_load_a_model_once():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow_loader(spec):
+        calls.append(spec.name)
+        started.set()
+        release.wait(5)
+        return FakeModel(1), object()
+
+    registry = ModelRegistry(loader=slow_loader)
+    registry.register(ModelSpec(name="a", path="a"))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == ["a"]
+    assert len({id(entry) for entry in results}) == 1
+
+
+def test_reregistering_a_changed_spec_unloads_it():
+    registry, loaded = make_registry({"a": 10})
+    registry.get("a")
+    registry.register(ModelSpec(name="a", path="elsewhere"))
+    assert registry.stats()["resident"] == []
+
+
+def test_unknown_model_raises_and_missing_checkpoint_skips_preload(tmp_path):
+    registry, _ = make_registry({})
+    with pytest.raises(KeyError):
+        registry.get("missing")
+    registry.register(ModelSpec(name="absent", path=str(tmp_path / "absent")))
+    assert registry.preload("absent") is None
+
+
+def test_revision_changes_when_the_checkpoint_is_retrained_in_place(tmp_path):
+    checkpoint = tmp_path / "final_model"
+    checkpoint.mkdir()
+    weights = checkpoint / "adapter_model.safetensors"
+    weights.write_bytes(b"v1")
+    registry = ModelRegistry(loader=lambda spec: (FakeModel(1), object()))
+    registry.register(ModelSpec(name="default", path=str(checkpoint)))
+    before = registry.get("default").revision
+    assert before.startswith(str(checkpoint) + "@")
+
+    weights.write_bytes(b"retrained")
+    registry.unload("default")
+    assert registry.get("default").revision != before
+
+
+def test_explicit_revision_wins(tmp_path):
+    registry = ModelRegistry(loader=lambda spec: (FakeModel(1), object()))
+    registry.register(ModelSpec(name="default", path=str(tmp_path), revision="v7"))
+    assert registry.get("default").revision == "v7"
@@ -0,0 +1,90 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+datasets = pytest.importorskip("datasets")
+
+from src.data.packing import IGNORE_INDEX
+from src.spin.generation import SYNTHETIC_INPUT_IDS, generate_synthetic_dataset, model_revision
+from src.spin.reference import ReferenceLogprobs
+
+
+class EchoModel(torch.nn.Module):
+    """Answers every prompt with one token and counts its generate calls."""
+
+    def __init__(self):
+        super().__init__()
+        self.weight = torch.nn.Parameter(torch.zeros(2))
+        self.calls = 0
+
+    def generate(self, input_ids, attention_mask, max_new_tokens, pad_token_id, eos_token_id, **kwargs):
+        self.calls += 1
+        answer = torch.tensor([[7, eos_token_id]] * len(input_ids))
+        return torch.cat([input_ids, answer], dim=1)
+
+
+def make_dataset(prompts):
+    rows = {"input_ids": [], "labels": []}
+    for prompt in prompts:
+        rows["input_ids"].append(prompt + [5])
+        rows["labels"].append([IGNORE_INDEX] * len(prompt) + [5])
+    return datasets.Dataset.from_dict(rows)
+
+
+def test_synthetic_samples_are_reused_only_for_the_same_data_and_model(tokenizer, tmp_path):
+    model = EchoModel()
+    dataset = make_dataset([[2, 3], [4]])
+    synthetic, metrics = generate_synthetic_dataset(model, tokenizer, dataset, 1, tmp_path, batch_size=1)
+    assert synthetic[SYNTHETIC_INPUT_IDS] == [[2, 3, 7, 1], [4, 7, 1]]
+    assert metrics and model.calls == 2
+
+    reused, metrics = generate_synthetic_dataset(model, tokenizer, dataset, 1, tmp_path, batch_size=1)
+    assert metrics == {} and model.calls == 2
+    assert reused[SYNTHETIC_INPUT_IDS] == synthetic[SYNTHETIC_INPUT_IDS]
+
+    # Same number of rows, different prompts
+    generate_synthetic_dataset(model, tokenizer, make_dataset([[2, 3], [6]]), 1, tmp_path, batch_size=1)
+    assert model.calls == 4
+
+    # Same data, retrained weights
+    with torch.no_grad():
+        model.weight.add_(1)
+    generate_synthetic_dataset(model, tokenizer, make_dataset([[2, 3], [6]]), 1, tmp_path, batch_size=1)
+    assert model.calls == 6
+
+
+def test_model_revision_tracks_trainable_weights():
+    model = EchoModel()
+    before = model_revision(model)
+    assert model_revision(model) == before
+    with torch.no_grad():
+        model.weight.add_(1)
+    assert model_revision(model) != before
+
+
+def test_reference_logprobs_are_reused_only_for_the_same_inputs(tmp_path):
+    path = tmp_path / "iteration-001.f32"
+    info = {"rows": 3, "iteration": 1, "revision": "base@abc", "dataset": "d1", "max_length": 64}
+    reference = ReferenceLogprobs(path, 3, mode="w+")
+    assert ReferenceLogprobs.open(path, info) is None
+    reference.values[:] = 1.0
+    reference.mark_complete(info)
+
+    assert ReferenceLogprobs.open(path, info).values.sum() == 6.0
+    for key, value in [("revision", "base@def"), ("dataset", "d2"), ("max_length", 128), ("rows", 4)]:
+        assert ReferenceLogprobs.open(path, {**info, key: value}) is None
+
+
+def test_resume_picks_the_latest_iteration_and_reads_its_index(tmp_path):
+    pytest.importorskip("peft")
+    from src.spin.trainer import SPIN_STATE, checkpoint_iteration, iteration_dir, last_spin_checkpoint
+
+    assert last_spin_checkpoint(tmp_path) is None
+    # Step counts restart every iteration, so iteration 1 has the lower step
+    for iteration, step in [(0, 500), (1, 100)]:
+        checkpoint = iteration_dir(tmp_path, iteration) / f"checkpoint-{step}"
+        checkpoint.mkdir(parents=True)
+        (checkpoint / SPIN_STATE).write_text(f'{{"iteration": {iteration}}}')
+    checkpoint = last_spin_checkpoint(tmp_path)
+    assert checkpoint == str(iteration_dir(tmp_path, 1) / "checkpoint-100")
+    assert checkpoint_iteration(checkpoint) == 1
+    assert checkpoint_iteration(tmp_path) == 0
@@ -0,0 +1,79 @@
+import pytest
+
+from src.serving import registry as registry_module
+from src.serving import startup as startup_module
+from src.serving.registry import ModelRegistry, ModelSpec
+from src.serving.startup import FAILED, READY, Startup, import_totals, parse_importtime
+
+
+@pytest.fixture
+def fake_registry(monkeypatch, tmp_path):
+    """A registry whose default model loads instantly; heavy imports are skipped."""
+    class Model:
+        def parameters(self):
+            return []
+
+        def buffers(self):
+            return []
+
+    monkeypatch.setattr(startup_module, "HEAVY_MODULES", ())
+    registry = ModelRegistry(loader=lambda spec: (Model(), object()))
+    registry.register(ModelSpec(name="default", path=str(tmp_path)))
+    monkeypatch.setattr(registry_module, "_registry", registry)
+    return registry
+
+
+def test_startup_becomes_ready_within_budget(fake_registry):
+    startup = Startup(warmup=False, budget_seconds=60.0)
+    assert not startup.ready
+    assert startup.start().wait(5)
+    status = startup.to_dict()
+    assert status["status"] == READY
+    assert set(status["phases"]) == {"imports", "model_load"}
+    assert status["over_budget"] is False
+    assert status["error"] is None
+
+
+def test_startup_reports_when_over_budget(fake_registry):
+    startup = Startup(warmup=False, budget_seconds=0.0)
+    startup.run()
+    status = startup.to_dict()
+    assert status["ready"] is True
+    assert status["budget_seconds"] == 0.0
+    assert status["over_budget"] is True
+
+
+def test_budget_comes_from_the_environment(monkeypatch):
+    monkeypatch.setenv("STARTUP_BUDGET_SECONDS", "12.5")
+    assert Startup(warmup=False).to_dict()["budget_seconds"] == 12.5
+    monkeypatch.delenv("STARTUP_BUDGET_SECONDS")
+    status = Startup(warmup=False).to_dict()
+    assert status["budget_seconds"] is None
+    assert status["over_budget"] is False
+
+
+def test_missing_model_leaves_the_process_not_ready(fake_registry, tmp_path):
+    fake_registry.register(ModelSpec(name="default", path=str(tmp_path / "missing")))
+    startup = Startup(warmup=False)
+    startup.run()
+    status = startup.to_dict()
+    assert status["status"] == FAILED
+    assert not startup.ready
+    assert status["error"].startswith("model_load:")
+
+
+def test_importtime_output_is_summed_per_package():
+    output = "\n".join([
+        "import time: self [us] | cumulative | imported package",
+        "import time:       100 |        100 |   json.decoder",
+        "import time:       200 |        300 | json",
+        "import time:      1000 |       1500 |   backend.helpers",
+        "import time:       500 |       2000 | backend",
+    ])
+    timings = parse_importtime(output)
+    assert [(t.module, t.depth) for t in timings] == [
+        ("json.decoder", 1), ("json", 0), ("backend.helpers", 1), ("backend", 0),
+    ]
+    totals = import_totals(timings, "backend")
+    assert totals["total_ms"] == 2.0
+    assert totals["packages_ms"] == {"backend": 1.5, "json": 0.3}
@@ -0,0 +1,64 @@
+import json
+
+from src.structured import (
+    JSON_REPLY_START,
+    StreamingItemParser,
+    merge_structured,
+    parse_requirements,
+    to_markdown,
+)
+
+
+def test_items_are_emitted_as_soon_as_they_are_complete():
+    parser = StreamingItemParser()
+    reply = JSON_REPLY_START + '{"text": "Users can log in", "page": 2}, {"text": "Admins export'
+    emitted = []
+    for char in reply:
+        emitted.extend(parser.feed(char))
+    assert emitted == [("functional", {"text": "Users can log in", "page": 2})]
+
+
+def test_truncated_reply_keeps_its_complete_items():
+    reply = (
+        JSON_REPLY_START + '{"text": "Users can log in", "page": 1}], '
+        '"non_functional": [{"text": "Pages load in 2s", "page": "p. 3"}, {"text": "Uptime of 99'
+    )
+    result = parse_requirements(reply)
+    assert result["functional"] == [{"text": "Users can log in", "page": 1}]
+    assert result["non_functional"] == [{"text": "Pages load in 2s", "page": 3}]
+    assert result["user_stories"] == result["acceptance_criteria"] == []
+
+
+def test_strings_with_braces_and_escapes_do_not_confuse_the_parser():
+    item = {"text": 'Reports named "Q{1}" [draft] are kept', "page": None}
+    parser = StreamingItemParser(default_page=4)
+    parser.feed(JSON_REPLY_START + json.dumps(item) + ', "bare string item"]}')
+    assert parser.result["functional"] == [
+        {"text": item["text"], "page": 4},
+        {"text": "bare string item", "page": 4},
+    ]
+
+
+def test_markdown_replies_fall_back_to_markdown_parsing():
+    result = parse_requirements("## Functional Requirements\n- Users can log in\n", default_page=2)
+    assert result["functional"] == [{"text": "Users can log in", "page": 2}]
+
+
+def test_merge_structured_drops_duplicates_and_keeps_pages():
+    merged = merge_structured([
+        {"functional": [{"text": "Users can log in.", "page": 1}]},
+        {"functional": [{"text": "users can log in", "page": 5}, {"text": "Admins export reports", "page": 6}]},
+    ])
+    assert merged["functional"] == [
+        {"text": "Users can log in.", "page": 1},
+        {"text": "Admins export reports", "page": 6},
+    ]
+    assert "- Users can log in. (p. 1)" in to_markdown(merged)
+
+
+def test_merge_structured_keeps_items_whose_modals_differ():
+    merged = merge_structured([
+        {"functional": [{"text": "Admins must approve every uploaded document before it is published to the shared team workspace", "page": 1}]},
+        {"functional": [{"text": "Admins may approve every uploaded document before it is published to the shared team workspace", "page": 2}]},
+    ])
+    assert [item["page"] for item in merged["functional"]] == [1, 2]